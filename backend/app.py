@@ -1,17 +1,31 @@
-from flask      import Flask, jsonify, request
+from flask      import Flask, Response, jsonify, request, g
 from flask_cors import CORS
-import random
-import string
+import os
+import hmac
+import time
+from threading import Lock
 
 from models.database           import DatabaseManager
-from models.customer           import Customer
+from models.sqlite_engine      import SqliteEngine
+from models.customer_registry  import CustomerRegistry
 from models.product            import Product
 from models.product_catalogue  import ProductCatalogue
+from models.product_listing    import ProductListing
+from models.product_search     import ProductSearchIndex
 
 from models.admin              import Admin
 from models.sales_analytics    import SalesAnalytics
+from models.sales_rollup       import SalesRollup, parse_time
 
 from models.order import Order
+from models.order_ids import order_ids
+from models.idempotency import IdempotencyStore, IdempotencyConflict
+from models.order_items import get_order_items_table
+from models.cart_pricing import CartPricing
+from models.response_cache import ResponseCache
+from models.data_transfer import TransferProgress, export_csv, import_products
+from models.metrics import metrics
+from models.profiler import SamplingProfiler
 
 from models.payment_observer import observer
 from models.payment_listeners.receipt import Receipt
@@ -21,6 +35,8 @@ from models.payment_listeners.shipment import Shipment
 observer.register(Receipt())
 observer.register(NotificationSystem())
 observer.register(Shipment())
+# Deliver to listeners on background threads so checkout does not wait on their I/O
+observer.start_async()
 
 app = Flask(__name__)
 CORS(app)
@@ -31,12 +47,32 @@ CORS(app)
 # ─────────────────────────────────────────────────────────────────────────────
 # 1. Load ALL Product instances from 'products.csv'
 # ─────────────────────────────────────────────────────────────────────────────
-dbm = DatabaseManager()
+# AWE_STORAGE_ENGINE=sqlite keeps every table in data/awe.sqlite3 instead of one CSV per table;
+# existing CSV tables are imported the first time each one is opened.
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+if os.environ.get("AWE_STORAGE_ENGINE", "csv") == "sqlite":
+    dbm = DatabaseManager(engine=SqliteEngine(os.path.join(data_dir, "awe.sqlite3"), csv_path=data_dir))
+else:
+    # shared=True: several worker processes (gunicorn -w N) can serve from the same data/ directory
+    dbm = DatabaseManager(journaled=True, snapshots=True, compact_rows=True, shared=True)
+# Finish any multi-table transaction (a checkout) that a crash interrupted half applied
+dbm.recover()
 prod_table = dbm.get_table("products")
-all_product_objs = []
 order_table = dbm.get_table("order")
+if order_table:
+    order_table.create_index("order_id")
+    order_table.create_index("customer_id")
+    order_table.create_index("total_cost", kind="sorted", key=float)
+    # One-time copy of legacy JSON 'items' into the normalized order_items table
+    get_order_items_table()
+
+if not prod_table:
+    # If no 'products.csv', create an empty table with columns
+    prod_table = dbm.create_table("products", ["product_id","name","description","price"])
 
-if prod_table:
+def load_products():
+    global all_product_objs, all_products_dict, product_listing, product_search
+    all_product_objs = []
     for row in prod_table.rows:
         p = Product(
             product_id  = row["product_id"],
@@ -45,30 +81,25 @@ if prod_table:
             price       = float(row["price"])
         )
         all_product_objs.append(p)
-else:
-    # If no 'products.csv', create an empty table with columns
-    prod_table = dbm.create_table("products", ["product_id","name","description","price"])
 
-# Build a dict: product_id -> Product instance (for easy lookup)
-all_products_dict = {p.product_id: p for p in all_product_objs}
+    # Build a dict: product_id -> Product instance (for easy lookup)
+    all_products_dict = {p.product_id: p for p in all_product_objs}
+    # Presorted by id / price / name so paged listing never sorts per request
+    product_listing = ProductListing(all_product_objs)
+    # Inverted index over name + description for /api/products/search
+    product_search = ProductSearchIndex(all_product_objs)
+    # Prices in cents for cart subtotals; open carts holding a repriced product are updated
+    CartPricing().update_prices({p.product_id: p.price for p in all_product_objs})
+
+load_products()
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 2. Load CUSTOMER instances from 'customers.csv'
+# 2. CUSTOMER registry over 'customers.csv'
 # ─────────────────────────────────────────────────────────────────────────────
-cust_table = dbm.get_table("customers")
-all_customers = {}
-
-if cust_table:
-    for row in cust_table.rows:
-        cid = row["customer_id"]
-        try:
-            all_customers[cid] = Customer(cid)
-        except ValueError:
-            # Skip invalid rows
-            pass
-else:
-    dbm.create_table("customers", ["customer_id","account_id"])
+# Customer instances are built on first request and evicted when idle,
+# so startup cost does not grow with the number of registered customers.
+all_customers = CustomerRegistry()
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 3. Load ADMIN instances from 'admins.csv'
@@ -95,10 +126,14 @@ else:
 # 4. Load PRODUCT_CATALOGUE instances from 'product_catalogues.csv'
 # ─────────────────────────────────────────────────────────────────────────────
 pc_table = dbm.get_table("product_catalogues")
-# Map of catalogue_id -> {"name": <str>, "product_ids": [ ... ]}
-catalogue_map = {}
+if not pc_table:
+    # If no CSV yet, create an empty one (with header row)
+    pc_table = dbm.create_table("product_catalogues", ["catalogue_id","name","product_id"])
 
-if pc_table:
+def load_catalogues():
+    global all_catalogues
+    # Map of catalogue_id -> {"name": <str>, "product_ids": [ ... ]}
+    catalogue_map = {}
     for row in pc_table.rows:
         cat_id   = row["catalogue_id"]
         cat_name = row["name"]
@@ -110,31 +145,198 @@ if pc_table:
                 "product_ids": []
             }
         catalogue_map[cat_id]["product_ids"].append(pid)
-else:
-    # If no CSV yet, create an empty one (with header row)
-    dbm.create_table("product_catalogues", ["catalogue_id","name","product_id"])
-    catalogue_map = {}
 
-# Build a dict of ProductCatalogue instances
-all_catalogues = {}
-for cat_id, info in catalogue_map.items():
-    # For each product_id in this catalogue, pick up the Product instance from all_products_dict
-    product_list = [ all_products_dict[pid] 
-                     for pid in info["product_ids"] 
-                     if pid in all_products_dict ]
-    all_catalogues[cat_id] = ProductCatalogue(cat_id, info["name"], product_list)
+    # Build a dict of ProductCatalogue instances
+    catalogues = {}
+    for cat_id, info in catalogue_map.items():
+        # For each product_id in this catalogue, pick up the Product instance from all_products_dict
+        product_list = [ all_products_dict[pid] 
+                         for pid in info["product_ids"] 
+                         if pid in all_products_dict ]
+        catalogues[cat_id] = ProductCatalogue(cat_id, info["name"], product_list)
+    all_catalogues = catalogues
+
+load_catalogues()
+
+# The sales rollup is only kept in memory: fold the order history in now, so the first
+# checkout (whose commit refreshes it) only adds its own order instead of paying for the scan
+SalesRollup()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 4a. Request metrics and profiling
+# ─────────────────────────────────────────────────────────────────────────────
+# Every request is timed per route (see GET /metrics); a streamed body is not included.
+# With AWE_PROFILE_TOKEN set, a request sent with 'X-Profile: <token>' is also sampled by a
+# SamplingProfiler. Its folded stacks are written to AWE_PROFILE_DIR (default backend/profiles),
+# and the file name comes back in the X-Profile-File response header.
+REQUEST_SECONDS = metrics.histogram("awe_http_request_seconds", "Time to handle a request, by route",
+                                    ["method", "route"])
+REQUESTS = metrics.counter("awe_http_requests_total", "Requests handled, by route and status",
+                           ["method", "route", "status"])
+profile_dir = os.environ.get("AWE_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    token = os.environ.get("AWE_PROFILE_TOKEN")
+    if token and hmac.compare_digest(request.headers.get("X-Profile", ""), token):
+        # Under async_app.py a request's work moves between threads, so all of them are sampled
+        g.profiler = SamplingProfiler(all_threads="awe.asyncio" in request.environ).start()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    if "request_start" in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, request.method, route)
+    REQUESTS.inc(request.method, route, str(response.status_code))
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        response.headers["X-Profile-File"] = profiler.dump(profile_dir, f"{request.method} {route}")
+        response.headers["X-Profile-Samples"] = str(profiler.samples)
+    return response
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 4b. Keep the globals above in step with other worker processes
+# ─────────────────────────────────────────────────────────────────────────────
+# Table versions the product / catalogue globals were last built from
+loaded_versions = (prod_table.version, pc_table.version)
+reload_lock = Lock()
+
+@app.before_request
+def refresh_shared_state():
+    
+    #Pick up product / catalogue changes made by other processes before serving a request.
+    #Only the changed tables are re-read (see Table.sync), and the globals built from them
+    #are rebuilt only when one of them actually changed.
+    
+    global loaded_versions
+    prod_table.sync()
+    pc_table.sync()
+    if (prod_table.version, pc_table.version) == loaded_versions:
+        return
+    with reload_lock:
+        versions = (prod_table.version, pc_table.version)
+        if versions == loaded_versions:
+            return
+        if versions[0] != loaded_versions[0]:
+            load_products()
+        # Catalogues hold Product objects, so they are rebuilt after any product change too
+        load_catalogues()
+        loaded_versions = versions
+
+def apply_product_changes(rows: list, before: int, after: int):
+
+    #Fold products added or edited by this process (rows of 'products', written while the table
+    #went from version before to after) into the product globals in place: the search index and
+    #listing are updated per product instead of rebuilt. If the globals were not current at
+    #before, another change came first, and refresh_shared_state rebuilds everything instead.
+
+    global loaded_versions, all_products_dict, all_product_objs
+    with reload_lock:
+        if loaded_versions[0] != before:
+            return
+        products = dict(all_products_dict)      # copied, so requests iterating the old one are unaffected
+        changes = []
+        for row in rows:
+            p = Product(
+                product_id  = row["product_id"],
+                name        = row["name"],
+                description = row["description"],
+                price       = float(row["price"])
+            )
+            changes.append((p, products.get(p.product_id)))
+            products[p.product_id] = p
+            product_search.update_product(p)
+        product_listing.upsert(changes)
+        all_products_dict = products
+        all_product_objs = list(products.values())
+        CartPricing().update_prices({pid: p.price for pid, p in products.items()})
+        # Catalogues hold Product objects, so they pick up the new ones
+        load_catalogues()
+        loaded_versions = (after, loaded_versions[1])
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 5. API ROUTES
 # ─────────────────────────────────────────────────────────────────────────────
 
+# Serialized catalogue/product responses, rebuilt when 'products' or 'product_catalogues' change
+response_cache = ResponseCache(app.json.dumps)
+
+def cached_json(key, build):
+    
+    #Serve build()'s JSON from response_cache, answering 304 when the client's ETag still matches.
+    
+    body, etag = response_cache.get(key, [prod_table, pc_table], build)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    # Clients may keep the body but must revalidate it on every use
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+LISTING_ARGS = ("limit", "cursor", "sort", "order", "fields")
+
+def listing_response(key, listing, build_all):
+    
+    #Without paging arguments, return build_all() as before. With any of
+    #limit / cursor / sort (id|price|name) / order (asc|desc) / fields (comma-separated),
+    #return one page from the presorted listing: { "items", "next_cursor", "total" }.
+    
+    if not any(a in request.args for a in LISTING_ARGS):
+        return cached_json(key, build_all)
+
+    try:
+        limit  = int(request.args.get("limit", 50))
+        fields = request.args.get("fields")
+        fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        build  = lambda: listing.page(
+            sort   = request.args.get("sort", "id"),
+            order  = request.args.get("order", "asc"),
+            limit  = limit,
+            cursor = request.args.get("cursor"),
+            fields = fields
+        )
+        return cached_json((key, request.query_string), build)
+    except ValueError as e:
+        return jsonify({ "error": str(e) }), 400
+
+
 @app.route("/api/products", methods=["GET"])
 def get_all_products():
     
-    #Return all products (regardless of catalogue).
+    #Return all products (regardless of catalogue), optionally paged.
     
-    return jsonify([p.return_info() for p in all_products_dict.values()])
+    return listing_response("products", product_listing,
+                            lambda: [p.return_info() for p in all_products_dict.values()])
+
+
+@app.route("/api/products/search", methods=["GET"])
+def search_products():
+    
+    #Full-text search over product names and descriptions: ?q=<text>&limit=<n>
+    #Returns { "query": q, "results": [ {product fields..., "score": s}, ... ] }, best first.
+    
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({ "error": "Missing search query 'q'" }), 400
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify({ "error": "limit must be an integer" }), 400
+    limit = max(1, min(limit, 100))
+
+    results = [
+        dict(p.return_info(), score=round(score, 4))
+        for score, p in product_search.search(q, limit=limit)
+    ]
+    return jsonify({ "query": q, "results": results })
 
 
 @app.route("/api/catalogues", methods=["GET"])
@@ -143,11 +345,10 @@ def list_catalogues():
     #Return a list of all catalogues with their IDs and names:[ { "catalogue_id": "1", "name": "Organic" }, ... ]
       
     
-    result = [
+    return cached_json("catalogues", lambda: [
         { "catalogue_id": cat.get_catalogue_id(), "name": cat.get_name() }
         for cat in all_catalogues.values()
-    ]
-    return jsonify(result)
+    ])
 
 
 @app.route("/api/catalogues/<catalogue_id>/products", methods=["GET"])
@@ -159,7 +360,7 @@ def get_catalogue_products(catalogue_id):
         return jsonify({ "error": f"Catalogue '{catalogue_id}' not found" }), 404
 
     cat = all_catalogues[catalogue_id]
-    return jsonify(cat.get_all_products())
+    return listing_response(("catalogue_products", catalogue_id), cat.listing, cat.get_all_products)
 
 
 @app.route("/api/customers", methods=["GET"])
@@ -167,7 +368,7 @@ def list_customers():
     
     #Return a sorted list of all customer IDs.
     
-    return jsonify(sorted([cust.get_customer_id() for cust in all_customers.values()]))
+    return jsonify(sorted(all_customers.customer_ids()))
 
 
 @app.route("/api/cart/<customer_id>", methods=["GET"])
@@ -176,21 +377,24 @@ def view_cart(customer_id):
         return jsonify({ "error": f"Customer '{customer_id}' not found" }), 404
 
     cust = all_customers[customer_id]
-    raw_items = cust.get_cart().get_cart_items()
+    # Lines and their precomputed subtotal (integer cents), read together
+    items, subtotal_cents = cust.get_cart().priced()
     # from models.shopping_cart import ShoppingCart
     # fresh_cart = ShoppingCart(customer_id)
     # raw_items = fresh_cart.get_cart_items()
     detailed = []
-    for entry in raw_items:
-        pid = entry["product_id"]
+    for pid, quantity in items.items():
         p = all_products_dict.get(pid)
         if p:
             detailed.append({
                 "product_id": p.product_id,
                 "name": p.name,
                 "price": p.price,
-                "quantity": entry["quantity"]
+                "quantity": quantity
             })
+    # ?totals=1 wraps the lines with the cart's subtotal
+    if request.args.get("totals") in ("1", "true"):
+        return jsonify({ "items": detailed, "subtotal_cents": subtotal_cents, "subtotal": subtotal_cents / 100 })
     return jsonify(detailed)
 
 
@@ -219,17 +423,72 @@ def add_to_cart(customer_id):
 
 @app.route("/api/payment", methods=["POST"])
 def checkout():
-    data = request.get_json()
     
-    customer_id = data["customerId"]
-    cust = all_customers[customer_id]
-    cart_items = cust.get_cart().get_cart_items()
+    #With an Idempotency-Key header, a retry of a request already handled (same key, same body)
+    #gets the original response back, with Idempotent-Replayed: true, and nothing is charged or
+    #written again. Reusing a key for a different body, or while its first request is still
+    #running, is answered 409.
+    
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return place_order()
+    if len(key) > 255:
+        return jsonify({ "error": "Idempotency-Key is longer than 255 characters" }), 400
+
+    store = IdempotencyStore()
+    try:
+        state, stored = store.begin(key, request.get_data())
+    except IdempotencyConflict as e:
+        return jsonify({ "error": str(e) }), 409
+    if state == "done":
+        resp = Response(stored[1], status=stored[0], mimetype="application/json")
+        resp.headers["Idempotent-Replayed"] = "true"
+        return resp
+
+    try:
+        resp = app.make_response(place_order())
+    except BaseException:
+        store.abort(key)
+        raise
+    if resp.status_code >= 500:
+        # Not a result the client should be stuck with; let the retry run again
+        store.abort(key)
+    else:
+        store.finish(key, resp.status_code, resp.get_data(as_text=True))
+    return resp
+
 
-    total_cost = sum(all_products_dict[item["product_id"]].price * item["quantity"] for item in cart_items)
+def place_order():
+    data = request.get_json()
+    order, error = start_order(data)
+    if error:
+        return jsonify(error[0]), error[1]
 
     payment_details = data.get("payment_details", {})
+    success = order.make_payment(data["paymentMethod"], payment_details,
+                                 request.headers.get("Idempotency-Key"),
+                                 IdempotencyStore.fingerprint(request.get_data()))
+    body, status = payment_result(order, success)
+    return jsonify(body), status
 
-    order_id = "O" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+
+def start_order(data):
+    
+    #The Order for the customer's current cart, as (order, None), or (None, (body, status))
+    #when it cannot be placed. Shared by place_order and the asyncio server (async_app.py).
+    
+    customer_id = data["customerId"]
+    cust = all_customers[customer_id]
+    # The cart keeps its subtotal in integer cents; no per-line price lookups here
+    items, subtotal_cents = cust.get_cart().priced()
+    missing = [pid for pid in items if pid not in all_products_dict]
+    if missing:
+        return None, ({ "status": "fail", "message": f"Products no longer available: {missing}" }, 400)
+    cart_items = [{"product_id": pid, "quantity": qty} for pid, qty in items.items()]
+    total_cost = subtotal_cents / 100
+
+    # Unique across threads and worker processes, and sorts by creation time
+    order_id = order_ids.new_id()
 
     order = Order(
         order_id,
@@ -237,13 +496,20 @@ def checkout():
         items=cart_items,
         total_cost=total_cost
     )
+    return order, None
 
-    success = order.make_payment(data["paymentMethod"], payment_details)
-    
+
+def payment_result(order, success):
     if success:
-        return jsonify({"status": "success", "message": "Payment successful!"})
+        return {"status": "success", "message": "Payment successful!", "orderId": order.order_id}, 200
     else:
-        return jsonify({"status": "fail", "message": "Payment failed."}), 400
+        return {"status": "fail", "message": "Payment failed.", "orderId": order.order_id}, 400
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    # Prometheus scrape endpoint: latency histograms and counters of this process
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.route("/api/admin/login", methods=["POST"])
@@ -269,15 +535,74 @@ def admin_login():
 
 @app.route("/api/admin/sales", methods=["GET"])
 def get_sales_summary():
+    # from / to / granularity / group_by switch to time-bucketed figures from the rollup store
+    if any(k in request.args for k in ("from", "to", "granularity", "group_by")):
+        try:
+            start = parse_time(request.args["from"]) if "from" in request.args else None
+            end   = parse_time(request.args["to"]) if "to" in request.args else None
+            result = SalesRollup().query(
+                start, end,
+                granularity = request.args.get("granularity", "day"),
+                group_by    = request.args.get("group_by", "none")
+            )
+        except ValueError as e:
+            return jsonify({ "error": str(e) }), 400
+        return jsonify(result), 200
+
     analytics = SalesAnalytics()
     summary = analytics.generate_summary()
+
+    # ?verify=1 recomputes from scratch and reports drift; add &repair=1 to fix it
+    if request.args.get("verify") in ("1", "true"):
+        summary["verification"] = analytics.verify_summary(repair=request.args.get("repair") in ("1", "true"))
     return jsonify(summary), 200
+
+
+@app.route("/api/admin/orders/export", methods=["GET"])
+def export_orders():
+    
+    #Download every order as CSV, streamed in chunks rather than built in memory.
+    #Progress is reported under /api/admin/transfers, with the id in X-Transfer-Id.
+    
+    table = dbm.get_table("order")
+    if not table:
+        return jsonify({ "error": "No orders yet" }), 404
+    progress = TransferProgress("export", "order")
+    resp = Response(export_csv(table, progress), mimetype="text/csv")
+    resp.headers["Content-Disposition"] = "attachment; filename=orders.csv"
+    resp.headers["X-Transfer-Id"] = str(progress.id)
+    return resp
+
+
+@app.route("/api/admin/products/import", methods=["POST"])
+def import_product_feed():
+    
+    #Body: a CSV file (Content-Type: text/csv) with a header naming product_id, name, price
+    #and optionally description. Existing products (by product_id) are updated, new ones added;
+    #invalid rows are skipped and listed in the response. Read as a stream, so feeds of any
+    #size import in bounded memory.
+    
+    progress = TransferProgress("import", "products")
+    try:
+        import_products(request.stream, prod_table, progress, on_chunk=apply_product_changes)
+    except ValueError as e:
+        return jsonify({ "error": str(e), "transfer": progress.info() }), 400
+    # Each chunk was applied to the products in place; this only reloads if something else changed
+    refresh_shared_state()
+    return jsonify(progress.info()), 200
+
+
+@app.route("/api/admin/transfers", methods=["GET"])
+def list_transfers():
+    # Progress and throughput of recent imports / exports, newest first
+    return jsonify(TransferProgress.all_info()), 200
     
 
 # ─────────────────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
     print("Loaded Products:", list(all_products_dict.keys()))
-    print("Loaded Customers:", list(all_customers.keys()))
+    print("Loaded Customers:", all_customers.customer_ids())
     print("Loaded Catalogues:", [(c.get_catalogue_id(), c.get_name()) for c in all_catalogues.values()])
+    # python async_app.py serves the same routes from an asyncio server (see async_app.py)
     app.run(debug=True)
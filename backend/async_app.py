@@ -0,0 +1,452 @@
+# Asyncio serving mode for the same API as app.py:
+#
+#   python async_app.py --port 5000          (built-in HTTP/1.1 server, stdlib only)
+#   uvicorn async_app:application            (or any other ASGI server)
+#
+# POST /api/payment is handled natively: the gateway call is awaited (see
+# payment_strategies/gateway.py) and the table reads and writes run on a thread pool of
+# AWE_ASYNC_IO_THREADS threads, so a checkout waiting on a slow gateway holds no thread.
+# Every other route is the Flask app itself, called as WSGI on that pool.
+# Responses are produced by Flask in both cases, so headers (CORS), error pages and the
+# Idempotency-Key handling are the same as under app.py.
+
+import io
+import os
+import sys
+import queue
+import asyncio
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from flask import request, jsonify, Response
+
+import app as flask_module
+from models.idempotency import IdempotencyStore, IdempotencyConflict
+
+flask_app = flask_module.app
+
+def io_threads() -> int:
+    return int(os.environ.get("AWE_ASYNC_IO_THREADS", "32"))
+
+def _startup():
+    # run_in_executor(None, ...) throughout the models then uses this pool
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=io_threads(), thread_name_prefix="awe-io"))
+
+async def _blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+async def _in_request(fn, *args):
+    # _blocking inside the current Flask request context, which lives in contextvars and so
+    # is not seen by executor threads unless the context is carried over
+    return await _blocking(contextvars.copy_context().run, fn, *args)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Native routes
+# ─────────────────────────────────────────────────────────────────────────────
+async def checkout():
+    # app.checkout(), awaiting the payment instead of blocking on it
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return await place_order()
+    if len(key) > 255:
+        return jsonify({ "error": "Idempotency-Key is longer than 255 characters" }), 400
+
+    store = IdempotencyStore()
+    try:
+        state, stored = await _blocking(store.begin, key, request.get_data())
+    except IdempotencyConflict as e:
+        return jsonify({ "error": str(e) }), 409
+    if state == "done":
+        resp = Response(stored[1], status=stored[0], mimetype="application/json")
+        resp.headers["Idempotent-Replayed"] = "true"
+        return resp
+
+    try:
+        resp = flask_app.make_response(await place_order())
+    except BaseException:
+        await _blocking(store.abort, key)
+        raise
+    if resp.status_code >= 500:
+        await _blocking(store.abort, key)
+    else:
+        await _blocking(store.finish, key, resp.status_code, resp.get_data(as_text=True))
+    return resp
+
+async def place_order():
+    data = request.get_json()
+    order, error = await _blocking(flask_module.start_order, data)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    success = await order.make_payment_async(data["paymentMethod"], data.get("payment_details", {}),
+                                             request.headers.get("Idempotency-Key"),
+                                             IdempotencyStore.fingerprint(request.get_data()))
+    body, status = flask_module.payment_result(order, success)
+    return jsonify(body), status
+
+NATIVE_ROUTES = {
+    ("POST", "/api/payment"): checkout,
+}
+
+async def _dispatch_native(handler, environ):
+
+    #Run handler as Flask would run a view: inside a request context, through the app's
+    #before/after-request hooks and error handlers, and return the finished Response.
+    #The hooks and handlers block (shared-state refresh, table loads, profile dumps), so they
+    #run on the I/O pool like the handler's table work; only the handler runs on the loop.
+
+    ctx = flask_app.request_context(environ)
+    ctx.push()
+    error = None
+    try:
+        try:
+            rv = await _in_request(flask_app.preprocess_request)
+            if rv is None:
+                rv = await handler()
+        except Exception as e:
+            rv = await _in_request(flask_app.handle_user_exception, e)
+        return await _in_request(flask_app.finalize_request, rv)
+    except Exception as e:
+        error = e
+        return await _in_request(flask_app.handle_exception, e)
+    finally:
+        ctx.pop(error)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ASGI application
+# ─────────────────────────────────────────────────────────────────────────────
+class RequestBody(io.RawIOBase):
+
+    #wsgi.input for a request whose body is still arriving: the event loop feeds chunks in
+    #with feed(), the worker thread running the WSGI app blocks in readinto() until one is
+    #there. At most max_chunks are buffered, so a slow app slows the upload down.
+
+
+    def __init__(self, loop, max_chunks: int = 8):
+        self.loop = loop
+        self.chunks = queue.Queue()
+        self.room = asyncio.Semaphore(max_chunks)
+        self.pending = b""
+        self.eof = False
+
+    async def feed(self, receive):
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    break
+                await self.room.acquire()
+                self.chunks.put(message.get("body", b""))
+                if not message.get("more_body", False):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            # The app sees a short body rather than waiting forever
+            self.chunks.put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.pending and not self.eof:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.eof = True
+            else:
+                self.loop.call_soon_threadsafe(self.room.release)
+                self.pending = chunk
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
+async def _read_body(receive) -> bytes:
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(body)
+
+def _environ(scope, body) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "awe.asyncio": True,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin-1")
+        environ[name] = environ[name] + "," + value if name in environ else value
+    return environ
+
+def _headers(headers) -> list:
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+async def _send_response(send, resp):
+    await send({"type": "http.response.start", "status": resp.status_code,
+                "headers": _headers(resp.headers.to_wsgi_list())})
+    await send({"type": "http.response.body", "body": resp.get_data()})
+
+async def _run_wsgi(scope, receive, send):
+
+    #Call the Flask app as WSGI on the thread pool. The request body is streamed into it
+    #and its response iterator (e.g. the streamed order export) is sent chunk by chunk.
+
+    loop = asyncio.get_running_loop()
+    body = RequestBody(loop)
+    feeding = asyncio.ensure_future(body.feed(receive))
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+
+    def next_chunk(it):
+        # None once the response is exhausted
+        for chunk in it:
+            if chunk:
+                return chunk
+        return None
+
+    try:
+        result = await loop.run_in_executor(None, flask_app, _environ(scope, body), start_response)
+        try:
+            it = iter(result)
+            chunk = await loop.run_in_executor(None, next_chunk, it)
+            await send({"type": "http.response.start", "status": started[0],
+                        "headers": _headers(started[1])})
+            while chunk is not None:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(None, next_chunk, it)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(None, result.close)
+    finally:
+        feeding.cancel()
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+
+    handler = NATIVE_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        return await _run_wsgi(scope, receive, send)
+    body = io.BytesIO(await _read_body(receive))
+    resp = await _dispatch_native(handler, _environ(scope, body))
+    await _send_response(send, resp)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Built-in HTTP/1.1 server
+# ─────────────────────────────────────────────────────────────────────────────
+class HttpConnection:
+
+    #One client connection of serve(): parses HTTP/1.1 requests (keep-alive, bodies with a
+    #Content-Length) and runs each one through an ASGI app. A response without a
+    #Content-Length is sent chunked, or ends the connection for an HTTP/1.0 client.
+
+
+    MAX_HEAD = 64 * 1024
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, app, reader, writer):
+        self.app = app
+        self.reader = reader
+        self.writer = writer
+        self.server = writer.get_extra_info("sockname")[:2]
+        self.client = (writer.get_extra_info("peername") or ("", 0))[:2]
+
+    async def run(self):
+        try:
+            while await self.handle_request():
+                pass
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            self.writer.close()
+
+    def _error(self, status: int):
+        reason = HTTPStatus(status).phrase
+        self.writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\n"
+                          f"Connection: close\r\n\r\n".encode("latin-1"))
+
+    async def handle_request(self) -> bool:
+        # False when the connection should be closed afterwards
+        try:
+            head = await self.reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                self._error(400)
+            return False
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+            http_version = version.split("/", 1)[1]
+            headers = []
+            for line in lines[1:]:
+                if line:
+                    name, value = line.split(":", 1)
+                    headers.append((name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")))
+        except (ValueError, IndexError):
+            self._error(400)
+            return False
+        fields = {name: value for name, value in headers}
+
+        if b"transfer-encoding" in fields:
+            # Chunked uploads are not supported; every client here sends a Content-Length
+            self._error(501)
+            return False
+        try:
+            remaining = int(fields.get(b"content-length", b"0"))
+        except ValueError:
+            self._error(400)
+            return False
+        connection = fields.get(b"connection", b"").lower()
+        keep_alive = connection != b"close" if http_version == "1.1" else connection == b"keep-alive"
+        if fields.get(b"expect", b"").lower() == b"100-continue":
+            self.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": http_version,
+            "method": method.upper(),
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": headers,
+            "client": self.client,
+            "server": self.server,
+        }
+        state = {"remaining": remaining, "status": None, "chunked": False,
+                 "head_only": scope["method"] == "HEAD", "keep_alive": keep_alive, "done": False}
+
+        async def receive():
+            if state["remaining"] <= 0:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            data = await self.reader.read(min(self.READ_SIZE, state["remaining"]))
+            if not data:
+                raise ConnectionError("client closed the connection mid-body")
+            state["remaining"] -= len(data)
+            return {"type": "http.request", "body": data, "more_body": state["remaining"] > 0}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["headers"] = list(message.get("headers", []))
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if "headers" in state:
+                self._write_head(state, body, more)
+            if body and not state["head_only"]:
+                self.writer.write(b"%x\r\n%s\r\n" % (len(body), body) if state["chunked"] else body)
+            if not more:
+                if state["chunked"] and not state["head_only"]:
+                    self.writer.write(b"0\r\n\r\n")
+                state["done"] = True
+            await self.writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception as e:
+            print(f"Error: {scope['method']} {scope['path']} failed: {e!r}")
+        if not state["done"]:
+            if state["status"] is None:
+                self._error(500)
+            return False
+        # Skip whatever of the body the app did not read, so the next request parses cleanly
+        while state["remaining"] > 0:
+            data = await self.reader.read(min(self.READ_SIZE, state["remaining"]))
+            if not data:
+                return False
+            state["remaining"] -= len(data)
+        return state["keep_alive"]
+
+    def _write_head(self, state, body: bytes, more: bool):
+        headers = state.pop("headers")
+        names = {name for name, _ in headers}
+        if b"content-length" not in names:
+            if not more:
+                # The whole body is in this one message
+                headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            elif state["keep_alive"] and not state["head_only"]:
+                state["chunked"] = True
+                headers.append((b"transfer-encoding", b"chunked"))
+            else:
+                state["keep_alive"] = False
+        if not state["keep_alive"]:
+            headers.append((b"connection", b"close"))
+        status = state["status"]
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}".encode("latin-1")]
+        lines += [name + b": " + value for name, value in headers]
+        self.writer.write(b"\r\n".join(lines) + b"\r\n\r\n")
+
+
+async def serve(app, host: str = "127.0.0.1", port: int = 5000):
+    _startup()
+
+    async def connected(reader, writer):
+        await HttpConnection(app, reader, writer).run()
+
+    server = await asyncio.start_server(connected, host, port, limit=HttpConnection.MAX_HEAD,
+                                        backlog=1024)
+    print(f"Serving on http://{host}:{port} (asyncio, {io_threads()} I/O threads)")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(application, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
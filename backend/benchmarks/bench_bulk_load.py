@@ -0,0 +1,89 @@
+# backend/benchmarks/bench_bulk_load.py
+#
+# Loading many rows one add_row() at a time vs. one add_rows() call.
+# add_row() persists every row on its own (a CSV rewrite, a journal append, or an SQLite
+# commit), so the per-row loop is timed on a sample and extrapolated to the full count
+# (a lower bound for plain CSV, whose rewrite grows with the table);
+# add_rows() validates once, updates indexes in one pass and persists once.
+# Each run gets its own throw-away directory, never backend/data.
+#
+#   cd backend
+#   python benchmarks/bench_bulk_load.py --rows 1000000 --sample 2000
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import CsvEngine
+from models.sqlite_engine import SqliteEngine
+
+ITEM_COLUMNS = ["order_id", "product_id", "quantity", "unit_price"]
+
+def make_rows(n: int) -> list:
+    return [{"order_id": f"O{i // 3:08d}", "product_id": str(i % 500), "quantity": str(i % 4 + 1),
+             "unit_price": f"{(i % 997) / 10:.2f}"} for i in range(n)]
+
+def open_items(engine):
+    items = engine.open_table("order_items", ITEM_COLUMNS)
+    items.create_index("order_id")
+    return items
+
+def one_by_one(engine, rows: list) -> float:
+    items = open_items(engine)
+    start = time.perf_counter()
+    for row in rows:
+        items.add_row(row)
+    return time.perf_counter() - start
+
+def bulk(engine, rows: list) -> float:
+    items = open_items(engine)
+    start = time.perf_counter()
+    items.add_rows(rows)
+    return time.perf_counter() - start
+
+def check(engine, n: int):
+    # Everything reached storage: a fresh engine over the same files sees every row
+    items = open_items(engine)
+    assert len(items.rows) == n, (len(items.rows), n)
+    assert len(items.get_rows_by_column_value("order_id", "O00000000")) == min(n, 3)
+
+def run(label: str, make_engine, rows: list, sample: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed = one_by_one(make_engine(os.path.join(tmp, "a")), rows[:sample])
+        per_row = elapsed / sample
+        print(f"  {label:<16} add_row  x{sample:<9} {elapsed:8.2f} s   "
+              f"(~{per_row * len(rows):,.0f} s for {len(rows):,})")
+
+        elapsed = bulk(make_engine(os.path.join(tmp, "b")), rows)
+        check(make_engine(os.path.join(tmp, "b")), len(rows))
+        print(f"  {label:<16} add_rows x{len(rows):<9} {elapsed:8.2f} s   "
+              f"({len(rows) / elapsed:,.0f} rows/s)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    sample = min(args.sample, args.rows)
+
+    def sqlite_engine(path):
+        os.makedirs(path, exist_ok=True)
+        return SqliteEngine(os.path.join(path, "awe.sqlite3"))
+
+    def csv_engine(path, **options):
+        os.makedirs(path, exist_ok=True)
+        return CsvEngine(path, **options)
+
+    run("csv", lambda path: csv_engine(path), rows, sample)
+    run("csv journaled", lambda path: csv_engine(path, journaled=True), rows, sample)
+    run("csv compact", lambda path: csv_engine(path, journaled=True, compact_rows=True), rows, sample)
+    run("sqlite", sqlite_engine, rows, sample)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# backend/benchmarks/bench_engines.py
+#
+# CSV engine (journaled Table) vs. SQLite engine on the two workloads that matter for the shop:
+#   - checkout:  add a few lines to a customer's cart partition, read it back, write the order
+#                row and its order_items lines, clear the cart (as ShoppingCart + Order do)
+#   - analytics: recompute revenue / units per product over every order through the order_id
+#                index (SalesAggregate.recompute), plus a total_cost range query and
+#                per-customer order lookups
+# Each engine gets its own throw-away directory, never backend/data.
+#
+#   cd backend
+#   python benchmarks/bench_engines.py --orders 20000 --checkouts 500
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import CsvEngine
+from models.sqlite_engine import SqliteEngine
+
+ORDER_COLUMNS = ["order_id", "customer_id", "total_cost", "items", "status", "created_at"]
+ITEM_COLUMNS = ["order_id", "product_id", "quantity", "unit_price"]
+CART_COLUMNS = ["product_id", "quantity"]
+
+def open_tables(engine):
+    orders = engine.open_table("order", ORDER_COLUMNS)
+    orders.create_index("order_id")
+    orders.create_index("customer_id")
+    orders.create_index("total_cost", kind="sorted", key=float)
+    items = engine.open_table("order_items", ITEM_COLUMNS)
+    items.create_index("order_id")
+    return orders, items
+
+def seed(engine, n: int):
+    rng = random.Random(42)
+    orders, items = open_tables(engine)
+    order_rows, item_rows = [], []
+    for i in range(n):
+        order_id = f"O{i:08d}"
+        lines = [(str(rng.randint(1, 500)), rng.randint(1, 4), round(rng.uniform(5, 500), 2))
+                 for _ in range(rng.randint(1, 4))]
+        order_rows.append({"order_id": order_id, "customer_id": f"C{rng.randint(1, 2000):04d}",
+                           "total_cost": f"{sum(q * p for _, q, p in lines):.2f}", "items": "[]",
+                           "status": "Paid", "created_at": "2026-01-01T00:00:00Z"})
+        item_rows.extend({"order_id": order_id, "product_id": pid, "quantity": str(q), "unit_price": str(p)}
+                         for pid, q, p in lines)
+    orders.rows = order_rows
+    orders.save()
+    items.rows = item_rows
+    items.save()
+    engine.close()
+
+def checkout(engine, carts, orders, items, customer_id: str, n: int, rng):
+    # One table object per cart partition, as DatabaseManager.get_partition keeps them
+    cart = carts.get(customer_id)
+    if cart is None:
+        cart = carts[customer_id] = engine.open_table(f"carts/{customer_id}", CART_COLUMNS)
+        cart.create_index("product_id")
+    for _ in range(3):
+        pid = str(rng.randint(1, 500))
+        with cart.lock.write():
+            positions = cart.indexes["product_id"].lookup(pid)
+            if positions:
+                qty = int(cart.rows[positions[0]]["quantity"]) + 1
+                cart.update_column_value_by_index(positions[0], "quantity", str(qty))
+            else:
+                cart.add_row({"product_id": pid, "quantity": "1"})
+    lines = [(row["product_id"], int(row["quantity"])) for row in cart.rows]
+
+    order_id = f"N{customer_id}-{n}"
+    for pid, qty in lines:
+        items.add_row({"order_id": order_id, "product_id": pid, "quantity": str(qty), "unit_price": "9.99"})
+    orders.add_row({"order_id": order_id, "customer_id": customer_id, "total_cost": f"{9.99 * len(lines):.2f}",
+                    "items": "[]", "status": "Paid", "created_at": "2026-01-01T00:00:00Z"})
+    cart.rows = []
+    cart.save()
+
+def analytics(orders, items) -> int:
+    revenue_cents, units = 0, {}
+    for row in orders.rows:
+        revenue_cents += round(float(row["total_cost"]) * 100)
+        for pos in items.indexes["order_id"].lookup(row["order_id"]):
+            line = items.rows[pos]
+            units[line["product_id"]] = units.get(line["product_id"], 0) + int(line["quantity"])
+    big = orders.get_rows_in_range("total_cost", 1000.0, None)
+    for c in range(1, 201):
+        orders.get_rows_by_column_value("customer_id", f"C{c:04d}")
+    return revenue_cents + len(big)
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<40} {elapsed * 1000:9.1f} ms")
+    return elapsed, result
+
+def run(engine_name: str, make_engine, args):
+    print(engine_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        timed(f"seed {args.orders} orders", lambda: seed(make_engine(tmp), args.orders))
+        engine = make_engine(tmp)
+        orders, items = timed("open (cold)", lambda: open_tables(engine))[1]
+
+        rng = random.Random(7)
+        carts = {}
+        elapsed, _ = timed(f"{args.checkouts} checkouts, 1 thread", lambda: [
+            checkout(engine, carts, orders, items, f"C{rng.randint(1, 2000):04d}", n, rng)
+            for n in range(args.checkouts)])
+        print(f"  {'':<40} {args.checkouts / elapsed:9.0f} checkouts/s")
+
+        def threaded():
+            def worker(t):
+                trng = random.Random(t)
+                for n in range(args.checkouts // args.threads):
+                    checkout(engine, carts, orders, items, f"T{t:02d}", n, trng)
+            threads = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        elapsed, _ = timed(f"{args.checkouts} checkouts, {args.threads} threads", threaded)
+        print(f"  {'':<40} {args.checkouts / elapsed:9.0f} checkouts/s")
+
+        timed("analytics (recompute + range + lookups)", lambda: analytics(orders, items))
+        engine.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--checkouts", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    run("csv (journaled)", lambda tmp: CsvEngine(tmp, journaled=True), args)
+    run("sqlite (WAL)", lambda tmp: SqliteEngine(os.path.join(tmp, "awe.sqlite3")), args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# backend/benchmarks/bench_product_import.py
+#
+# Streams a generated supplier feed of --megabytes through import_products() (the code behind
+# POST /api/admin/products/import) and reports throughput and peak memory of this process.
+# The feed is produced on the fly, so the only thing that can grow is the table itself:
+# use --engine sqlite to keep that on disk too and see the bounded memory of the import path.
+# Runs against a throw-away directory, never backend/data.
+#
+#   cd backend
+#   python benchmarks/bench_product_import.py --megabytes 1024 --engine sqlite
+
+import io
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import CsvEngine
+from models.sqlite_engine import SqliteEngine
+from models.data_transfer import TransferProgress, import_products
+
+PRODUCT_COLUMNS = ["product_id", "name", "description", "price"]
+
+class GeneratedFeed(io.RawIOBase):
+
+    #A CSV feed of about size bytes, generated as it is read. Every 1000th row is invalid.
+
+
+    def __init__(self, size: int, products: int):
+        self.size = size
+        self.products = products
+        self.produced = 0
+        self.n = 0
+        self.buffer = b"product_id,name,description,price\n"
+
+    def readable(self):
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while len(self.buffer) < size and self.produced < self.size:
+            lines = []
+            for _ in range(1000):
+                n, self.n = self.n, self.n + 1
+                price = "n/a" if n % 1000 == 999 else f"{n % 500}.99"
+                lines.append(f"P{n % self.products},Product {n},\"Supplier item {n}, "
+                             f"{'long description ' * 4}\",{price}\n")
+            chunk = "".join(lines).encode("utf-8")
+            self.produced += len(chunk)
+            self.buffer += chunk
+        out, self.buffer = self.buffer[:size], self.buffer[size:]
+        return out
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, default=1024)
+    parser.add_argument("--products", type=int, default=200000,
+                        help="distinct product ids; rows beyond this update existing products")
+    parser.add_argument("--engine", choices=["csv", "sqlite"], default="sqlite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.engine == "sqlite":
+            engine = SqliteEngine(os.path.join(tmp, "awe.sqlite3"))
+        else:
+            engine = CsvEngine(tmp, journaled=True, compact_rows=True)
+        table = engine.open_table("products", PRODUCT_COLUMNS)
+        before = peak_rss_mb()
+
+        progress = TransferProgress("import", "products")
+        start = time.perf_counter()
+        import_products(GeneratedFeed(args.megabytes * 2**20, args.products), table, progress)
+        elapsed = time.perf_counter() - start
+
+        info = progress.info()
+        print(f"{args.engine}: {info['bytes'] / 2**20:,.0f} MB, {info['rows']:,} rows imported, "
+              f"{info['rejected']:,} rejected, {len(table.rows):,} products in {elapsed:.1f}s")
+        print(f"  {info['bytes'] / 2**20 / elapsed:,.1f} MB/s, {info['rows'] / elapsed:,.0f} rows/s")
+        print(f"  peak RSS {before:,.0f} MB before, {peak_rss_mb():,.0f} MB after")
+        engine.close()
+
+if __name__ == "__main__":
+    main()
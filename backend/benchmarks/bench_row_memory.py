@@ -0,0 +1,51 @@
+# backend/benchmarks/bench_row_memory.py
+#
+# Memory held by a loaded 'order' table: one dict per row vs. CompactRow (shared schema +
+# value tuple). Runs against a throw-away directory, never backend/data.
+#
+#   cd backend
+#   python benchmarks/bench_row_memory.py --rows 200000
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Table
+from bench_startup import COLUMNS, make_rows
+
+def measure(label: str, path: str, **options):
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = Table("order", COLUMNS, path=path, **options)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<14} {current / 1e6:8.1f} MB  {current / len(table.rows):6.0f} B/row  "
+          f"load {elapsed * 1000:7.1f} ms")
+    return table
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed = Table("order", COLUMNS, path=tmp)
+        seed.rows = make_rows(args.rows)
+        seed.save()
+        del seed
+        print(f"order.csv: {args.rows} rows")
+
+        dict_table = measure("dict rows", tmp)
+        compact_table = measure("compact rows", tmp, compact_rows=True)
+
+        # Both layouts must hold the same data
+        assert all(a == b for a, b in zip(dict_table.rows, compact_table.rows))
+
+if __name__ == "__main__":
+    main()
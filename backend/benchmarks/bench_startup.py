@@ -0,0 +1,69 @@
+# backend/benchmarks/bench_startup.py
+#
+# Cold-boot cost of loading a large 'order' table: CSV parse vs. binary startup snapshot.
+# Runs against a throw-away directory, never backend/data.
+#
+#   cd backend
+#   python benchmarks/bench_startup.py --rows 200000
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Table
+
+COLUMNS = ["order_id", "customer_id", "total_cost", "items", "status", "created_at"]
+
+def make_rows(n: int) -> list:
+    rng = random.Random(42)
+    return [{
+        "order_id": f"O{i:08d}",
+        "customer_id": f"C{rng.randint(1, 5000):04d}",
+        "total_cost": f"{rng.uniform(5, 2000):.2f}",
+        "items": json.dumps([{"product_id": str(rng.randint(1, 500)), "quantity": rng.randint(1, 4)}
+                             for _ in range(rng.randint(1, 5))]),
+        "status": "Paid",
+        "created_at": "2026-01-01T00:00:00Z",
+    } for i in range(n)]
+
+def timed(label: str, fn, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<34} {best * 1000:9.1f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snap_dir = os.path.join(tmp, ".snapshots")
+        seed = Table("order", COLUMNS, path=tmp)
+        seed.rows = make_rows(args.rows)
+        seed.save()
+        print(f"order.csv: {args.rows} rows, {os.path.getsize(seed.file_path) / 1e6:.1f} MB")
+
+        timed("CSV parse (no snapshot)", lambda: Table("order", COLUMNS, path=tmp))
+        # First snapshot-enabled load parses the CSV and writes the snapshot
+        Table("order", COLUMNS, path=tmp, snapshot_dir=snap_dir)
+        table = timed("binary snapshot", lambda: Table("order", COLUMNS, path=tmp, snapshot_dir=snap_dir))
+        assert len(table.rows) == args.rows
+
+        # Touching the CSV makes the snapshot stale; the next boot falls back to CSV
+        os.utime(seed.file_path)
+        timed("stale snapshot -> CSV fallback", lambda: Table("order", COLUMNS, path=tmp, snapshot_dir=snap_dir),
+              repeat=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# backend/benchmarks/fake_gateway.py
+#
+# A fake payment gateway speaking the protocol of models/payment_strategies/gateway.py, with
+# faults that can be injected (and changed while it runs):
+#   latency       seconds every request waits before it is processed
+#   slow_rate     share of requests that wait slow_latency seconds instead
+#   fail_rate     share answered 503 without charging
+#   drop_rate     share charged, after which the connection is closed with no reply
+#   decline_rate  share answered {"approved": false}
+# Charges are deduplicated by Idempotency-Key, like a real gateway: a repeated key gets the
+# first reply back, and a key still being processed waits for it. charges counts the distinct
+# payments taken, requests every request received, connections every connection accepted.
+#
+#   gw = FakeGateway(latency=0.05).start()      # in this process, on a background thread
+#   os.environ["AWE_PAYMENT_GATEWAY"] = gw.url
+#   ...
+#   gw.stop()
+#
+#   python benchmarks/fake_gateway.py --port 9100 --latency 200   (standalone, latency in ms)
+
+import json
+import random
+import asyncio
+import argparse
+import threading
+
+class FakeGateway:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 1.0, fail_rate: float = 0.0,
+                 drop_rate: float = 0.0, decline_rate: float = 0.0, seed: int = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.decline_rate = decline_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.connections = 0
+        self.replies = {}           # Idempotency-Key -> future of (status, body)
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/charge"
+
+    @property
+    def charges(self) -> int:
+        return len(self.replies)
+
+    def reset_counts(self):
+        self.requests = 0
+        self.connections = 0
+        self.replies = {}
+
+    def _charge(self, body: bytes):
+        #(status, body, drop) for one new charge
+        if self.random.random() < self.fail_rate:
+            return 503, b'{"error": "unavailable"}', False
+        approved = self.random.random() >= self.decline_rate
+        return 200, json.dumps({"approved": approved}).encode(), self.random.random() < self.drop_rate
+
+    async def _reply(self, key: str, body: bytes):
+        if key and key in self.replies:
+            status, reply = await asyncio.shield(self.replies[key])
+            return status, reply, False
+        future = self._loop.create_future()
+        if key:
+            self.replies[key] = future
+        status, reply, drop = self._charge(body)
+        if status >= 500:
+            # Nothing was charged: the key may be tried again
+            self.replies.pop(key, None)
+        future.set_result((status, reply))
+        return status, reply, drop
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = {}
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    if line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                # Queueing and network time, per request: a second request (a hedge) for the
+                # same charge may well overtake a slow one
+                await asyncio.sleep(self.slow_latency if self.random.random() < self.slow_rate else self.latency)
+                status, reply, drop = await self._reply(headers.get("idempotency-key"), body)
+                if drop:
+                    break
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                             % (status, b"OK" if status == 200 else b"Service Unavailable", len(reply), reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start_server(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        #Serve on a background thread of this process; returns once it accepts connections
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self._start_server())
+            ready.set()
+            loop.run_forever()
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-gateway", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        def shutdown():
+            self._server.close()
+            # Open keep-alive connections are cut off, as by a gateway restart
+            for task in asyncio.all_tasks(self._loop):
+                task.cancel()
+            self._loop.call_soon(self._loop.stop)
+        self._loop.call_soon_threadsafe(shutdown)
+        self._thread.join()
+
+    def serve_forever(self):
+        async def main():
+            await self._start_server()
+            async with self._server:
+                await self._server.serve_forever()
+        asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0, help="ms")
+    parser.add_argument("--fail-rate", type=float, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0)
+    args = parser.parse_args()
+    FakeGateway(args.host, args.port, latency=args.latency / 1000, fail_rate=args.fail_rate,
+                drop_rate=args.drop_rate).serve_forever()
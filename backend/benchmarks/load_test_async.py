@@ -0,0 +1,201 @@
+# backend/benchmarks/load_test_async.py
+#
+# Checkout load test of the two serving modes against a fake payment gateway (fake_gateway.py)
+# that takes --latency ms to approve each charge:
+#   sync   the Flask app on a pool of --threads request threads (like gunicorn --threads)
+#   async  async_app.py, where a checkout waiting on the gateway holds no thread
+# --concurrency clients each add an item to a cart and pay, over and over, for --duration
+# seconds. Reports checkouts per second and payment latency for each mode. Both servers are
+# single processes running on a copy of backend/data in a throw-away directory.
+#
+#   cd backend
+#   python benchmarks/load_test_async.py --concurrency 64 --latency 200
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_gateway import FakeGateway
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CUSTOMERS = ["C001", "C002"]
+PAYMENT = {"paymentMethod": "credit", "payment_details": {"card_number": "4111111111111111",
+                                                          "expiry": "12/30", "cvv": "123", "name": "Load Test"}}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# The sync server (run in its own process)
+# ─────────────────────────────────────────────────────────────────────────────
+def serve_sync(port: int, threads: int):
+    import logging
+    from werkzeug.serving import BaseWSGIServer
+
+    sys.path.insert(0, os.getcwd())
+    from app import app
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    class PooledWSGIServer(BaseWSGIServer):
+
+        #Werkzeug's server with a fixed pool of request threads, like a gunicorn gthread worker:
+        #at most `threads` requests are in progress, the rest wait for a free thread.
+
+        multithread = True
+
+        def __init__(self, *args, threads: int, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer("127.0.0.1", port, app, threads=threads).serve_forever()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Load generator
+# ─────────────────────────────────────────────────────────────────────────────
+async def http_post(port: int, path: str, payload: dict):
+    body = json.dumps(payload).encode("utf-8")
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write((f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                      f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                      f"Connection: close\r\n\r\n").encode("ascii") + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+async def client(n: int, port: int, deadline: float, stats: dict):
+    customer = CUSTOMERS[n % len(CUSTOMERS)]
+    while time.perf_counter() < deadline:
+        try:
+            await http_post(port, f"/api/cart/{customer}/add", {"product_id": str(n % 5 + 1), "quantity": 1})
+            start = time.perf_counter()
+            status = await http_post(port, "/api/payment", {"customerId": customer, **PAYMENT})
+        except (OSError, ValueError, IndexError):
+            stats["errors"] += 1
+            await asyncio.sleep(0.05)
+            continue
+        if status == 200:
+            stats["latencies"].append(time.perf_counter() - start)
+        else:
+            stats["errors"] += 1
+
+async def generate_load(port: int, concurrency: int, duration: float) -> dict:
+    stats = {"latencies": [], "errors": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n, port, start + duration, stats) for n in range(concurrency)))
+    # Requests in flight at the deadline are waited for, and counted, so rates use the real time
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+def wait_until_up(port: int, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+def run_mode(mode: str, args, gateway_port: int) -> dict:
+    # A fresh copy of the app and its data for every mode
+    workdir = tempfile.mkdtemp(prefix=f"awe-load-{mode}-")
+    for name in ("app.py", "async_app.py"):
+        shutil.copy(os.path.join(BACKEND, name), workdir)
+    for name in ("models", "data"):
+        shutil.copytree(os.path.join(BACKEND, name), os.path.join(workdir, name),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+
+    port = free_port()
+    env = dict(os.environ, AWE_PAYMENT_GATEWAY=f"http://127.0.0.1:{gateway_port}/charge",
+               AWE_STORAGE_ENGINE=args.engine)
+    if mode == "sync":
+        cmd = [sys.executable, os.path.abspath(__file__), "--serve-sync", str(port), "--threads", str(args.threads)]
+    else:
+        cmd = [sys.executable, "async_app.py", "--port", str(port)]
+    server = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(port)
+        stats = asyncio.run(generate_load(port, args.concurrency, args.duration))
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = stats["latencies"]
+    return {
+        "checkouts": len(latencies),
+        "checkouts_per_second": len(latencies) / stats["seconds"],
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": stats["errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=200, help="gateway latency in ms")
+    parser.add_argument("--threads", type=int, default=8, help="request threads of the sync server")
+    parser.add_argument("--engine", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--serve-sync", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_sync:
+        serve_sync(args.serve_sync, args.threads)
+        return
+
+    gateway_port = free_port()
+    fake = FakeGateway(port=gateway_port, latency=args.latency / 1000)
+    gateway = multiprocessing.Process(target=fake.serve_forever, daemon=True)
+    gateway.start()
+    wait_until_up(gateway_port)
+    print(f"gateway latency {args.latency:.0f} ms, {args.concurrency} clients, {args.duration:.0f} s per mode, "
+          f"engine {args.engine}")
+    try:
+        for mode in args.modes.split(","):
+            r = run_mode(mode, args, gateway_port)
+            label = f"sync ({args.threads} threads)" if mode == "sync" else "async"
+            print(f"{label:<20} {r['checkouts']:>6} checkouts  {r['checkouts_per_second']:>8.1f}/s  "
+                  f"p50 {r['p50_ms']:>7.1f} ms  p99 {r['p99_ms']:>7.1f} ms  errors {r['errors']}")
+    finally:
+        gateway.terminate()
+
+
+if __name__ == "__main__":
+    main()
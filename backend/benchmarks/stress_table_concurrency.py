@@ -0,0 +1,178 @@
+# backend/benchmarks/stress_table_concurrency.py
+#
+# Many threads issuing mixed reads and writes against Table, checking that no update is lost.
+#   - increments: read-modify-write of shared counters, the add-to-cart pattern (CartStore.increment)
+#   - appends:    add_row on an append-only table, the checkout pattern (Order.save_order)
+#   - reads:      indexed lookups, and raw reads of the CSV file while it is being rewritten
+# At the end the in-memory totals, and the totals reloaded from disk, must match what was issued.
+# With --processes N, N worker processes (each with --threads threads) share the same files
+# through Table(shared=True), as gunicorn workers would.
+# Runs against a throw-away directory, never backend/data. Exits non-zero on any mismatch.
+#
+#   cd backend
+#   python benchmarks/stress_table_concurrency.py --threads 32 --ops 300
+#   python benchmarks/stress_table_concurrency.py --journaled
+#   python benchmarks/stress_table_concurrency.py --journaled --processes 4 --threads 8
+
+import os
+import csv
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Table
+
+COUNTER_COLUMNS = ["key", "value"]
+EVENT_COLUMNS = ["event_id", "thread", "amount"]
+
+def increment(table: Table, key: str, amount: int):
+    with table.lock.write():
+        row = table.get_row_by_column_value("key", key)
+        if row is None:
+            table.add_row({"key": key, "value": str(amount)})
+        else:
+            pos = table.indexes["key"].lookup(key)[0]
+            table.update_column_value_by_index(pos, "value", str(int(row["value"]) + amount))
+
+def open_tables(tmp: str, args):
+    options = {"journaled": args.journaled, "compact_threshold": 50, "shared": args.processes > 1}
+    counters = Table("counters", COUNTER_COLUMNS, path=tmp, **options)
+    counters.create_index("key")
+    events = Table("events", EVENT_COLUMNS, path=tmp, **options)
+    events.create_index("thread")
+    return counters, events
+
+def worker(n: int, args, counters: Table, events: Table, issued: dict, errors: list):
+    rng = random.Random(n)
+    mine = {}
+    appended = 0
+    try:
+        for i in range(args.ops):
+            op = rng.random()
+            if op < 0.4:
+                key = f"k{rng.randrange(args.keys)}"
+                amount = rng.randint(1, 5)
+                increment(counters, key, amount)
+                mine[key] = mine.get(key, 0) + amount
+            elif op < 0.6:
+                events.add_row({"event_id": f"{n}-{i}", "thread": str(n), "amount": str(rng.randint(1, 9))})
+                appended += 1
+            else:
+                counters.get_row_by_column_value("key", f"k{rng.randrange(args.keys)}")
+                events.get_rows_by_column_value("thread", str(rng.randrange(args.threads * args.processes)))
+    except Exception as e:
+        errors.append(f"thread {n}: {e!r}")
+    finally:
+        issued[n] = (mine, appended)
+
+def file_reader(path: str, stop: threading.Event, errors: list):
+    # The file is only ever swapped whole, so every read must see a complete header and rows
+    reads = 0
+    while not stop.is_set():
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+        except FileNotFoundError:
+            errors.append("CSV missing during rewrite")
+            return
+        if not rows or rows[0] != EVENT_COLUMNS:
+            errors.append(f"torn CSV header after {reads} reads: {rows[:1]}")
+            return
+        if any(len(r) != len(EVENT_COLUMNS) for r in rows[1:]):
+            errors.append(f"torn CSV row after {reads} reads")
+            return
+        reads += 1
+
+def run_threads(counters: Table, events: Table, args, proc: int = 0):
+    # args.threads worker threads; returns ([(increments, appends) per thread], errors)
+    issued, errors = {}, []
+    threads = [threading.Thread(target=worker, args=(proc * args.threads + n, args, counters, events, issued, errors))
+               for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return list(issued.values()), errors
+
+def run_process(tmp: str, args, proc: int):
+    # One worker process, with its own Table instances over the shared files
+    counters, events = open_tables(tmp, args)
+    return run_threads(counters, events, args, proc)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=300)
+    parser.add_argument("--keys", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--journaled", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        counters, events = open_tables(tmp, args)
+
+        stop = threading.Event()
+        reader_errors = []
+        reader = threading.Thread(target=file_reader, args=(events.file_path, stop, reader_errors))
+
+        start = time.perf_counter()
+        reader.start()
+        if args.processes > 1:
+            with multiprocessing.Pool(args.processes) as pool:
+                results = pool.starmap(run_process, [(tmp, args, p) for p in range(args.processes)])
+            # This process took no part; catch up with everything the workers wrote
+            counters.sync()
+            events.sync()
+        else:
+            results = [run_threads(counters, events, args)]
+        stop.set()
+        reader.join()
+        elapsed = time.perf_counter() - start
+
+        issued = [entry for entries, _ in results for entry in entries]
+        errors = reader_errors + [e for _, errs in results for e in errs]
+
+        expected = {}
+        for mine, _ in issued:
+            for key, amount in mine.items():
+                expected[key] = expected.get(key, 0) + amount
+        expected_events = sum(appended for _, appended in issued)
+
+        def totals(table):
+            return {row["key"]: int(row["value"]) for row in table.rows}
+
+        options = {"journaled": args.journaled}
+        reloaded_counters = Table("counters", COUNTER_COLUMNS, path=tmp, **options)
+        reloaded_events = Table("events", EVENT_COLUMNS, path=tmp, **options)
+        event_ids = [row["event_id"] for row in events.rows]
+        writers = args.threads * args.processes
+
+        checks = [
+            ("counters in memory", totals(counters) == expected),
+            ("counters reloaded from disk", totals(reloaded_counters) == expected),
+            ("every append kept", len(event_ids) == expected_events),
+            ("no duplicate events", len(event_ids) == len(set(event_ids))),
+            ("events reloaded from disk", [r["event_id"] for r in reloaded_events.rows] == event_ids),
+            ("index agrees with rows", sum(len(events.get_rows_by_column_value("thread", str(n)))
+                                           for n in range(writers)) == len(event_ids)),
+            ("no thread errors", not errors),
+        ]
+
+        ops = writers * args.ops
+        mode = "journaled" if args.journaled else "CSV rewrite"
+        print(f"{args.processes} process(es) x {args.threads} threads x {args.ops} ops ({mode}): "
+              f"{ops} ops in {elapsed:.2f}s, {len(event_ids)} events, {sum(expected.values())} increments")
+        for label, ok in checks:
+            print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+        for error in errors[:10]:
+            print(f"  {error}")
+        sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+if __name__ == "__main__":
+    main()
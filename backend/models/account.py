@@ -14,6 +14,8 @@ class Account(abc.ABC):
         if table is None:
             raise ValueError("Table 'accounts' does not exist")
 
+        # No-op after the first account; turns the lookup below into a hash probe
+        table.create_index("account_id")
         self.my_record = table.get_row_by_column_value("account_id", self.account_id)
         if self.my_record is None:
             raise ValueError(f"Account ID '{self.account_id}' not found in accounts table")
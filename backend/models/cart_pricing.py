@@ -0,0 +1,64 @@
+# backend/models/cart_pricing.py
+
+import weakref
+from decimal import Decimal, ROUND_HALF_UP
+from threading import RLock
+
+from models.database import SingletonMeta
+
+def to_cents(price) -> int:
+    #Price in whole cents, rounded half up ('19.995' -> 2000), so totals never drift.
+    return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class CartPricing(metaclass=SingletonMeta):
+
+    #Unit prices in integer cents, and the running subtotal of every open ShoppingCart.
+    #A cart's subtotal changes by price x quantity on each add (O(1)) and drops to 0 on clear,
+    #so reading a cart's total never walks its lines. When prices change, update_prices()
+    #adjusts only the carts that hold a changed product, found through holders.
+    #Every subtotal change happens under one lock, so a reprice never interleaves with an add.
+
+
+    def __init__(self):
+        self.prices = {}            # product_id -> unit price in cents
+        self.holders = {}           # product_id -> WeakSet of carts that contain it
+        self.lock = RLock()
+
+    def price_of(self, product_id: str):
+        #Unit price in cents, or None for a product not (or no longer) on sale.
+        return self.prices.get(product_id)
+
+    def update_prices(self, prices: dict) -> int:
+
+        #Replace the price list ({product_id: price}) and reprice every open cart holding a
+        #product whose price changed, or that was removed (it then counts as 0).
+        #Returns the number of carts repriced.
+
+        new_prices = {str(pid): to_cents(price) for pid, price in prices.items()}
+        with self.lock:
+            old_prices, self.prices = self.prices, new_prices
+            changed = {pid for pid in old_prices.keys() | new_prices.keys()
+                       if old_prices.get(pid) != new_prices.get(pid)}
+            repriced = set()
+            for pid in changed:
+                delta = (new_prices.get(pid) or 0) - (old_prices.get(pid) or 0)
+                for cart in list(self.holders.get(pid, ())):
+                    qty = cart.items.get(pid)
+                    if qty:
+                        cart.subtotal_cents += delta * qty
+                        repriced.add(id(cart))
+            return len(repriced)
+
+    def subtotal(self, cart, items: dict) -> int:
+        #Subtotal in cents of items, registering cart as a holder of each product. Call with lock held.
+        total = 0
+        for pid, qty in items.items():
+            self.holders.setdefault(pid, weakref.WeakSet()).add(cart)
+            total += (self.prices.get(pid) or 0) * qty
+        return total
+
+    def add(self, cart, product_id: str, quantity: int) -> int:
+        #Cents a change of quantity units of product_id adds to cart. Call with lock held.
+        self.holders.setdefault(product_id, weakref.WeakSet()).add(cart)
+        return (self.prices.get(product_id) or 0) * quantity
@@ -0,0 +1,75 @@
+# backend/models/cart_store.py
+
+from models.database import DatabaseManager, SingletonMeta
+
+CART_COLUMNS = ["product_id", "quantity"]
+
+class CartStore(metaclass=SingletonMeta):
+
+    #Cart storage partitioned by customer_id.
+    #Each customer's cart is its own table (data/carts/<customer_id>.csv, one row per product),
+    #so reading, incrementing or clearing a cart never touches another customer's rows.
+    #Rows still sitting in the old shared 'carts' table are moved into partitions once, on startup.
+
+
+    def __init__(self):
+        self.dbm = DatabaseManager()
+        self._migrate_shared_table()
+
+    def _migrate_shared_table(self):
+        legacy = self.dbm.get_table("carts")
+        if legacy is None or not legacy.rows:
+            return
+
+        carts = {}
+        for row in legacy.rows:
+            items = carts.setdefault(row["customer_id"], {})
+            items[row["product_id"]] = items.get(row["product_id"], 0) + int(row["quantity"])
+
+        # Partitions are overwritten, not added to, so re-running after a crash is harmless
+        for customer_id, items in carts.items():
+            table = self.partition(customer_id)
+            table.rows = [{"product_id": pid, "quantity": str(qty)} for pid, qty in items.items()]
+            table.save()
+
+        # Emptied only after every partition has been written
+        legacy.rows = []
+        legacy.save()
+
+    def partition(self, customer_id: str):
+        table = self.dbm.get_partition("carts", customer_id, CART_COLUMNS)
+        table.create_index("product_id")
+        return table
+
+    def get_items(self, customer_id: str) -> dict:
+        #Return {product_id: quantity} for this customer only.
+        table = self.partition(customer_id)
+        table.sync()
+        items = {}
+        with table.lock.read():
+            for row in table.rows:
+                items[row["product_id"]] = items.get(row["product_id"], 0) + int(row["quantity"])
+        return items
+
+    def increment(self, customer_id: str, product_id: str, quantity: int) -> int:
+        #Add quantity to one cart line and return the line's new quantity.
+        table = self.partition(customer_id)
+        product_id = str(product_id)
+        # Read and write under one lock, so concurrent add-to-carts cannot lose an increment
+        with table.lock.write():
+            positions = table.indexes["product_id"].lookup(product_id)
+            if positions:
+                pos = positions[0]
+                new_qty = int(table.rows[pos]["quantity"]) + int(quantity)
+                table.update_column_value_by_index(pos, "quantity", str(new_qty))
+            else:
+                new_qty = int(quantity)
+                table.add_row({"product_id": product_id, "quantity": str(new_qty)})
+        return new_qty
+
+    def clear(self, customer_id: str):
+        table = self.partition(customer_id)
+        with table.lock.write():
+            if table.rows:
+                table.rows = []
+                table.save()
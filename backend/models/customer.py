@@ -26,7 +26,6 @@ class Customer(Account):
 
         # Initialize this customer's cart
         self.shopping_cart = ShoppingCart(self.customer_id)
-        print(f"Initialized shopping cart for customer {self.customer_id} with items: {self.shopping_cart.get_cart_items()}")
         
 
     def get_cart(self):
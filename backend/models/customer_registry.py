@@ -0,0 +1,98 @@
+# backend/models/customer_registry.py
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from models.database import DatabaseManager
+from models.customer import Customer
+
+class CustomerRegistry:
+
+    #Dict-like access to Customer objects, built on first use instead of at startup.
+    #Built customers are kept in LRU order; the least recently used are evicted once more than
+    #max_size are held, and any customer idle for longer than ttl seconds is rebuilt on next use.
+    #Membership and listing read the indexed 'customers' table, so neither builds a Customer.
+    #An evicted customer's cart partition is released with it (see DatabaseManager.get_partition).
+
+
+    def __init__(self, max_size: int = 10000, ttl: float = 900.0):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        dbm = DatabaseManager()
+        self.table = dbm.get_table("customers")
+        if self.table is None:
+            self.table = dbm.create_table("customers", ["customer_id", "account_id"])
+        self.table.create_index("customer_id")
+        self.accounts = dbm.get_table("accounts")
+        if self.accounts is not None:
+            self.accounts.create_index("account_id")
+
+        self._cache = OrderedDict()   # customer_id -> (Customer, last access time)
+        self._lock = Lock()
+
+    def _sync(self):
+        self.table.sync()
+        if self.accounts is not None:
+            self.accounts.sync()
+
+    def _has_account(self, customer_id: str) -> bool:
+        # A customer row is only usable if its account exists (Customer() raises otherwise)
+        return self.accounts is not None and bool(self.accounts.indexes["account_id"].lookup(customer_id))
+
+    def _is_valid(self, customer_id: str) -> bool:
+        self._sync()
+        return bool(self.table.indexes["customer_id"].lookup(customer_id)) and self._has_account(customer_id)
+
+    def _evict(self, now: float):
+        # Entries are in access order, so expired ones, then surplus ones, are at the front.
+        # Run on every get(), so the bound and ttl hold without new customers coming in.
+        while self._cache:
+            _, (_, last_access) = next(iter(self._cache.items()))
+            if len(self._cache) <= self.max_size and now - last_access <= self.ttl:
+                break
+            self._cache.popitem(last=False)
+
+    def get(self, customer_id: str, default=None):
+        customer_id = str(customer_id)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._cache.get(customer_id)
+            if entry is not None:
+                self._cache[customer_id] = (entry[0], now)
+                self._cache.move_to_end(customer_id)
+                return entry[0]
+
+        if not self._is_valid(customer_id):
+            return default
+        try:
+            customer = Customer(customer_id)
+        except ValueError:
+            return default
+
+        with self._lock:
+            # Another thread may have built it meanwhile; keep that one unless it has expired
+            entry = self._cache.get(customer_id)
+            if entry is not None and now - entry[1] <= self.ttl:
+                customer = entry[0]
+            self._cache[customer_id] = (customer, now)
+            self._cache.move_to_end(customer_id)
+            self._evict(now)
+        return customer
+
+    def __getitem__(self, customer_id: str):
+        customer = self.get(customer_id)
+        if customer is None:
+            raise KeyError(customer_id)
+        return customer
+
+    def __contains__(self, customer_id) -> bool:
+        return self._is_valid(str(customer_id))
+
+    def customer_ids(self) -> list:
+        #IDs of every usable customer, in table order. Both tables are synced once, not per row.
+        self._sync()
+        with self.table.lock.read():
+            return [row["customer_id"] for row in self.table.rows if self._has_account(row["customer_id"])]
@@ -0,0 +1,229 @@
+# backend/models/data_transfer.py
+
+import io
+import csv
+import math
+import time
+import codecs
+import itertools
+from collections import deque
+from threading import Lock
+
+READ_SIZE = 64 * 1024           # bytes read from the upload at a time
+MAX_LINE = 1024 * 1024          # longest CSV line accepted, so one line cannot exhaust memory
+MAX_ERRORS = 50                 # rejected rows reported back in detail
+
+class TransferProgress:
+
+    #Counters for one running (or finished) import or export: rows and bytes moved, rows
+    #rejected, and throughput. Recent transfers are kept in TransferProgress.recent so an
+    #admin can poll them while a long transfer runs.
+
+
+    _ids = itertools.count(1)
+    _lock = Lock()
+    recent = deque(maxlen=20)
+
+    def __init__(self, kind: str, table: str):
+        self.id = next(self._ids)
+        self.kind = kind            # "import" | "export"
+        self.table = table
+        self.state = "running"      # -> "done" | "failed"
+        self.rows = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.errors = []            # first MAX_ERRORS rejected rows: {"line", "error"}
+        self.started = time.time()
+        self.finished = None
+        with self._lock:
+            self.recent.append(self)
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def finish(self, state: str = "done"):
+        self.state = state
+        self.finished = time.time()
+
+    def info(self) -> dict:
+        elapsed = max((self.finished or time.time()) - self.started, 1e-9)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "table": self.table,
+            "state": self.state,
+            "rows": self.rows,
+            "rejected": self.rejected,
+            "bytes": self.bytes,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1),
+            "bytes_per_second": round(self.bytes / elapsed, 1),
+            "errors": self.errors
+        }
+
+    @classmethod
+    def all_info(cls) -> list:
+        with cls._lock:
+            transfers = list(cls.recent)
+        return [t.info() for t in reversed(transfers)]
+
+
+def export_csv(table, progress: TransferProgress, chunk_rows: int = 2000):
+
+    #Yield table as CSV text, header first, chunk_rows rows per piece. Only one chunk is
+    #copied out at a time, under the read lock, so writers are never held up for the whole
+    #download. Rows added after the export starts are not included.
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    columns = list(table.columns)
+    try:
+        writer.writerow(columns)
+        table.sync()
+        total = len(table.rows)
+        for start in range(0, total, chunk_rows):
+            with table.lock.read():
+                chunk = table.rows[start:min(start + chunk_rows, total)]
+            writer.writerows([row.get(c, "") for c in columns] for row in chunk)
+            progress.rows += len(chunk)
+            piece = out.getvalue()
+            out.seek(0)
+            out.truncate()
+            progress.bytes += len(piece.encode("utf-8"))
+            yield piece
+        if out.tell():
+            piece = out.getvalue()
+            progress.bytes += len(piece.encode("utf-8"))
+            yield piece
+    except BaseException:
+        # Includes GeneratorExit when the client goes away mid-download
+        progress.finish("failed")
+        raise
+    progress.finish()
+
+
+def _read_lines(stream, progress: TransferProgress):
+    # Lines of a UTF-8 byte stream, READ_SIZE bytes at a time (a leading BOM is dropped)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    while True:
+        data = stream.read(READ_SIZE)
+        progress.bytes += len(data)
+        text = tail + decoder.decode(data, final=not data)
+        if not data:
+            if text:
+                yield text
+            return
+        # Split on '\n' only: csv handles the '\r' of '\r\n' itself, and any other
+        # line-break character is field content
+        lines = text.split("\n")
+        tail = lines.pop()
+        if len(tail) > MAX_LINE:
+            raise ValueError(f"CSV line longer than {MAX_LINE} characters")
+        for line in lines:
+            yield line + "\n"
+
+
+def _csv_rows(reader):
+    # Rows of a csv.reader; a NUL byte or a field over the csv field size limit is raised
+    # as the ValueError any other unreadable upload gets, with its line number
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            raise ValueError(f"CSV line {reader.line_num}: {e}") from e
+        yield row
+
+
+def _check_product(row: dict):
+    # The row as stored in 'products', or a ValueError saying why it is rejected
+    product_id = (row.get("product_id") or "").strip()
+    name = (row.get("name") or "").strip()
+    if not product_id:
+        raise ValueError("product_id is empty")
+    if not name:
+        raise ValueError("name is empty")
+    try:
+        price = float(row.get("price") or "")
+    except ValueError:
+        raise ValueError(f"price {row.get('price')!r} is not a number")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"price {row.get('price')!r} is out of range")
+    return {"product_id": product_id, "name": name,
+            "description": (row.get("description") or "").strip(), "price": str(price)}
+
+
+def import_products(stream, table, progress: TransferProgress, chunk_rows: int = 5000, on_chunk=None):
+
+    #Upsert products from a CSV byte stream into table, keyed by product_id.
+    #The stream is read READ_SIZE bytes at a time and rows are validated as they arrive;
+    #invalid rows are skipped and reported through progress. Valid rows are written
+    #chunk_rows at a time, each chunk as one batch, so memory stays bounded whatever the
+    #size of the upload. The header must name product_id, name and price, and no column
+    #that 'products' lacks. Raises ValueError for a bad header or a line csv cannot read.
+    #on_chunk(rows, before, after) is called after each chunk is written, with the table's
+    #version just before and just after it, so in-memory copies can apply the chunk in place
+    #when they were current at 'before'.
+
+    reader = csv.reader(_read_lines(stream, progress))
+    rows = _csv_rows(reader)
+    try:
+        header = [h.strip() for h in next(rows, [])]
+        missing = {"product_id", "name", "price"} - set(header)
+        unknown = set(header) - set(table.columns)
+        if missing or unknown or len(set(header)) != len(header):
+            raise ValueError(f"CSV header must name product_id, name and price and only columns of "
+                             f"'products' {table.columns}; got {header}")
+        table.create_index("product_id")
+
+        chunk = {}
+        for row in rows:
+            line = reader.line_num
+            if not row or row == [""]:
+                continue
+            if len(row) != len(header):
+                progress.reject(line, f"expected {len(header)} fields, got {len(row)}")
+                continue
+            try:
+                product = _check_product(dict(zip(header, row)))
+            except ValueError as e:
+                progress.reject(line, str(e))
+                continue
+            # A product listed twice keeps its last row
+            chunk[product["product_id"]] = product
+            if len(chunk) >= chunk_rows:
+                _upsert(table, chunk, progress, on_chunk)
+                chunk = {}
+        _upsert(table, chunk, progress, on_chunk)
+    except BaseException:
+        progress.finish("failed")
+        raise
+    progress.finish()
+    return progress
+
+
+def _upsert(table, products: dict, progress: TransferProgress, on_chunk=None):
+    if not products:
+        return
+    # The write lock spans the batch and both version reads, so no other change falls between them
+    with table.lock.write():
+        before = table.version
+        with table.batch():
+            index = table.indexes["product_id"]
+            updates, additions = [], []
+            for product_id, product in products.items():
+                positions = index.lookup(product_id)
+                if positions:
+                    updates.append((positions[0], product))
+                else:
+                    additions.append(product)
+            table.update_rows(updates)
+            table.add_rows(additions)
+        after = table.version
+    progress.rows += len(products)
+    if on_chunk is not None:
+        on_chunk(list(products.values()), before, after)
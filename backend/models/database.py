@@ -2,14 +2,33 @@
 
 import os
 import csv
-from threading import Lock
+import time
+import atexit
+import weakref
+import functools
+from contextlib import contextmanager
+from threading import RLock
+
+from models.table_journal import TableJournal
+from models.table_index import HashIndex, SortedIndex
+from models.table_snapshot import TableSnapshot
+from models.table_rows import RowSchema, CompactRow
+from models.table_lock import RWLock, FileLock
+from models.transaction import Transaction, TransactionLog, apply_ops
+from models.metrics import metrics
+
+TABLE_SECONDS = metrics.histogram("awe_table_seconds", "Time spent reading and writing table files",
+                                  ["table", "op"])
+TRANSACTION_SECONDS = metrics.histogram("awe_transaction_seconds",
+                                        "Time to commit a multi-table transaction, log write included")
 
 class SingletonMeta(type):
     
     #A thread-safe implementation of Singleton.
     
     _instances = {}
-    _lock: Lock = Lock()
+    # Re-entrant: a singleton may create another singleton in its __init__
+    _lock = RLock()
 
     def __call__(cls, *args, **kwargs):
         with cls._lock:
@@ -18,129 +37,936 @@ class SingletonMeta(type):
         return cls._instances[cls]
 
 
+def _reads(method):
+    # Run a Table method under the table's shared (read) lock, on rows synced with other processes
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        self.sync()
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _writes(method):
+    # Run a Table method under the table's exclusive (write) lock
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _timed(op):
+    # Time a Table method into TABLE_SECONDS; partitions ('cart/C001') count under their table
+    def decorate(method):
+        @functools.wraps(method)
+        def timed(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                TABLE_SECONDS.observe(time.perf_counter() - start, self.metric_name, op)
+        return timed
+    return decorate
+
+
+def fsync_directory(path: str):
+    # A new, renamed or removed file is only durable once its directory entry is
+    if os.name == "nt":
+        return      # directories cannot be opened for fsync there; NTFS journals its metadata
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TableBatch:
+
+    #Pending state of an open Table.batch(): how many mutations it made, the journal records
+    #to append on exit, and the undo log used to roll them back.
+
+
+    __slots__ = ("count", "records", "undo", "save")
+
+    def __init__(self):
+        self.count = 0
+        self.records = []
+        self.undo = []
+        self.save = False   # a full rewrite was requested (or is cheaper than journaling)
+
+
 class Table:
     
     #Represents a CSV-backed table.
+    #With journaled=True, mutations are appended to '<name>.journal' instead of rewriting
+    #the CSV. load() replays the journal on top of the CSV snapshot, and the journal is
+    #folded back into a fresh CSV once it grows past compact_threshold records.
+    #With snapshot_dir set, load() first tries a binary startup snapshot (see TableSnapshot)
+    #and only parses the CSV when the snapshot is missing or stale.
+    #With compact_rows=True, rows are CompactRow objects (a shared schema plus a tuple of
+    #values) instead of one dict each; they read and write like dicts.
+    #Every table has a reader/writer lock (self.lock). Lookups take it shared, mutations and
+    #saves take it exclusively. Callers doing read-modify-write (read a quantity, write it
+    #back + 1) must hold 'with table.lock.write():' around both steps.
+    #With shared=True the table stays coherent with other processes (e.g. gunicorn workers)
+    #using the same files. Taking the write lock also takes an flock on '<name>.lock' and
+    #first catches up with whatever other processes wrote. sync() does the same catch-up for
+    #readers when the CSV or journal has changed on disk. New journal records are replayed
+    #from where this process left off, and only a rewritten CSV forces a full reload.
+    #batch() groups many mutations into a single write; add_rows / update_rows / delete_rows
+    #are bulk versions of the single-row methods built on it.
     
 
-    def __init__(self, name: str, columns: list, path: str):
+    def __init__(self, name: str, columns: list, path: str,
+                 journaled: bool = False, compact_threshold: int = 1000, snapshot_dir: str = None,
+                 compact_rows: bool = False, shared: bool = False):
         self.name = name
+        self.metric_name = name.split("/")[0]
         self.columns = columns[:]   # copy
+        self.schema = RowSchema(self.columns) if compact_rows else None
+        self.indexes = {}           # column -> HashIndex / SortedIndex
+        self.lock = RWLock()
+        self.version = 0            # bumped on every change; lets caches detect staleness
+        self._batch = None          # TableBatch while a batch() is open
         self.rows = []
         self.file_path = os.path.join(path, f"{self.name}.csv")
 
-        os.makedirs(path, exist_ok=True)
+        self.file_lock = None
+        self._seen = None           # on-disk stamp (see _disk_stamp) that self.rows reflects
+        if shared:
+            self.file_lock = FileLock(os.path.join(path, f"{self.name}.lock"))
+            self.lock = RWLock(self._acquire_files, self._release_files)
+
+        self.compact_threshold = compact_threshold
+        self.journal = None
+        if journaled:
+            self.journal = TableJournal(os.path.join(path, f"{self.name}.journal"), self.file_path)
+
+        self.snapshot = None
+        if snapshot_dir:
+            self.snapshot = TableSnapshot(os.path.join(snapshot_dir, f"{self.name}.snap"), self.file_path,
+                                          self.journal.file_path if self.journal else None)
+
+        # Partition tables ('carts/C001') live in a sub-directory of path
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        self.load()
+
+    @property
+    def rows(self) -> list:
+        return self._rows
+
+    @rows.setter
+    @_writes
+    def rows(self, rows: list):
+        if self.schema is not None:
+            rows = [r if isinstance(r, CompactRow) else CompactRow.from_mapping(self.schema, r) for r in rows]
+        if self._batch is not None:
+            self._batch.undo.append(("rows", self._rows))
+        # Replacing the row list wholesale invalidates every position in the indexes
+        self._rows = rows
+        self._rebuild_indexes()
+        self.version += 1
+
+    def _disk_stamp(self) -> tuple:
+        # Inode, size and mtime of the CSV and of the journal. A rewritten CSV gets a new inode
+        # (os.replace), so a change is seen even within the filesystem's mtime granularity.
+        stamp = []
+        for path in (self.file_path, self.journal.file_path if self.journal else None):
+            try:
+                st = os.stat(path) if path else None
+            except FileNotFoundError:
+                st = None
+            stamp.append((st.st_ino, st.st_size, st.st_mtime_ns) if st else None)
+        return tuple(stamp)
+
+    def _acquire_files(self):
+        # Outermost write lock taken: lock out other processes, then catch up with them
+        self.file_lock.acquire()
+        try:
+            if self._seen is not None:
+                self._sync_locked()
+        except BaseException:
+            self.file_lock.release()
+            raise
+
+    def _release_files(self):
+        # Everything this process changed is on disk by now, so memory matches the files
+        try:
+            self._seen = self._disk_stamp()
+        finally:
+            self.file_lock.release()
+
+    def sync(self) -> bool:
+        
+        #Bring rows up to date with changes other processes made to this table's files.
+        #Costs two stat() calls when nothing changed; returns True if rows were reloaded.
+        #A no-op for tables that are not shared, and inside this table's own lock (whose
+        #write side already synced, and whose read side cannot be upgraded).
+        
+        if self.file_lock is None or self._disk_stamp() == self._seen or self.lock.held():
+            return False
+        version = self.version
+        with self.lock.write():
+            pass    # taking the write lock syncs (see _acquire_files)
+        return self.version != version
+
+    def _sync_locked(self):
+        stamp = self._disk_stamp()
+        if stamp == self._seen:
+            return
+        self._catch_up(stamp)
+
+    @_timed("sync")
+    def _catch_up(self, stamp: tuple):
+        seen_csv, seen_journal = self._seen
+        csv_stamp, journal_stamp = stamp
+        # Same CSV and the same (or a newly started) journal: only new records to apply
+        if (csv_stamp == seen_csv and self.journal is not None and
+                (seen_journal is None or journal_stamp is not None and journal_stamp[0] == seen_journal[0])):
+            records = self.journal.replay_tail()
+            if records is not None:
+                self._apply_tail(records)
+                self._seen = stamp
+                return
         self.load()
 
+    def _apply_tail(self, records: list):
+        if not records:
+            return
+        if all(r["op"] == "add" for r in records):
+            for record in records:
+                self._apply(record)
+                for index in self.indexes.values():
+                    index.add(len(self._rows) - 1, self._rows[-1])
+        else:
+            for record in records:
+                self._apply(record)
+            self._rebuild_indexes()
+        self.version += 1
+
+    def create_index(self, column: str, kind: str = "hash", key=None):
+        
+        #Build a secondary index on column and keep it current through every mutation.
+        #kind="hash" serves equality lookups; kind="sorted" also serves get_rows_in_range().
+        #key (sorted only) converts values before comparison, e.g. key=float.
+        #Creating an index that already exists returns the existing one.
+        
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        # Checked before locking, so ensuring an index exists is safe under a read lock
+        existing = self.indexes.get(column)
+        if existing is not None and existing.kind == kind:
+            return existing
+        with self.lock.write():
+            return self._create_index(column, kind, key)
+
+    def _create_index(self, column: str, kind: str, key):
+        existing = self.indexes.get(column)
+        if existing is not None and existing.kind == kind:
+            return existing
+        if kind == "hash":
+            index = HashIndex(column)
+        elif kind == "sorted":
+            index = SortedIndex(column, key=key)
+        else:
+            raise ValueError(f"Unknown index kind '{kind}'")
+        index.build(self._rows)
+        self.indexes[column] = index
+        return index
+
+    @_writes
+    def drop_index(self, column: str):
+        self.indexes.pop(column, None)
+
+    def _rebuild_indexes(self):
+        for index in self.indexes.values():
+            index.build(self._rows)
+
+    def _positions_for(self, column: str, value):
+        #Row positions where column == value, in table order, using an index if one exists.
+        index = self.indexes.get(column)
+        if index is not None:
+            return index.lookup(value)
+        return [idx for idx, row in enumerate(self._rows) if row.get(column) == value]
+
+    def _make_row(self, row):
+        #Private, stored copy of a caller's row in this table's row format.
+        if self.schema is not None:
+            return CompactRow.from_mapping(self.schema, row)
+        return dict(row)
+
+    def _normalize(self, row: dict) -> dict:
+        # Same shape a row has after a round trip through the CSV file
+        return {c: "" if row.get(c) is None else str(row.get(c)) for c in self.columns}
+
+    def _commit(self, record: dict):
+        
+        #Persist a single mutation that has already been applied to self.rows.
+        #Inside a batch() it is only noted, and persisted with the rest of the batch.
+        
+        self.version += 1
+        batch = self._batch
+        if batch is not None:
+            batch.count += 1
+            if self.journal is not None and not batch.save:
+                batch.records.append(record)
+            return
+        if self.journal is None:
+            self.save()
+            return
+        with TABLE_SECONDS.time(self.metric_name, "journal"):
+            self.journal.append(record)
+        # Compact once the journal outgrows the table, so the rewrite cost is amortised
+        if self.journal.record_count >= max(self.compact_threshold, len(self.rows)):
+            self.compact()
+
+    def _record_undo(self, entry: tuple):
+        if self._batch is not None:
+            self._batch.undo.append(entry)
+
+    @contextmanager
+    def batch(self):
+        
+        #Apply many mutations and persist them once:
+        #    with table.batch():
+        #        table.add_row(...); table.update_row(...); table.delete_row(...)
+        #Inside the block rows and indexes change as usual, but nothing is written until it
+        #exits; then the batch goes to disk as one journal append, or one CSV rewrite for
+        #non-journaled tables (or when the batch would trigger a compaction anyway).
+        #If the block raises, every change made in it is undone and nothing is written.
+        #The write lock is held throughout; a nested batch() joins the outer one.
+        
+        with self.lock.write():
+            if self._batch is not None:
+                yield self
+                return
+            batch = self._batch = TableBatch()
+            try:
+                yield self
+            except BaseException:
+                self._batch = None
+                self._rollback(batch)
+                raise
+            self._batch = None
+            self._flush_batch(batch)
+
+    def _rollback(self, batch: TableBatch):
+        rows = self._rows
+        for entry in reversed(batch.undo):
+            op = entry[0]
+            if op == "truncate":
+                del rows[entry[1]:]
+            elif op == "insert":
+                rows.insert(entry[1], entry[2])
+            elif op == "replace":
+                rows[entry[1]] = entry[2]
+            elif op == "set":
+                rows[entry[1]][entry[2]] = entry[3]
+            elif op == "rows":
+                rows = entry[1]
+        self._rows = rows
+        self._rebuild_indexes()
+        self.version += 1
+
+    @_timed("batch")
+    def _flush_batch(self, batch: TableBatch):
+        if batch.save or (batch.count and self.journal is None):
+            self.save()
+        elif batch.count:
+            self.journal.append_many(batch.records)
+            if self.journal.record_count >= max(self.compact_threshold, len(self.rows)):
+                self.compact()
+
+    def _batch_rewrites(self, count: int) -> bool:
+        # True if the open batch will end in a full rewrite once count more mutations are added,
+        # so building their journal records can be skipped
+        batch = self._batch
+        if batch.save or self.journal is None:
+            return True
+        return self.journal.record_count + batch.count + count >= max(self.compact_threshold,
+                                                                       len(self._rows) + count)
+
+    def _check_columns(self, rows: list, label: str = "Row"):
+        keys = set()
+        for row in rows:
+            keys.update(row.keys())
+        if not keys.issubset(self.columns):
+            raise ValueError(f"{label} has invalid columns: {sorted(keys - set(self.columns))} not in {self.columns}")
+
+    def _apply(self, record: dict):
+        #Re-apply a journal record to self.rows (used when replaying the journal).
+        op = record["op"]
+        if op == "add":
+            self.rows.append(self._make_row(self._normalize(record["row"])))
+        elif op == "delete":
+            del self.rows[record["index"]]
+        elif op == "update":
+            self.rows[record["index"]] = self._make_row(self._normalize(record["row"]))
+        elif op == "set":
+            self.rows[record["index"]][record["column"]] = record["value"]
+        else:
+            raise ValueError(f"Unknown journal operation '{op}' in table '{self.name}'")
+
+    @_writes
     def add_row(self, row: dict):
         if not set(row.keys()).issubset(set(self.columns)):
             raise ValueError(f"Row has invalid columns: {row.keys()} not subset of {self.columns}")
-        self.rows.append(row.copy())
-        self.save()
+        self.rows.append(self._make_row(row))
+        self._record_undo(("truncate", len(self.rows) - 1))
+        for index in self.indexes.values():
+            index.add(len(self.rows) - 1, row)
+        self._commit({"op": "add", "row": self._normalize(row)})
 
+    @_writes
+    def add_rows(self, rows):
+        
+        #Append many rows as one batch: columns are checked once for the whole set, indexes
+        #are updated in one pass, and the rows are persisted once.
+        
+        rows = list(rows)
+        self._check_columns(rows)
+        if not rows:
+            return
+        with self.batch():
+            batch = self._batch
+            rewrite = self._batch_rewrites(len(rows))
+            start = len(self._rows)
+            self._rows.extend(self._make_row(row) for row in rows)
+            self._record_undo(("truncate", start))
+            for index in self.indexes.values():
+                if index.kind == "hash" and len(rows) < start:
+                    for pos in range(start, len(self._rows)):
+                        index.add(pos, self._rows[pos])
+                else:
+                    # One sort instead of an insort (an O(n) shift) per row; for a hash index
+                    # one pass is cheaper once the new rows outnumber the old
+                    index.build(self._rows)
+            if not rewrite:
+                batch.records.extend({"op": "add", "row": self._normalize(row)} for row in rows)
+            elif self.journal is not None:
+                batch.save = True
+            batch.count += len(rows)
+            self.version += 1
+
+    @_writes
     def delete_row(self, index: int):
         if 0 <= index < len(self.rows):
+            self._record_undo(("insert", index, self.rows[index]))
             del self.rows[index]
-            self.save()
+            # Every later position shifts down by one, so rebuild rather than patch
+            self._rebuild_indexes()
+            self._commit({"op": "delete", "index": index})
         else:
             raise IndexError(f"Row index {index} out of range")
 
+    @_writes
+    def delete_rows(self, indexes):
+        
+        #Delete the rows at many positions (as they are before any is deleted) as one batch,
+        #with one pass over the rows and one index rebuild.
+        
+        positions = sorted(set(indexes), reverse=True)
+        if positions and not (0 <= positions[-1] and positions[0] < len(self._rows)):
+            raise IndexError("Row index out of range")
+        if not positions:
+            return
+        with self.batch():
+            drop = set(positions)
+            self._record_undo(("rows", self._rows))
+            self._rows = [row for pos, row in enumerate(self._rows) if pos not in drop]
+            self._rebuild_indexes()
+            # Highest first, so each recorded position is still valid when replayed in order
+            for pos in positions:
+                self._commit({"op": "delete", "index": pos})
+
+    @_writes
     def update_row(self, index: int, new_row: dict):
         if 0 <= index < len(self.rows):
             if not set(new_row.keys()).issubset(set(self.columns)):
                 raise ValueError("New row has invalid columns")
-            self.rows[index] = new_row.copy()
-            self.save()
+            self._replace_row(index, new_row)
+            self._commit({"op": "update", "index": index, "row": self._normalize(new_row)})
         else:
             raise IndexError(f"Row index {index} out of range")
 
+    @_writes
+    def update_rows(self, updates):
+        
+        #Replace many rows as one batch. updates is an iterable of (index, new_row) pairs,
+        #as for update_row(); columns are checked once and the result is persisted once.
+        
+        updates = list(updates)
+        self._check_columns([new_row for _, new_row in updates], label="New row")
+        with self.batch():
+            for index, new_row in updates:
+                if not 0 <= index < len(self._rows):
+                    raise IndexError(f"Row index {index} out of range")
+                self._replace_row(index, new_row)
+                self._commit({"op": "update", "index": index, "row": self._normalize(new_row)})
+
+    @_writes
     def update_column_value_by_index(self, index: int, column: str, value):
         if 0 <= index < len(self.rows):
             if column not in self.columns:
                 raise ValueError(f"Column '{column}' does not exist")
+            index_on_column = self.indexes.get(column)
+            if index_on_column is not None:
+                index_on_column.remove(index, self.rows[index])
+            self._record_undo(("set", index, column, self.rows[index].get(column)))
             self.rows[index][column] = value
-            self.save()
+            if index_on_column is not None:
+                index_on_column.add(index, self.rows[index])
+            self._commit({"op": "set", "index": index, "column": column,
+                          "value": "" if value is None else str(value)})
         else:
             raise IndexError(f"Row index {index} out of range")
 
+    @_writes
     def update_row_by_column_value(self, column: str, match_value, new_row: dict):
         if column not in self.columns:
             raise ValueError(f"Column '{column}' does not exist")
 
-        for idx, row in enumerate(self.rows):
-            if row.get(column) == match_value:
-                if not set(new_row.keys()).issubset(set(self.columns)):
-                    raise ValueError("New row has invalid columns")
-                self.rows[idx] = new_row.copy()
-                self.save()
-                return
+        for idx in self._positions_for(column, match_value):
+            if not set(new_row.keys()).issubset(set(self.columns)):
+                raise ValueError("New row has invalid columns")
+            self._replace_row(idx, new_row)
+            self._commit({"op": "update", "index": idx, "row": self._normalize(new_row)})
+            return
         raise ValueError(f"No row found where {column} == {match_value}")
 
+    @_writes
+    def add_column(self, column: str, default: str = ""):
+        
+        #Append a column to the schema, filling existing rows with default.
+        #Rewrites the file once; does nothing if the column already exists.
+        
+        if column in self.columns:
+            return
+        if self._batch is not None:
+            raise ValueError("add_column() cannot run inside a batch")
+        self.columns.append(column)
+        if self.schema is not None:
+            self.schema.add_column(column)
+        for row in self.rows:
+            row[column] = default
+        self.save()
+
+    def _replace_row(self, index: int, new_row: dict):
+        old_row = self.rows[index]
+        self._record_undo(("replace", index, old_row))
+        for idx in self.indexes.values():
+            idx.remove(index, old_row)
+        self.rows[index] = self._make_row(new_row)
+        for idx in self.indexes.values():
+            idx.add(index, new_row)
+
+    @_reads
     def get_row_by_column_value(self, column: str, value: str) -> dict:
         if column not in self.columns:
             raise ValueError(f"Column '{column}' does not exist")
-        for row in self.rows:
-            if row.get(column) == value:
-                return row.copy()
+        for idx in self._positions_for(column, value):
+            return self.rows[idx].copy()
         return None
 
+    @_reads
+    def get_rows_by_column_value(self, column: str, value: str) -> list:
+        #Every row where column == value, in table order.
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        return [self.rows[idx].copy() for idx in self._positions_for(column, value)]
+
+    @_reads
+    def get_rows_in_range(self, column: str, low=None, high=None) -> list:
+        
+        #Rows whose column value lies in [low, high], ordered by that value.
+        #Uses a sorted index on column when one exists, otherwise scans and sorts.
+        
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        index = self.indexes.get(column)
+        if index is None or index.kind != "sorted":
+            index = SortedIndex(column)
+            index.build(self.rows)
+        return [self.rows[idx].copy() for idx in index.range(low, high)]
+
+    @_writes
+    @_timed("save")
     def save(self):
-        with open(self.file_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=self.columns)
-            writer.writeheader()
-            writer.writerows(self.rows)
+        self.version += 1
+        if self._batch is not None:
+            # Written once, when the batch exits
+            self._batch.save = True
+            return
+        if self.journal is not None:
+            # A full rewrite makes any pending journal records redundant
+            self.compact()
+            return
+        self._write_csv()
+
+    @_writes
+    @_timed("compact")
+    def compact(self):
+        
+        #Fold the journal into a fresh CSV snapshot and start a new, empty journal.
+        #The CSV is swapped in atomically before the journal is truncated, so a crash
+        #part way through leaves the old snapshot and its journal intact.
+        
+        if self._batch is not None:
+            self._batch.save = True
+            return
+        self._write_csv()
+        if self.journal is not None:
+            self.journal.truncate()
+        self.write_snapshot()
+
+    def _write_csv(self):
+        
+        #Write every row to a temp file, flush it to disk and swap it in with os.replace,
+        #so readers and a crash mid-write only ever see the old file or the new one.
+        
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            if self.schema is not None:
+                # Compact rows already hold their values in column order
+                writer = csv.writer(f)
+                writer.writerow(self.columns)
+                writer.writerows(row.values_tuple() for row in self._rows)
+            else:
+                writer = csv.DictWriter(f, fieldnames=self.columns)
+                writer.writeheader()
+                writer.writerows(self.rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+
+    @_writes
+    def write_snapshot(self):
+        #Record the current rows as the binary startup snapshot (no-op without snapshot_dir).
+        if self.snapshot is not None:
+            self.snapshot.write(self.columns, self.rows,
+                                self.journal.record_count if self.journal else 0)
 
+    @_writes
+    @_timed("load")
     def load(self):
+        if self.snapshot is not None and self._load_snapshot():
+            return
+
         if os.path.exists(self.file_path):
             with open(self.file_path, "r", newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                self.rows = [row for row in reader]
+                self._adopt_columns(next(csv.reader(f), None) or [])
+                f.seek(0)
+                # Indexes are rebuilt once below, after the journal has been replayed
+                if self.schema is not None:
+                    self._rows = self._compact_rows_from_csv(f)
+                else:
+                    reader = csv.DictReader(f)
+                    self._rows = [row for row in reader]
         else:
             # Create an empty CSV with header row
             with open(self.file_path, "w", newline="", encoding="utf-8") as f:
                 writer = csv.DictWriter(f, fieldnames=self.columns)
                 writer.writeheader()
 
+        if self.journal is not None:
+            for record in self.journal.replay():
+                self._apply(record)
+
+        self._rebuild_indexes()
+        self.version += 1
+        self._seen = self._disk_stamp()
+        self.write_snapshot()
+
+    def _adopt_columns(self, header: list):
+        # Columns another process added with add_column(); rewriting without them would drop them
+        for column in header:
+            if column not in self.columns:
+                self.columns.append(column)
+                if self.schema is not None:
+                    self.schema.add_column(column)
+
+    def _compact_rows_from_csv(self, f, pool_limit: int = 4096) -> list:
+        
+        #Build CompactRows straight from csv.reader records, without an intermediate dict.
+        #Repeated values (status, customer_id, ...) share one string object: each column pools
+        #its values until it has seen pool_limit distinct ones, then stops pooling.
+        
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        order = [header.index(c) if c in header else None for c in self.columns]
+        pools = [{} for _ in self.columns]
+        schema = self.schema
+
+        rows = []
+        for record in reader:
+            values = []
+            for col, i in enumerate(order):
+                value = record[i] if i is not None and i < len(record) else ""
+                pool = pools[col]
+                if pool is not None:
+                    value = pool.setdefault(value, value)
+                    if len(pool) > pool_limit:
+                        pools[col] = None
+                values.append(value)
+            rows.append(CompactRow(schema, tuple(values)))
+        return rows
+
+    def _load_snapshot(self) -> bool:
+        cached = self.snapshot.read()
+        if cached is None or cached[0] != self.columns:
+            return False
+        columns, rows, journal_records = cached
+        if self.schema is not None:
+            schema = self.schema
+            self._rows = [CompactRow(schema, values) for values in rows]
+        else:
+            self._rows = [dict(zip(columns, values)) for values in rows]
+        if self.journal is not None:
+            self.journal.record_count = journal_records
+            # The stamp matched, so the journal is exactly as long as when the snapshot was taken
+            path = self.journal.file_path
+            self.journal.offset = os.path.getsize(path) if os.path.exists(path) else 0
+        self._rebuild_indexes()
+        self.version += 1
+        self._seen = self._disk_stamp()
+        return True
+
+
+class StorageEngine:
+
+    #Where and how DatabaseManager keeps its tables. An engine opens table objects that all
+    #offer Table's public methods and attributes (rows, indexes, version, lock, add_row,
+    #get_row_by_column_value, ...), so models work the same whichever engine is in use.
+    #CsvEngine below is the default; models.sqlite_engine.SqliteEngine is the alternative.
+
+
+    name = "abstract"
+    # True if the engine can commit changes to several tables atomically by itself (through
+    # transaction()); otherwise DatabaseManager.transaction() goes through a TransactionLog
+    supports_transactions = False
+
+    def open_table(self, name: str, columns: list):
+        raise NotImplementedError
+
+    def table_columns(self, name: str):
+        #Stored columns of table name, or None if the engine has no such table.
+        raise NotImplementedError
+
+    def table_names(self) -> list:
+        raise NotImplementedError
+
+    def flush_tables(self, names: list):
+        #Force everything tables names have written so far to disk (a TransactionLog checkpoint).
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CsvEngine(StorageEngine):
+
+    #Tables as CSV files under path (data/<name>.csv), loaded into memory as Table objects.
+
+
+    name = "csv"
+
+    def __init__(self, path: str, journaled: bool = False, snapshot_dir: str = None,
+                 compact_rows: bool = False, shared: bool = False):
+        self.path = path
+        self.journaled = journaled
+        self.snapshot_dir = snapshot_dir
+        self.compact_rows = compact_rows
+        self.shared = shared
+
+    def open_table(self, name: str, columns: list) -> Table:
+        return Table(name, columns, path=self.path,
+                     journaled=self.journaled, snapshot_dir=self.snapshot_dir,
+                     compact_rows=self.compact_rows, shared=self.shared)
+
+    def table_columns(self, name: str):
+        csv_file = os.path.join(self.path, f"{name}.csv")
+        if not os.path.exists(csv_file):
+            return None
+        # Read header to infer columns
+        with open(csv_file, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            return next(reader)
+
+    def table_names(self) -> list:
+        return [os.path.splitext(f)[0] for f in os.listdir(self.path) if f.endswith(".csv")]
+
+    def flush_tables(self, names: list):
+        # Journals are appended without fsync; the CSVs are fsynced before they are swapped
+        # in (see Table._write_csv), but the swaps and journal removals live in the directories
+        directories = set()
+        for name in names:
+            journal = os.path.join(self.path, f"{name}.journal")
+            if os.path.exists(journal):
+                with open(journal, "ab") as f:
+                    os.fsync(f.fileno())
+            directories.add(os.path.dirname(journal))
+        for directory in sorted(directories):
+            fsync_directory(directory)
+
 
 class DatabaseManager(metaclass=SingletonMeta):
     
     #Manages multiple Table instances. Ensures only one Table per CSV.
+    #Tables come from a StorageEngine: CsvEngine over data/ unless engine= is given,
+    #in which case the CSV-only options (journaled, snapshots, compact_rows, shared) are unused.
+    #transaction() commits changes to several tables at once (see models.transaction).
     
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, journaled: bool = False, snapshots: bool = False,
+                 compact_rows: bool = False, shared: bool = False, engine: StorageEngine = None):
         # Always compute data directory relative to this file's location
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.csv_path = os.path.join(base_dir, "data")
         os.makedirs(self.csv_path, exist_ok=True)
 
+        # When True, tables log mutations to an append-only journal (see Table)
+        self.journaled = journaled
+        # When True, tables boot from binary snapshots in data/.snapshots (see TableSnapshot),
+        # refreshed for every loaded table at interpreter exit
+        self.snapshot_dir = os.path.join(self.csv_path, ".snapshots") if snapshots else None
+        if snapshots:
+            atexit.register(self.write_snapshots)
+        # When True, tables store rows as CompactRow (shared schema + value tuple)
+        self.compact_rows = compact_rows
+        # When True, several processes may use data/ at once (see Table, shared=True)
+        self.shared = shared
+
+        if engine is None:
+            engine = CsvEngine(self.csv_path, journaled=journaled, snapshot_dir=self.snapshot_dir,
+                               compact_rows=compact_rows, shared=shared)
+        self.engine = engine
+        # Commit point of multi-table transactions on engines without their own
+        self.txlog = None
+        if not engine.supports_transactions:
+            self.txlog = TransactionLog(os.path.join(self.csv_path, "transactions.log"),
+                                        flush=engine.flush_tables)
+
         self.tables = {}  # name -> Table instance
+        # '<name>/<key>' -> partition Table, kept only while something (a cached cart) uses it
+        self.partitions = weakref.WeakValueDictionary()
+        # Guards self.tables, so two threads asking for the same table share one instance
+        self._lock = RLock()
+
+    def _open_table(self, name: str, columns: list) -> Table:
+        return self.engine.open_table(name, columns)
+
+    def write_snapshots(self):
+        #Refresh the startup snapshot of every loaded table.
+        with self._lock:
+            tables = list(self.tables.values()) + list(self.partitions.values())
+        for table in tables:
+            table.write_snapshot()
 
     def create_table(self, name: str, columns: list) -> Table:
-        if name in self.tables:
-            return self.tables[name]
-        table = Table(name, columns, path=self.csv_path)
-        self.tables[name] = table
-        return table
+        with self._lock:
+            if name in self.tables:
+                return self.tables[name]
+            table = self._open_table(name, columns)
+            self.tables[name] = table
+            return table
+
+    def _registered(self, name: str):
+        table = self.tables.get(name)
+        return table if table is not None else self.partitions.get(name)
 
     def get_table(self, name: str) -> Table:
-        if name in self.tables:
-            return self.tables[name]
-
-        csv_file = os.path.join(self.csv_path, f"{name}.csv")
-        if os.path.exists(csv_file):
-            # Read header to infer columns
-            with open(csv_file, "r", newline="", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                header = next(reader)
-            table = Table(name, header, path=self.csv_path)
-            self.tables[name] = table
+        table = self._registered(name)
+        if table is not None:
             return table
-        return None
+
+        with self._lock:
+            table = self._registered(name)
+            if table is not None:
+                return table
+            header = self.engine.table_columns(name)
+            if header is not None:
+                table = self._open_table(name, header)
+                self.tables[name] = table
+                return table
+            return None
+
+    def get_partition(self, name: str, key: str, columns: list) -> Table:
+        
+        #Return one partition of a partitioned table, stored as data/<name>/<key>.csv.
+        #Partitions are registered under '<name>/<key>', are created empty on first use,
+        #and only ever load or rewrite their own rows.
+        #Only weak references are kept: a partition nothing holds any more (its customer was
+        #evicted) is dropped from memory and loaded from disk again on next use. While one is
+        #held, every caller gets that same instance.
+        
+        key = str(key)
+        if not key or key in (".", "..") or "/" in key or "\\" in key:
+            raise ValueError(f"Invalid partition key '{key}' for table '{name}'")
+        full_name = f"{name}/{key}"
+        table = self.partitions.get(full_name)
+        if table is not None:
+            return table
+        with self._lock:
+            table = self.partitions.get(full_name)
+            if table is None:
+                table = self.partitions[full_name] = self._open_table(full_name, columns)
+            return table
+
+    @contextmanager
+    def transaction(self):
+        
+        #Stage changes to several tables and commit them together when the block exits:
+        #one durable write (a TransactionLog record, or one engine transaction) decides
+        #whether all of them happened. Nothing is written if the block raises.
+        #Do not open one while holding a table's write lock.
+        
+        tx = Transaction(self)
+        try:
+            yield tx
+        except BaseException:
+            tx.rollback()
+            raise
+        tx.commit()
+
+    @TRANSACTION_SECONDS.timed()
+    def apply_transaction(self, ops: list, tables: dict):
+        if self.txlog is None:
+            with self.engine.transaction():
+                apply_ops(tables, ops)
+            return
+        with self.txlog.locked():
+            # A transaction left half applied (by a crash, or a failure here) goes first
+            self._roll_forward()
+            tx_id = self.txlog.write(ops)
+            apply_ops(tables, ops)
+            self.txlog.done(tx_id)
+
+    def recover(self) -> int:
+        
+        #Finish transactions that were committed (logged) but not fully applied when the
+        #process stopped. Safe to run at any time, from any number of processes.
+        #Returns the number of transactions rolled forward.
+        
+        if self.txlog is None:
+            return 0
+        with self.txlog.locked():
+            return self._roll_forward()
+
+    def _roll_forward(self) -> int:
+        pending = self.txlog.pending()
+        for tx_id, ops in pending:
+            tables = {}
+            for op in ops:
+                if op["table"] not in tables:
+                    tables[op["table"]] = self.get_table(op["table"]) or self.create_table(op["table"], op["columns"])
+            apply_ops(tables, ops)
+            self.txlog.done(tx_id)
+        return len(pending)
 
     def list_tables(self) -> list:
-        csv_files = [f for f in os.listdir(self.csv_path) if f.endswith(".csv")]
-        for fname in csv_files:
-            tablename = os.path.splitext(fname)[0]
+        for tablename in self.engine.table_names():
             if tablename not in self.tables:
                 self.get_table(tablename)
-        return list(self.tables.values())
+        with self._lock:
+            return list(self.tables.values())
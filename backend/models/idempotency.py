@@ -0,0 +1,147 @@
+# backend/models/idempotency.py
+
+import time
+import hashlib
+from threading import Lock
+
+from models.database import DatabaseManager, SingletonMeta
+
+IDEMPOTENCY_COLUMNS = ["key", "fingerprint", "status", "response", "created_at"]
+
+class IdempotencyConflict(Exception):
+
+    #The key is in use: either its first request is still running (retry later), or it was
+    #first used with a different request body.
+
+    pass
+
+
+class IdempotencyStore(metaclass=SingletonMeta):
+
+    #Results of recent requests that carried an Idempotency-Key header, so a retried request
+    #gets the first response back instead of running again.
+    #Keys live in the 'idempotency_keys' table, shared with the other worker processes, and
+    #expire ttl seconds after first use. A small in-process copy of finished results answers
+    #most retries without touching the table.
+    #A claim still pending after pending_timeout seconds is taken to belong to a worker that
+    #died, and the next request with the key takes it over (payments are then still charged
+    #once: the gateway key is derived from the Idempotency-Key and the request, see
+    #gateway.payment_key).
+    #
+    #    state, response = store.begin(key, body)
+    #    if state == "done": return response      # the original result
+    #    try: response = ...; store.finish(key, status, body)
+    #    except: store.abort(key); raise           # the key may be retried
+
+
+    def __init__(self, ttl: float = 24 * 3600, wait: float = 10.0, max_cached: int = 10000,
+                 pending_timeout: float = 60.0):
+        self.ttl = ttl
+        self.wait = wait            # how long a retry waits for the first request to finish
+        self.pending_timeout = pending_timeout
+        self.max_cached = max_cached
+        self._cache = {}            # key -> (expires, fingerprint, (status, body))
+        self._lock = Lock()
+        self._next_prune = 0.0
+
+        dbm = DatabaseManager()
+        self.table = dbm.get_table("idempotency_keys")
+        if self.table is None:
+            self.table = dbm.create_table("idempotency_keys", IDEMPOTENCY_COLUMNS)
+        self.table.create_index("key")
+
+    @staticmethod
+    def fingerprint(body: bytes) -> str:
+        return hashlib.sha256(body or b"").hexdigest()
+
+    def begin(self, key: str, body: bytes):
+
+        #Claim key for a request with this body. Returns ("new", None) if the caller should
+        #run the request (and then call finish() or abort()), or ("done", (status, body)) with
+        #the stored response. Raises IdempotencyConflict if the key was used with another body,
+        #or its first request is still running after waiting self.wait seconds (and was claimed
+        #less than pending_timeout seconds ago).
+
+        fingerprint = self.fingerprint(body)
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            return self._replay(cached[1], fingerprint, cached[2])
+
+        deadline = now + self.wait
+        while True:
+            with self.table.lock.write():
+                self._prune(now)
+                row = self._row(key)
+                if row is None:
+                    self.table.add_row({"key": key, "fingerprint": fingerprint, "status": "pending",
+                                        "response": "", "created_at": str(now)})
+                    return "new", None
+                if row["fingerprint"] != fingerprint:
+                    raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+                if row["status"] != "pending":
+                    response = (int(row["status"]), row["response"])
+                    self._remember(key, float(row["created_at"]), fingerprint, response)
+                    return "done", response
+                # created_at of a pending row is when it was claimed
+                if now - float(row["created_at"]) >= self.pending_timeout:
+                    pos = self.table.indexes["key"].lookup(key)[0]
+                    self.table.update_row(pos, {**row, "created_at": str(now)})
+                    return "new", None
+            if time.time() >= deadline:
+                raise IdempotencyConflict("A request with this Idempotency-Key is still in progress")
+            time.sleep(0.05)
+            now = time.time()
+
+    def finish(self, key: str, status: int, body: str):
+        #Store the response of the request that claimed key.
+        with self.table.lock.write():
+            positions = self.table.indexes["key"].lookup(key)
+            if not positions:
+                return
+            row = self.table.rows[positions[0]]
+            self.table.update_row(positions[0], {**row, "status": str(status), "response": body})
+            self._remember(key, float(row["created_at"]), row["fingerprint"], (status, body))
+
+    def abort(self, key: str):
+        #Release key without a result (the request failed unexpectedly), so it can be retried.
+        with self.table.lock.write():
+            positions = self.table.indexes["key"].lookup(key)
+            if positions:
+                self.table.delete_row(positions[0])
+
+    def _row(self, key: str):
+        # The live row for key; an expired one is treated as absent and removed
+        positions = self.table.indexes["key"].lookup(key)
+        if not positions:
+            return None
+        row = self.table.rows[positions[0]]
+        if float(row["created_at"]) + self.ttl <= time.time():
+            self.table.delete_row(positions[0])
+            return None
+        return row
+
+    def _prune(self, now: float):
+        # Drop expired keys, at most once a minute (callers hold the table's write lock)
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        cutoff = now - self.ttl
+        self.table.delete_rows([pos for pos, row in enumerate(self.table.rows)
+                                if float(row["created_at"] or 0) <= cutoff])
+        with self._lock:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+
+    def _remember(self, key: str, created_at: float, fingerprint: str, response: tuple):
+        with self._lock:
+            if len(self._cache) >= self.max_cached:
+                # Oldest first: dicts keep insertion order
+                del self._cache[next(iter(self._cache))]
+            self._cache[key] = (created_at + self.ttl, fingerprint, response)
+
+    @staticmethod
+    def _replay(stored: str, fingerprint: str, response: tuple):
+        if stored != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+        return "done", response
@@ -0,0 +1,173 @@
+# backend/models/metrics.py
+
+import time
+import bisect
+import functools
+from contextlib import contextmanager
+from threading import Lock
+
+# Upper bounds (seconds) of the latency buckets: 0.5 ms up to 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    #A count that only goes up, one series per combination of label values:
+    #    PAYMENTS = metrics.counter("awe_payments_total", "Payments by outcome", ["outcome"])
+    #    PAYMENTS.inc("declined")
+
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}            # label values -> count
+        self._lock = Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield self.name + _labels(self.labelnames, labels), value
+
+
+class Histogram:
+
+    #Distribution of observed values (durations, in seconds) over fixed buckets, with their
+    #sum and count, one series per combination of label values:
+    #    SAVE_SECONDS = metrics.histogram("awe_table_seconds", "...", ["table", "op"])
+    #    with SAVE_SECONDS.time("order", "save"):
+    #        ...
+    #Observing is a bisect and three additions under a lock, cheap enough for every request.
+
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}            # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = Lock()
+
+    def observe(self, value: float, *labels):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def timed(self, *labels):
+        #Decorator form of time()
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(*labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (counts[:], total, count) for labels, (counts, total, count) in self.series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = 'le="' + (bound if bound == "+Inf" else _number(float(bound))) + '"'
+                yield self.name + "_bucket" + _labels(self.labelnames, labels, le), cumulative
+            yield self.name + "_sum" + _labels(self.labelnames, labels), total
+            yield self.name + "_count" + _labels(self.labelnames, labels), count
+
+
+class Gauge:
+
+    #A value read when metrics are collected, from fn() (e.g. a queue's current length).
+
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        try:
+            yield self.name, self.fn()
+        except Exception as e:
+            print(f"[Metrics] gauge {self.name} failed: {e}")
+
+
+class MetricsRegistry:
+
+    #Every metric of the process, rendered for GET /metrics by render() in the Prometheus text
+    #format (version 0.0.4). Metrics are created once, at import time of the module they time;
+    #asking for an existing name returns the metric already registered.
+    #Values are per process: with several worker processes, each is scraped on its own.
+
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = Lock()
+
+    def _register(self, name: str, factory):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = factory()
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(name, lambda: Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn) -> Gauge:
+        return self._register(name, lambda: Gauge(name, help, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for series, value in metric.samples():
+                lines.append(f"{series} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry used across the app
+metrics = MetricsRegistry()
@@ -1,12 +1,24 @@
 from models.payment_strategies.banktransfer_payment import BankTransfer
 from models.payment_strategies.creditcard_payment import CreditCard
 from models.payment_strategies.thirdparty_payment import ThirdParty
+from models.payment_strategies.gateway import payment_key
 from models.payment_observer import observer
 from models.shopping_cart import ShoppingCart  
-from datetime import datetime
+from datetime import datetime, timezone
 from models.database import DatabaseManager
 from models.invoice import Invoice
+from models.sales_analytics import SalesAggregate, ORDER_COLUMNS
+from models.sales_rollup import SalesRollup
+from models.order_items import get_order_items_table, unit_price
+from models.metrics import metrics
 import json
+import time
+import asyncio
+
+PAYMENT_SECONDS = metrics.histogram("awe_payment_seconds", "Order.make_payment time by outcome "
+                                    "(paid, declined, unsupported, not_saved)", ["outcome"])
+PAYMENT_STEP_SECONDS = metrics.histogram("awe_payment_step_seconds", "Time of each step of a payment "
+                                         "(charge, record, notify)", ["step"])
 
 class Order():
     def __init__(self, order_id, customer, items, total_cost):
@@ -18,10 +30,12 @@ class Order():
         self.status = "Pending"
         
 
-    def save_order(self) -> bool:
+    def save_order(self, tx=None) -> bool:
         dbm = DatabaseManager()
         
         #Saves the order to the database.
+        #With tx, the order row and its lines are staged in that transaction and written when
+        #it commits; without, they are committed together on their own.
         #Returns True if successful, False otherwise.
         
         print(f"Saving order: {self.order_id}")
@@ -30,63 +44,150 @@ class Order():
             if not order_table:
                 # Create order table if it doesn't exist
                 print("Creating order table")
-                order_table = dbm.create_table("order", ["order_id", "customer_id", "total_cost", "items", "status"])
-            
-            # Save order data
-            order_table.add_row({
-                "order_id": self.order_id,
-                "customer_id": self.customer.get_customer_id(),
-                "total_cost": self.total_cost,
-                "items": json.dumps(self.items),  # items is already a list
-                "status": self.status
-            })
+                order_table = dbm.create_table("order", ORDER_COLUMNS)
+            order_table.add_column("created_at")
+            order_table.create_index("order_id")
+            if order_table.indexes["order_id"].lookup(self.order_id):
+                raise ValueError(f"Order ID {self.order_id} already exists")
+            # Opened (and any legacy orders migrated) before this order's row exists
+            items_table = get_order_items_table()
+
+            if tx is None:
+                with dbm.transaction() as own_tx:
+                    self._stage(own_tx, order_table, items_table)
+            else:
+                self._stage(tx, order_table, items_table)
             return True
         except Exception as e:
             print(f"Error saving order: {e}")
             return False
 
-    def make_payment(self, payment_method: str, payment_details: dict = None):
+    def _stage(self, tx, order_table, items_table):
+        # Typed copy of each line, read by analytics and order history.
+        # Staged (and so written) before the order row, so an analytics refresh in another
+        # thread never folds in an order whose lines are not there yet.
+        tx.replace_where(items_table, "order_id", self.order_id, [{
+            "order_id": self.order_id,
+            "product_id": str(entry["product_id"]),
+            "quantity": str(int(entry["quantity"])),
+            "unit_price": str(unit_price(entry["product_id"]))
+        } for entry in self.items])
+        # Save order data
+        tx.upsert(order_table, "order_id", {
+            "order_id": self.order_id,
+            "customer_id": self.customer.get_customer_id(),
+            "total_cost": self.total_cost,
+            "items": json.dumps(self.items),  # items is already a list
+            "status": self.status,
+            "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        })
+        # Fold the new row into the materialized sales totals and time buckets once written
+        tx.on_commit(SalesAggregate().refresh)
+        tx.on_commit(SalesRollup().refresh)
+
+    def make_payment(self, payment_method: str, payment_details: dict = None, idempotency_key: str = None,
+                     fingerprint: str = None):
         
         #Process payment using the specified payment method.
         #payment_method should be one of: 'credit', 'bank', 'thirdparty'
+        #idempotency_key is the client's Idempotency-Key, if it sent one, and fingerprint that of
+        #the request body: retries of the request then reuse one gateway key, whatever order
+        #they create (see gateway.payment_key).
+        
+        start = time.perf_counter()
+        outcome = self._pay(payment_method, payment_details, idempotency_key, fingerprint)
+        PAYMENT_SECONDS.observe(time.perf_counter() - start, outcome)
+        return outcome == "paid"
+
+    def _pay(self, payment_method: str, payment_details: dict, idempotency_key: str, fingerprint: str) -> str:
+        payment_strategy = self._payment_strategy(payment_method, payment_details, idempotency_key, fingerprint)
+        if payment_strategy is None:
+            return "unsupported"
+
+        # Process payment
+        with PAYMENT_STEP_SECONDS.time("charge"):
+            success = payment_strategy.process_payment(self.total_cost)
+        if not success:
+            print("Payment failed.")
+            return "declined"
+        with PAYMENT_STEP_SECONDS.time("record"):
+            saved = self._record_payment()
+        if not saved:
+            return "not_saved"
+        # Notify observers only if save was successful
+        with PAYMENT_STEP_SECONDS.time("notify"):
+            observer.notify_all(self.order_id)
+        return "paid"
+
+    async def make_payment_async(self, payment_method: str, payment_details: dict = None,
+                                 idempotency_key: str = None, fingerprint: str = None):
+        
+        #make_payment() for the asyncio server: the gateway call is awaited and the table
+        #writes run on the loop's executor, so no step blocks the event loop.
         
+        start = time.perf_counter()
+        outcome = await self._pay_async(payment_method, payment_details, idempotency_key, fingerprint)
+        PAYMENT_SECONDS.observe(time.perf_counter() - start, outcome)
+        return outcome == "paid"
+
+    async def _pay_async(self, payment_method: str, payment_details: dict, idempotency_key: str,
+                         fingerprint: str) -> str:
+        payment_strategy = self._payment_strategy(payment_method, payment_details, idempotency_key, fingerprint)
+        if payment_strategy is None:
+            return "unsupported"
+
+        with PAYMENT_STEP_SECONDS.time("charge"):
+            success = await payment_strategy.process_payment_async(self.total_cost)
+        if not success:
+            print("Payment failed.")
+            return "declined"
+        loop = asyncio.get_running_loop()
+        # Includes the wait for a free I/O thread
+        with PAYMENT_STEP_SECONDS.time("record"):
+            saved = await loop.run_in_executor(None, self._record_payment)
+        if not saved:
+            return "not_saved"
+        with PAYMENT_STEP_SECONDS.time("notify"):
+            await observer.notify_all_async(self.order_id)
+        return "paid"
+
+    def _payment_strategy(self, payment_method: str, payment_details: dict, idempotency_key: str = None,
+                          fingerprint: str = None):
         if self.invoice_info is None:
             self.create_invoice()
 
         method = payment_method.lower()
         print(f"Payment method: {method}")
+        key = payment_key(self.order_id, idempotency_key, fingerprint,
+                          self.customer.customer_id, self.total_cost)
         
         # Select the appropriate payment strategy
         if method == "credit":
-            payment_strategy = CreditCard(payment_details)
+            return CreditCard(payment_details, key)
         elif method == "bank":
-            payment_strategy = BankTransfer(payment_details)
+            return BankTransfer(payment_details, key)
         elif method == "thirdparty":
-            payment_strategy = ThirdParty(payment_details)
-        else:
-            print("Error: Unsupported payment method.")
-            return False
+            return ThirdParty(payment_details, key)
+        print("Error: Unsupported payment method.")
+        return None
 
-        # Process payment
-        success = payment_strategy.process_payment(self.total_cost)
-        if success:
-            self.status = "Paid"
-            print(f"Order {self.order_id} marked as paid.")
-            
-            # Save the order to database
-            if self.save_order():
-                # Notify observers only if save was successful
-                observer.notify_all(self.order_id)
-
-                #Clear shopping cart only once order has been saved
-                self.customer.get_cart().clear_cart()
-                return True
-            else:
-                print("Error: Order payment successful but failed to save order.")
-                return False
-        else:
-            print("Payment failed.")
+    def _record_payment(self) -> bool:
+        # Called once the payment went through: mark the order paid and persist it
+        self.status = "Paid"
+        print(f"Order {self.order_id} marked as paid.")
+        
+        # The order, its lines and the removal of the ordered cart lines are committed together,
+        # with one durable write, so a crash cannot leave a paid order behind a full cart.
+        # Only the ordered products go: anything added to the cart meanwhile stays in it
+        try:
+            with DatabaseManager().transaction() as tx:
+                if not self.save_order(tx):
+                    raise ValueError("order could not be saved")
+                self.customer.get_cart().remove_items([item["product_id"] for item in self.items], tx)
+        except Exception as e:
+            print(f"Error: Order payment successful but failed to save order: {e}")
             return False
+        return True
 
     def create_invoice(self):
         
@@ -0,0 +1,59 @@
+# backend/models/order_ids.py
+
+import os
+import time
+import secrets
+from threading import Lock
+
+# Crockford base32: no I, L, O or U, so IDs read back unambiguously
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+class OrderIdGenerator:
+
+    #Unique, time-sortable order IDs: 'O' + 10 chars of millisecond timestamp + 4 chars of
+    #sequence + 6 chars of node, e.g. 'O01M57CSKZB0000VAD3RF'.
+    #Within one process, IDs strictly increase: the sequence counts up inside a millisecond
+    #and the timestamp never goes backwards, even if the clock does. The node is 30 random bits
+    #drawn per process (and redrawn after a fork), so two workers issuing an ID in the same
+    #millisecond still differ. Sorting IDs as strings sorts them by creation time.
+
+
+    TIME_CHARS, SEQ_CHARS, NODE_CHARS = 10, 4, 6
+    MAX_SEQ = 32 ** SEQ_CHARS - 1
+
+    def __init__(self, prefix: str = "O", clock=time.time):
+        self.prefix = prefix
+        self.clock = clock
+        self._lock = Lock()
+        self._pid = None
+        self._node = ""
+        self._last_ms = 0
+        self._seq = 0
+
+    def new_id(self) -> str:
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use, or a forked worker: its own node, so it never repeats the parent's IDs
+                self._pid = os.getpid()
+                self._node = _encode(secrets.randbits(5 * self.NODE_CHARS), self.NODE_CHARS)
+            now = int(self.clock() * 1000)
+            if now > self._last_ms:
+                self._last_ms, self._seq = now, 0
+            elif self._seq < self.MAX_SEQ:
+                self._seq += 1
+            else:
+                # Sequence used up (or the clock stepped back): borrow the next millisecond
+                self._last_ms, self._seq = self._last_ms + 1, 0
+            return (self.prefix + _encode(self._last_ms, self.TIME_CHARS)
+                    + _encode(self._seq, self.SEQ_CHARS) + self._node)
+
+
+order_ids = OrderIdGenerator()
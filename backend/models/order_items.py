@@ -0,0 +1,94 @@
+# backend/models/order_items.py
+
+import json
+import weakref
+from threading import Lock
+
+from models.database import DatabaseManager
+
+ORDER_ITEM_COLUMNS = ["order_id", "product_id", "quantity", "unit_price"]
+
+# order_items tables the legacy migration has already run against, in this process
+_migrated = weakref.WeakSet()
+_migrate_lock = Lock()
+
+def unit_price(product_id: str) -> float:
+    #Current price of a product from the 'products' table (0.0 if unknown).
+    products = DatabaseManager().get_table("products")
+    if products is None:
+        return 0.0
+    products.create_index("product_id")
+    row = products.get_row_by_column_value("product_id", str(product_id))
+    try:
+        return float(row["price"]) if row else 0.0
+    except ValueError:
+        return 0.0
+
+
+def get_order_items_table():
+
+    #Return the normalized 'order_items' table (one row per order line), indexed by
+    #order_id and product_id. Orders that only have the legacy JSON 'items' column are
+    #migrated into it the first time it is opened (app.py does so at startup); later calls
+    #skip the migration, since new orders always get their lines with them.
+
+    dbm = DatabaseManager()
+    table = dbm.get_table("order_items")
+    if table is None:
+        table = dbm.create_table("order_items", ORDER_ITEM_COLUMNS)
+    if table in _migrated:
+        return table
+    with _migrate_lock:
+        if table not in _migrated:
+            table.create_index("order_id")
+            table.create_index("product_id")
+            order_table = dbm.get_table("order")
+            if order_table is not None:
+                migrate_order_items(order_table, table)
+            _migrated.add(table)
+    return table
+
+
+def migrate_order_items(order_table, items_table) -> int:
+
+    #Copy the JSON 'items' of every order without order_items rows into items_table.
+    #Migrated lines use the product's current price, since the JSON carries none.
+    #Idempotent; returns the number of orders migrated.
+
+    # One migrating thread at a time, so no order has its lines copied twice;
+    # the batch also writes every migrated line at once when it is done
+    order_table.sync()
+    with items_table.batch():
+        return _migrate(order_table.rows, items_table)
+
+
+def _migrate(orders: list, items_table) -> int:
+    migrated = 0
+    for order in orders:
+        order_id = order.get("order_id")
+        if items_table.indexes["order_id"].lookup(order_id):
+            continue
+        try:
+            items_list = json.loads(order.get("items") or "[]")
+        except json.JSONDecodeError:
+            continue
+        for entry in items_list:
+            if entry.get("product_id"):
+                items_table.add_row({
+                    "order_id": order_id,
+                    "product_id": str(entry["product_id"]),
+                    "quantity": str(int(entry.get("quantity", 0))),
+                    "unit_price": str(unit_price(entry["product_id"]))
+                })
+        migrated += 1
+    return migrated
+
+
+def get_order_items(order_id: str) -> list:
+    #Typed lines of one order: [{"product_id": str, "quantity": int, "unit_price": float}, ...]
+    table = get_order_items_table()
+    return [{
+        "product_id": row["product_id"],
+        "quantity": int(row["quantity"]),
+        "unit_price": float(row["unit_price"] or 0)
+    } for row in table.get_rows_by_column_value("order_id", order_id)]
@@ -0,0 +1,175 @@
+import os
+import csv
+import io
+import time
+import atexit
+import threading
+
+# backend/data, independent of the process working directory
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+
+class GroupCommitAppender:
+
+    #Thread-safe, append-only CSV writer shared by every listener writing the same file.
+    #The file handle stays open. Rows are buffered and written as one group when max_batch rows
+    #are waiting or the oldest has waited max_delay seconds, whichever comes first.
+    #durability controls what a group commit guarantees:
+    #  "sync"  - no buffering; every append is written and fsync'ed before returning
+    #  "group" - buffered; one write + fsync per group commit, and append_many returns only
+    #            once its rows are on disk (or raises the write error, so the caller can retry)
+    #  "none"  - buffered; one write per group commit, left to the OS to flush to disk.
+    #            A failed write is kept and tried again with the next group.
+    #The group is swapped out under the lock and written outside it, so appends never wait
+    #behind the disk.
+
+
+    DURABILITY = ("sync", "group", "none")
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, file_path: str, header: list, **options):
+        #Return the appender for file_path, creating it on first use.
+        #Asking again with different options is an error rather than silently getting the first ones.
+        key = os.path.abspath(file_path)
+        with cls._instances_lock:
+            appender = cls._instances.get(key)
+            if appender is None:
+                appender = cls._instances[key] = cls(key, header, **options)
+            else:
+                conflicts = {name: value for name, value in options.items() if getattr(appender, name) != value}
+                if conflicts:
+                    raise ValueError(f"Appender for {key} is already open with different options: {conflicts}")
+            return appender
+
+    @classmethod
+    def close_all(cls):
+        with cls._instances_lock:
+            for appender in cls._instances.values():
+                appender.close()
+            cls._instances = {}
+
+    def __init__(self, file_path: str, header: list, max_batch: int = 100,
+                 max_delay: float = 0.05, durability: str = "group"):
+        if durability not in self.DURABILITY:
+            raise ValueError(f"durability must be one of {self.DURABILITY}")
+        self.file_path = file_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.durability = durability
+
+        self._buffer = []           # (sequence number, rows) per append_many call
+        self._buffered_rows = 0
+        self._sequence = 0          # last sequence number handed out
+        self._durable = 0           # every sequence number up to this one is written
+        self._failed = {}           # sequence number -> write error, for its waiting caller
+        self._cond = threading.Condition()
+        # Held while writing; taken before _cond, never after it
+        self._write_lock = threading.Lock()
+        self._closed = False
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        is_new = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        self._file = open(file_path, mode="a", newline="", encoding="utf-8")
+        if is_new:
+            self._write_rows([header], fsync=True)
+
+        self._flusher = None
+        if durability != "sync":
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True,
+                                             name=f"appender-{os.path.basename(file_path)}")
+            self._flusher.start()
+
+    def _write_rows(self, rows: list, fsync: bool):
+        # Format the whole group in memory so it reaches the file as a single write
+        out = io.StringIO()
+        csv.writer(out).writerows(rows)
+        self._file.write(out.getvalue())
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def append(self, row: list):
+        self.append_many([row])
+
+    def append_many(self, rows: list):
+        if self.durability == "sync":
+            with self._write_lock:
+                if self._closed:
+                    raise ValueError(f"Appender for {self.file_path} is closed")
+                self._write_rows(rows, fsync=True)
+            return
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"Appender for {self.file_path} is closed")
+            self._sequence += 1
+            sequence = self._sequence
+            self._buffer.append((sequence, rows))
+            self._buffered_rows += len(rows)
+            self._cond.notify_all()
+            if self.durability != "group":
+                return
+            self._cond.wait_for(lambda: sequence in self._failed or self._durable >= sequence)
+            error = self._failed.pop(sequence, None)
+        if error is not None:
+            raise error
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._buffer)
+                if self._closed:
+                    return
+                # Give the group up to max_delay to fill before committing it
+                if self._buffered_rows < self.max_batch:
+                    self._cond.wait_for(lambda: self._closed or self._buffered_rows >= self.max_batch,
+                                        timeout=self.max_delay)
+            if not self._commit():
+                # Back off before the kept rows are tried again
+                time.sleep(self.max_delay)
+
+    def _commit(self) -> bool:
+        #Write (and fsync) everything buffered. Returns False if the write failed.
+        with self._write_lock:
+            with self._cond:
+                groups, self._buffer, self._buffered_rows = self._buffer, [], 0
+            if not groups:
+                return True
+            try:
+                self._write_rows([row for _, rows in groups for row in rows], fsync=self.durability == "group")
+                error = None
+            except Exception as e:
+                error = e
+                print(f"[Appender] Writing {self.file_path} failed: {e}")
+            with self._cond:
+                if error is None:
+                    self._durable = groups[-1][0]
+                elif self.durability == "group":
+                    # The callers are still waiting: the error goes back to them to retry
+                    for sequence, _ in groups:
+                        self._failed[sequence] = error
+                else:
+                    self._buffer[:0] = groups
+                    self._buffered_rows += sum(len(rows) for _, rows in groups)
+                self._cond.notify_all()
+            return error is None
+
+    def flush(self):
+        #Commit whatever is buffered right now.
+        self._commit()
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self._commit()
+        with self._write_lock:
+            self._file.close()
+
+
+atexit.register(GroupCommitAppender.close_all)
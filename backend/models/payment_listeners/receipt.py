@@ -1,20 +1,21 @@
 from .payment_listener import PaymentListener
-import csv
+from .csv_appender import GroupCommitAppender, DATA_DIR
 import os
 
 class Receipt(PaymentListener):
-    def __init__(self):
-        self.file_path = "data/receipts.csv"
+    def __init__(self, durability: str = "group", max_batch: int = 100, max_delay: float = 0.05):
+        self.file_path = os.path.join(DATA_DIR, "receipts.csv")
 
-        # Create the file with headers if it doesn't exist
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, mode='w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(["Order ID", "Status", "Message"])
+        # Shared appender; creates the file with headers if it doesn't exist
+        self.appender = GroupCommitAppender.for_path(
+            self.file_path, ["Order ID", "Status", "Message"],
+            durability=durability, max_batch=max_batch, max_delay=max_delay
+        )
 
     def on_payment_success(self, order_id: str):
         print(f"[Receipt] Creating receipt for order {order_id}")
+        self.appender.append([order_id, "Paid", "Receipt generated"])
 
-        with open(self.file_path, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([order_id, "Paid", "Receipt generated"])
\ No newline at end of file
+    def on_payment_success_batch(self, order_ids: list):
+        print(f"[Receipt] Creating receipts for {len(order_ids)} orders")
+        self.appender.append_many([[order_id, "Paid", "Receipt generated"] for order_id in order_ids])
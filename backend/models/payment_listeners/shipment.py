@@ -1,24 +1,25 @@
 from .payment_listener import PaymentListener
-import csv
+from .csv_appender import GroupCommitAppender, DATA_DIR
 import os
 
 class Shipment(PaymentListener):
-    def __init__(self):
-        self.file_path = "data/shipments.csv"
+    def __init__(self, durability: str = "group", max_batch: int = 100, max_delay: float = 0.05):
+        self.file_path = os.path.join(DATA_DIR, "shipments.csv")
         
-        # Create file with headers if it doesn't exist
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, mode='w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(["Order ID", "Shipment Status", "Message"])
+        # Shared appender; creates the file with headers if it doesn't exist
+        self.appender = GroupCommitAppender.for_path(
+            self.file_path, ["Order ID", "Shipment Status", "Message"],
+            durability=durability, max_batch=max_batch, max_delay=max_delay
+        )
 
     def on_payment_success(self, order_id: str):
         print(f"[Shipment] Creating shipment for order {order_id}")
+        self.appender.append([order_id, "Queued", "Shipment initiated"])
 
-        with open(self.file_path, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([order_id, "Queued", "Shipment initiated"])
+    def on_payment_success_batch(self, order_ids: list):
+        print(f"[Shipment] Creating shipments for {len(order_ids)} orders")
+        self.appender.append_many([[order_id, "Queued", "Shipment initiated"] for order_id in order_ids])
 
     #Future implementations:
     def update_shipment(): ...
-    def cancel_shipment(): ...
\ No newline at end of file
+    def cancel_shipment(): ...
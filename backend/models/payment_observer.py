@@ -1,16 +1,144 @@
+import asyncio
+import atexit
+import queue
+import threading
+import time
+
+from models.metrics import metrics
+
+LISTENER_SECONDS = metrics.histogram("awe_observer_listener_seconds",
+                                     "Time each payment listener takes per delivery", ["listener"])
+LISTENER_FAILURES = metrics.counter("awe_observer_listener_failures_total",
+                                    "Payment listener calls that raised", ["listener"])
+
 class PaymentObserver:
     def __init__(self):
         self._observers = []
+        # Set by start_async(); while None, notify_all delivers inline
+        self._queue = None
+        self._workers = []
+        self._stopping = threading.Event()
+        self.batch_size = 50
+        self.max_retries = 3
+        self.retry_delay = 0.1
+        self.put_timeout = 1.0
 
     def register(self, observer):
         #Register a new listener that implements on_payment_success(order_id)
+        #and, optionally, on_payment_success_batch(order_ids)
         self._observers.append(observer)
 
+    def start_async(self, workers: int = 2, queue_size: int = 1000, batch_size: int = 50,
+                    max_retries: int = 3, retry_delay: float = 0.1, put_timeout: float = 1.0):
+
+        #Switch to background delivery: notify_all only enqueues the event and returns.
+        #Worker threads take up to batch_size events at a time and hand them to each listener,
+        #retrying a failing listener up to max_retries times without re-running the others.
+        #The queue is bounded; if it stays full for put_timeout seconds the caller delivers
+        #the event itself, which slows producers down instead of dropping events.
+        #Pending events are flushed at interpreter exit.
+
+        if self._queue is not None:
+            return
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.put_timeout = put_timeout
+        self._stopping.clear()
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"payment-observer-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+        atexit.register(self.shutdown)
+
     def notify_all(self, order_id: str):
         #Notify all registered listeners when a payment is successful
+        if self._queue is not None:
+            try:
+                self._queue.put(order_id, timeout=self.put_timeout)
+                return
+            except queue.Full:
+                print(f"[Observer] Queue full, delivering order {order_id} inline")
+                self._deliver([order_id])
+                return
+
         print(f"[Observer] Notifying {len(self._observers)} observers for order {order_id}")
         for observer in self._observers:
-            observer.on_payment_success(order_id)
+            with LISTENER_SECONDS.time(type(observer).__name__):
+                observer.on_payment_success(order_id)
+
+    async def notify_all_async(self, order_id: str):
+        #notify_all for the asyncio server: enqueue without waiting, otherwise (no workers
+        #started, or queue full) deliver on the loop's executor so listeners never block the loop
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(order_id)
+                return
+            except queue.Full:
+                pass
+        await asyncio.get_running_loop().run_in_executor(None, self.notify_all, order_id)
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, order_ids: list):
+        for observer in self._observers:
+            batch_handler = getattr(observer, "on_payment_success_batch", None)
+            if batch_handler is not None:
+                self._with_retries(observer, batch_handler, order_ids)
+            else:
+                for order_id in order_ids:
+                    self._with_retries(observer, observer.on_payment_success, order_id)
+
+    def _with_retries(self, observer, handler, arg):
+        name = type(observer).__name__
+        for attempt in range(self.max_retries + 1):
+            try:
+                with LISTENER_SECONDS.time(name):
+                    handler(arg)
+                return
+            except Exception as e:
+                LISTENER_FAILURES.inc(name)
+                if attempt == self.max_retries:
+                    print(f"[Observer] {type(observer).__name__} gave up on {arg}: {e}")
+                    return
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    def flush(self):
+        #Block until every queued event has been delivered
+        if self._queue is not None:
+            self._queue.join()
+
+    def shutdown(self, flush: bool = True):
+        #Stop the workers, delivering whatever is still queued first when flush is True.
+        #notify_all delivers inline again afterwards.
+        if self._queue is None:
+            return
+        if flush:
+            self.flush()
+        self._stopping.set()
+        for t in self._workers:
+            t.join()
+        self._workers = []
+        self._queue = None
+        atexit.unregister(self.shutdown)
 
 # Shared instance used across the app
-observer = PaymentObserver()
\ No newline at end of file
+observer = PaymentObserver()
+metrics.gauge("awe_observer_queue_depth", "Payment events waiting for the listener threads",
+              lambda: observer._queue.qsize() if observer._queue is not None else 0)
@@ -0,0 +1,106 @@
+import os
+import json
+import uuid
+import hashlib
+from threading import Lock
+
+from .gateway_client import GatewayClient, GatewayError
+
+# AWE_PAYMENT_GATEWAY=http://host:port/path sends every charge to that gateway as
+# POST {"method", "amount_cents", "details"} and expects {"approved": true|false} back.
+# AWE_PAYMENT_GATEWAY_CREDIT / _BANK / _THIRDPARTY send one payment method elsewhere.
+# Unset, payments are approved locally as before.
+# Each gateway URL gets one shared GatewayClient (see gateway_client.py), tuned with:
+#   AWE_PAYMENT_GATEWAY_TIMEOUT          seconds for the whole charge, retries included (10)
+#   AWE_PAYMENT_GATEWAY_ATTEMPT_TIMEOUT  seconds for one attempt (4)
+#   AWE_PAYMENT_GATEWAY_RETRIES          attempts after the first one (2)
+#   AWE_PAYMENT_GATEWAY_HEDGE_MS         race a second attempt after this many ms (off)
+#   AWE_PAYMENT_GATEWAY_POOL             idle connections kept per gateway (10)
+#   AWE_PAYMENT_GATEWAY_MAX_CONNECTIONS  connections open at once per gateway (100)
+
+_clients = {}
+_clients_lock = Lock()
+
+def gateway_url(method: str = None):
+    if method:
+        url = os.environ.get(f"AWE_PAYMENT_GATEWAY_{method.upper()}")
+        if url:
+            return url
+    return os.environ.get("AWE_PAYMENT_GATEWAY")
+
+def gateway_timeout() -> float:
+    return float(os.environ.get("AWE_PAYMENT_GATEWAY_TIMEOUT", "10"))
+
+def configured(method: str = None) -> bool:
+    return bool(gateway_url(method))
+
+def client_for(method: str) -> GatewayClient:
+    url = gateway_url(method)
+    client = _clients.get(url)
+    if client is not None:
+        return client
+    with _clients_lock:
+        if url not in _clients:
+            hedge_ms = os.environ.get("AWE_PAYMENT_GATEWAY_HEDGE_MS")
+            _clients[url] = GatewayClient(
+                url,
+                timeout         = gateway_timeout(),
+                attempt_timeout = float(os.environ.get("AWE_PAYMENT_GATEWAY_ATTEMPT_TIMEOUT", "4")),
+                max_retries     = int(os.environ.get("AWE_PAYMENT_GATEWAY_RETRIES", "2")),
+                hedge_after     = float(hedge_ms) / 1000 if hedge_ms else None,
+                pool_size       = int(os.environ.get("AWE_PAYMENT_GATEWAY_POOL", "10")),
+                max_connections = int(os.environ.get("AWE_PAYMENT_GATEWAY_MAX_CONNECTIONS", "100"))
+            )
+        return _clients[url]
+
+def reset_clients():
+    #Drop every client (and its connections), so the next charge reads the settings again
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+def payment_key(order_id: str, request_key: str = None, fingerprint: str = "",
+                customer_id: str = "", amount: float = 0.0) -> str:
+    #Gateway Idempotency-Key of a payment. A client retrying with the same Idempotency-Key gets
+    #a new order, but the same gateway key, so a charge that went through (before a timeout or
+    #a 5xx) is not taken twice. The key also covers the request's fingerprint (see
+    #IdempotencyStore.fingerprint), the customer and the amount: a client key reused for anything
+    #else (once released by a 5xx, or pruned) is charged on its own instead of replaying the
+    #earlier approval. Without a client key, each order is charged at most once.
+    if request_key:
+        scope = "\0".join([request_key, fingerprint or "", str(customer_id),
+                           str(round(float(amount) * 100))])
+        return "req-" + hashlib.sha256(scope.encode("utf-8")).hexdigest()[:40]
+    return f"order-{order_id}"
+
+def _request(method: str, amount: float, details: dict, key: str = None):
+    body = json.dumps({"method": method, "amount_cents": round(float(amount) * 100),
+                       "details": details or {}}).encode("utf-8")
+    # One key per charge, repeated on every retry and hedge, so the gateway charges it once
+    return body, {"Idempotency-Key": key or uuid.uuid4().hex}
+
+def _approved(status: int, body: bytes) -> bool:
+    if status != 200:
+        return False
+    try:
+        return json.loads(body or b"{}").get("approved") is True
+    except ValueError:
+        return False
+
+def charge(method: str, amount: float, details: dict, key: str = None) -> bool:
+    #Blocking charge: the calling thread waits for the gateway. Any failure declines.
+    #key is the payment's gateway Idempotency-Key (see payment_key); a fresh one if None.
+    try:
+        return _approved(*client_for(method).post(*_request(method, amount, details, key)))
+    except GatewayError as e:
+        print(f"[Gateway] {method} charge failed: {e}")
+        return False
+
+async def charge_async(method: str, amount: float, details: dict, key: str = None) -> bool:
+    #Non-blocking charge for the asyncio server: waiting on the gateway holds no thread.
+    try:
+        return _approved(*await client_for(method).post_async(*_request(method, amount, details, key)))
+    except GatewayError as e:
+        print(f"[Gateway] {method} charge failed: {e}")
+        return False
@@ -0,0 +1,472 @@
+import ssl
+import time
+import random
+import asyncio
+import weakref
+import http.client
+from collections import deque
+from threading import Lock, BoundedSemaphore
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class GatewayError(Exception):
+    #A charge that got no usable answer: connection failure, timeout, or a 5xx / 429 reply
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(GatewayError):
+    pass
+
+
+class CircuitBreaker:
+
+    #Stops calling a gateway that keeps failing. Closed, calls go through; after
+    #failure_threshold failures in a row it opens and every call is refused at once for
+    #reset_timeout seconds. Then it is half open: one trial call goes through, and its
+    #outcome closes the breaker again or reopens it for another reset_timeout.
+
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False          # the half-open trial call is in flight
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.trial or self.clock() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def abandon(self):
+        #A call given up for reasons of the caller's own (e.g. cancelled) says nothing about the
+        #gateway; if it was the half-open trial, the next call may try instead
+        with self._lock:
+            self.trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.trial = False
+
+
+class ConnectionPool:
+
+    #Keep-alive connections to one gateway, for blocking callers. Up to max_idle are kept
+    #for reuse, and dropped once idle for longer than idle_timeout. At most max_size are open
+    #at once; a caller that finds them all busy waits for one until its deadline.
+
+
+    def __init__(self, host: str, port: int, https: bool = False, max_size: int = 100,
+                 max_idle: int = 10, idle_timeout: float = 30.0, clock=time.monotonic):
+        self.host = host
+        self.port = port
+        self.https = https
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.idle = deque()         # (connection, released at)
+        self.opened = 0
+        self._slots = BoundedSemaphore(max_size)
+        self._lock = Lock()
+
+    def acquire(self, timeout: float):
+        #(connection, reused). The connection must be given back with release().
+        if not self._slots.acquire(timeout=max(timeout, 0)):
+            raise GatewayError(f"{self.host}:{self.port}: no free connection before the deadline")
+        now = self.clock()
+        with self._lock:
+            while self.idle:
+                conn, released = self.idle.pop()
+                if now - released < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        return self.connect(timeout), False
+
+    def connect(self, timeout: float):
+        #A new connection, to be given back with release() like an acquired one
+        with self._lock:
+            self.opened += 1
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=timeout)
+
+    def release(self, conn, reusable: bool):
+        with self._lock:
+            if reusable and len(self.idle) < self.max_idle:
+                self.idle.append((conn, self.clock()))
+                conn = None
+        if conn is not None:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            while self.idle:
+                self.idle.pop()[0].close()
+
+
+class AsyncConnectionPool:
+
+    #ConnectionPool for one event loop: keep-alive (reader, writer) stream pairs.
+
+
+    def __init__(self, host: str, port: int, https: bool = False, max_size: int = 100,
+                 max_idle: int = 10, idle_timeout: float = 30.0, clock=time.monotonic):
+        self.host = host
+        self.port = port
+        self.https = https
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.idle = deque()         # (reader, writer, released at)
+        self.opened = 0
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def acquire(self):
+        #((reader, writer), reused). Bound the wait with the caller's deadline.
+        await self._slots.acquire()
+        try:
+            now = self.clock()
+            while self.idle:
+                reader, writer, released = self.idle.pop()
+                if now - released < self.idle_timeout and not writer.is_closing() and not reader.at_eof():
+                    return (reader, writer), True
+                writer.close()
+            return await self.connect(), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def connect(self):
+        self.opened += 1
+        context = ssl.create_default_context() if self.https else None
+        return await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    def release(self, streams, reusable: bool):
+        if reusable and len(self.idle) < self.max_idle:
+            self.idle.append((*streams, self.clock()))
+        else:
+            streams[1].close()
+        self._slots.release()
+
+    def close(self):
+        while self.idle:
+            self.idle.pop()[1].close()
+
+
+# A reused keep-alive connection the gateway has meanwhile closed fails like this, before any
+# reply; the request is sent again on a new connection without counting as a retry
+STALE_CONNECTION = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    asyncio.IncompleteReadError)
+
+# Threads running hedged attempts, shared by every GatewayClient
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gateway-hedge")
+
+
+class GatewayClient:
+
+    #HTTP client for one payment gateway URL, shared by every charge sent there:
+    #    client.post(body, headers) -> (status, body), from a thread
+    #    await client.post_async(body, headers), from the event loop
+    #  - pooled keep-alive connections: pool_size kept for reuse, at most max_connections open
+    #    (per gateway, and per event loop for post_async);
+    #  - a deadline of timeout seconds for the whole call, and of attempt_timeout per attempt;
+    #  - up to max_retries more attempts after a connection failure, timeout, 5xx or 429, after
+    #    a random ("full jitter") pause of up to backoff * 2^n seconds, capped at max_backoff;
+    #  - a CircuitBreaker, so a gateway that is down is not waited on by every checkout;
+    #  - with hedge_after set, an attempt not answered within hedge_after seconds is raced by a
+    #    second identical one, and the first answer wins.
+    #Retries and hedges repeat the request, so the caller must send an Idempotency-Key header
+    #for the gateway to charge each payment only once.
+    #Raises GatewayError (CircuitOpenError while the breaker is open) when there is no answer.
+    #clock, sleep, async_sleep and rng (the jitter's random.Random) can be replaced to run the
+    #deadline, backoff and breaker logic on simulated time.
+
+
+    def __init__(self, url: str, timeout: float = 10.0, attempt_timeout: float = None,
+                 max_retries: int = 2, backoff: float = 0.05, max_backoff: float = 1.0,
+                 hedge_after: float = None, pool_size: int = 10, max_connections: int = 100,
+                 breaker: CircuitBreaker = None, clock=time.monotonic, sleep=time.sleep,
+                 async_sleep=asyncio.sleep, rng: random.Random = None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid gateway URL '{url}'")
+        self.url = url
+        self.host = parts.hostname
+        self.https = parts.scheme == "https"
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout or timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.random = rng or random.Random()
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.pool = ConnectionPool(self.host, self.port, self.https, max_connections, pool_size, clock=clock)
+        self._async_pools = weakref.WeakKeyDictionary()     # event loop -> AsyncConnectionPool
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                      "failures": 0, "short_circuited": 0}
+        self._stats_lock = Lock()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _delay(self, retry: int) -> float:
+        return self.random.uniform(0, min(self.max_backoff, self.backoff * (2 ** retry)))
+
+    def _remaining(self, deadline: float) -> float:
+        remaining = deadline - self.clock()
+        if remaining <= 0:
+            raise GatewayError(f"{self.url}: deadline exceeded")
+        return min(remaining, self.attempt_timeout)
+
+    def _answer(self, status: int, body: bytes):
+        if status >= 500 or status == 429:
+            raise GatewayError(f"{self.url}: gateway replied {status}", status)
+        return status, body
+
+    def _before_attempt(self):
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"{self.url}: circuit open, not calling the gateway")
+
+    def _prepare(self, headers: dict):
+        self._count("calls")
+        return {"Content-Type": "application/json", **(headers or {})}, self.clock() + self.timeout
+
+    # ── blocking ─────────────────────────────────────────────────────────────
+    def post(self, body: bytes, headers: dict = None):
+        headers, deadline = self._prepare(headers)
+        for retry in range(self.max_retries + 1):
+            self._before_attempt()
+            try:
+                result = self._hedged(body, headers, deadline)
+            except GatewayError as e:
+                self.breaker.record_failure()
+                error = e
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            delay = self._delay(retry)
+            if retry == self.max_retries or self.clock() + delay >= deadline:
+                break
+            self._count("retries")
+            self.sleep(delay)
+        self._count("failures")
+        raise error
+
+    def _hedged(self, body: bytes, headers: dict, deadline: float):
+        if self.hedge_after is None or deadline - self.clock() <= self.hedge_after:
+            return self._attempt(body, headers, deadline)
+        attempts = {_hedge_pool.submit(self._attempt, body, headers, deadline)}
+        done, _ = wait(attempts, timeout=self.hedge_after)
+        if not done:
+            self._count("hedges")
+            attempts.add(_hedge_pool.submit(self._attempt, body, headers, deadline))
+        error = None
+        while attempts:
+            done, attempts = wait(attempts, timeout=max(deadline - self.clock(), 0),
+                                  return_when=FIRST_COMPLETED)
+            if not done:
+                raise GatewayError(f"{self.url}: deadline exceeded")
+            for future in done:
+                try:
+                    # A slower attempt still running finishes in the background
+                    return future.result()
+                except GatewayError as e:
+                    error = e
+        raise error
+
+    def _attempt(self, body: bytes, headers: dict, deadline: float):
+        self._count("attempts")
+        # Each attempt gets what is left of the deadline, at most attempt_timeout
+        timeout = self._remaining(deadline)
+        conn, reused = self.pool.acquire(timeout)
+        # Waiting for a free connection used up part of the time
+        timeout = min(timeout, max(deadline - self.clock(), 0.001))
+        reusable = False
+        try:
+            while True:
+                try:
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    conn.timeout = timeout
+                    conn.request("POST", self.path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    reusable = not resp.will_close
+                    break
+                except STALE_CONNECTION as e:
+                    if not reused:
+                        raise GatewayError(f"{self.url}: {e!r}") from e
+                    conn.close()
+                    conn, reused = self.pool.connect(timeout), False
+                except (OSError, http.client.HTTPException) as e:
+                    raise GatewayError(f"{self.url}: {e!r}") from e
+        finally:
+            self.pool.release(conn, reusable)
+        return self._answer(resp.status, data)
+
+    # ── asyncio ──────────────────────────────────────────────────────────────
+    async def post_async(self, body: bytes, headers: dict = None):
+        headers, deadline = self._prepare(headers)
+        for retry in range(self.max_retries + 1):
+            self._before_attempt()
+            try:
+                result = await self._hedged_async(body, headers, deadline)
+            except GatewayError as e:
+                self.breaker.record_failure()
+                error = e
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            delay = self._delay(retry)
+            if retry == self.max_retries or self.clock() + delay >= deadline:
+                break
+            self._count("retries")
+            await self.async_sleep(delay)
+        self._count("failures")
+        raise error
+
+    async def _hedged_async(self, body: bytes, headers: dict, deadline: float):
+        if self.hedge_after is None or deadline - self.clock() <= self.hedge_after:
+            return await self._attempt_async(body, headers, deadline)
+        attempts = {asyncio.ensure_future(self._attempt_async(body, headers, deadline))}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+            if not done:
+                self._count("hedges")
+                attempts.add(asyncio.ensure_future(self._attempt_async(body, headers, deadline)))
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, timeout=max(deadline - self.clock(), 0),
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise GatewayError(f"{self.url}: deadline exceeded")
+                for task in done:
+                    try:
+                        return task.result()
+                    except GatewayError as e:
+                        error = e
+            raise error
+        finally:
+            # The losing attempt is abandoned; its connection is closed, not pooled
+            for task in attempts:
+                task.cancel()
+
+    def _async_pool(self) -> AsyncConnectionPool:
+        loop = asyncio.get_running_loop()
+        pool = self._async_pools.get(loop)
+        if pool is None:
+            pool = self._async_pools[loop] = AsyncConnectionPool(self.host, self.port, self.https,
+                                                                  self.max_connections, self.pool_size,
+                                                                  clock=self.clock)
+        return pool
+
+    async def _attempt_async(self, body: bytes, headers: dict, deadline: float):
+        self._count("attempts")
+        timeout = self._remaining(deadline)
+        pool = self._async_pool()
+        request = (f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                   + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+                   + f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+
+        async def exchange():
+            streams, reused = await pool.acquire()
+            reusable = False
+            try:
+                while True:
+                    reader, writer = streams
+                    try:
+                        writer.write(request)
+                        await writer.drain()
+                        status, data, reusable = await _read_response(reader)
+                        return status, data
+                    except STALE_CONNECTION:
+                        if not reused:
+                            raise
+                        writer.close()
+                        streams, reused = await pool.connect(), False
+            finally:
+                pool.release(streams, reusable)
+
+        try:
+            status, data = await asyncio.wait_for(exchange(), timeout)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError) as e:
+            raise GatewayError(f"{self.url}: {e!r}") from e
+        return self._answer(status, data)
+
+    def close(self):
+        self.pool.close()
+        for loop, pool in list(self._async_pools.items()):
+            # Streams belong to their loop; one already closed took its connections with it
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(pool.close)
+
+
+async def _read_response(reader):
+    #(status, body, reusable) of one HTTP/1.1 response
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    version, status = lines[0].split(" ", 2)[:2]
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    reusable = version == "HTTP/1.1" and headers.get("connection") != "close"
+    if "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            chunks.append(chunk[:-2])
+        body = b"".join(chunks)
+    else:
+        body = await reader.read()
+        reusable = False
+    return int(status), body, reusable
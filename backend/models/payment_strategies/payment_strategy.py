@@ -1,6 +1,13 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 class PaymentStrategy(ABC):
     @abstractmethod
     def process_payment(self, total_cost: float) -> bool:
         pass
+
+    async def process_payment_async(self, total_cost: float) -> bool:
+        #For the asyncio server. Strategies that can wait on their gateway without a thread
+        #override this; by default the blocking call runs on the loop's executor.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.process_payment, total_cost)
@@ -1,11 +1,23 @@
 from .payment_strategy import PaymentStrategy
+from . import gateway
 
 class ThirdParty(PaymentStrategy):
 
-    def __init__(self, payment_details=None):
+    def __init__(self, payment_details=None, idempotency_key=None):
         self.payment_details = payment_details or {}
+        # Sent to the gateway with the charge (see gateway.payment_key)
+        self.idempotency_key = idempotency_key
 
     def process_payment(self, total_cost: float) -> bool:
         print(f"[ThirdParty] Processing payment of ${float(total_cost):.2f}")
+        if gateway.configured("thirdparty"):
+            return gateway.charge("thirdparty", total_cost, self.payment_details, self.idempotency_key)
         # Actual third-party payment processing logic pending
         return True
+
+    async def process_payment_async(self, total_cost: float) -> bool:
+        print(f"[ThirdParty] Processing payment of ${float(total_cost):.2f}")
+        if gateway.configured("thirdparty"):
+            return await gateway.charge_async("thirdparty", total_cost, self.payment_details,
+                                                 self.idempotency_key)
+        return True
@@ -1,6 +1,7 @@
 # backend/models/product_catalogue.py
 
 from .product import Product
+from .product_listing import ProductListing
 
 class ProductCatalogue:
     #Represents a single catalogue (e.g. "Organic", "Discounted", "Dairy").
@@ -11,6 +12,8 @@ class ProductCatalogue:
         self.name = name
         # Map product_id -> Product instance
         self.products = {p.product_id: p for p in product_list}
+        # Presorted views for paged listing
+        self.listing = ProductListing(list(self.products.values()))
 
     def get_catalogue_id(self) -> str:
         return self.catalogue_id
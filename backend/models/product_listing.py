@@ -0,0 +1,127 @@
+# backend/models/product_listing.py
+
+import json
+import base64
+from bisect import bisect_left, bisect_right
+
+from models.table_lock import RWLock
+
+FIELDS = ("product_id", "name", "description", "price")
+MAX_PAGE_SIZE = 500
+
+def _id_key(product_id: str) -> tuple:
+    # Numeric ids sort numerically ("2" before "10"), others after them alphabetically
+    return (0, int(product_id), "") if product_id.isdigit() else (1, 0, product_id)
+
+SORT_KEYS = {
+    "id":    lambda p: _id_key(p.product_id),
+    "price": lambda p: (p.price,) + _id_key(p.product_id),
+    "name":  lambda p: (p.name.lower(),) + _id_key(p.product_id),
+}
+
+# Types of each component of a SORT_KEYS key, to check cursors sent back by clients
+_ID_KEY_TYPES = (int, int, str)
+KEY_TYPES = {
+    "id":    _ID_KEY_TYPES,
+    "price": ((int, float),) + _ID_KEY_TYPES,
+    "name":  (str,) + _ID_KEY_TYPES,
+}
+
+
+def encode_cursor(sort: str, order: str, key: tuple) -> str:
+    raw = json.dumps([sort, order, list(key)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_order, key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (c_sort, c_order) != (sort, order):
+        raise ValueError("Cursor was issued for a different sort order")
+    # The key is compared against the sorted keys, so it must have their shape and types
+    types = KEY_TYPES[sort]
+    if not isinstance(key, list) or len(key) != len(types) or \
+            not all(isinstance(k, t) for k, t in zip(key, types)):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+class ProductListing:
+
+    #Products presorted by id, price and name, built once when the products are loaded.
+    #Pages are addressed by a keyset cursor (the sort key of the last item returned), so a page
+    #is a binary search plus a slice: O(log n + page size), with no sorting per request.
+    #Added and edited products are moved into place by upsert() without re-sorting.
+
+
+    def __init__(self, products: list):
+        self.lock = RWLock()
+        self.rebuild(products)
+
+    def rebuild(self, products: list):
+        self.orderings = {}
+        for sort, key_fn in SORT_KEYS.items():
+            keyed = sorted(((key_fn(p), p) for p in products), key=lambda kp: kp[0])
+            self.orderings[sort] = ([k for k, _ in keyed], [p for _, p in keyed])
+
+    def upsert(self, changes: list):
+        #changes: [(product, old)], old being the same product before an edit or None if it is new.
+        #Each product is bisected into place: O(log n) to find, one list shift to insert.
+        with self.lock.write():
+            for sort, key_fn in SORT_KEYS.items():
+                keys, products = self.orderings[sort]
+                for product, old in changes:
+                    if old is not None:
+                        pos = bisect_left(keys, key_fn(old))
+                        del keys[pos], products[pos]
+                    key = key_fn(product)
+                    pos = bisect_left(keys, key)
+                    keys.insert(pos, key)
+                    products.insert(pos, product)
+
+    def page(self, sort: str = "id", order: str = "asc", limit: int = 50,
+             cursor: str = None, fields: list = None) -> dict:
+
+        #Return {"items": [...], "next_cursor": str|None, "total": n}.
+        #fields restricts each item to the given keys; raises ValueError on bad arguments.
+
+        if sort not in self.orderings:
+            raise ValueError(f"sort must be one of {sorted(self.orderings)}")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be 'asc' or 'desc'")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        if fields is not None:
+            unknown = [f for f in fields if f not in FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {unknown}")
+
+        after = decode_cursor(cursor, sort, order) if cursor else None
+        with self.lock.read():
+            return self._page(sort, order, limit, after, fields)
+
+    def _page(self, sort: str, order: str, limit: int, after: tuple, fields: list) -> dict:
+        keys, products = self.orderings[sort]
+        if order == "asc":
+            start = bisect_right(keys, after) if after is not None else 0
+            end = min(start + limit, len(keys))
+            positions = range(start, end)
+            has_more = end < len(keys)
+        else:
+            end = bisect_left(keys, after) if after is not None else len(keys)
+            start = max(end - limit, 0)
+            positions = range(end - 1, start - 1, -1)
+            has_more = start > 0
+
+        items = []
+        for pos in positions:
+            info = products[pos].return_info()
+            items.append({f: info[f] for f in fields} if fields else info)
+
+        next_cursor = None
+        if has_more and items:
+            next_cursor = encode_cursor(sort, order, keys[positions[-1]])
+        return {"items": items, "next_cursor": next_cursor, "total": len(keys)}
@@ -0,0 +1,137 @@
+# backend/models/product_search.py
+
+import re
+import math
+import heapq
+from bisect import bisect_left, insort
+
+from models.table_lock import RWLock
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall((text or "").lower())
+
+
+class ProductSearchIndex:
+
+    #In-process inverted index over Product.name and Product.description, ranked with BM25.
+    #Name tokens count name_weight times, so a hit in the name outranks one in the description.
+    #The last query term also matches as a prefix ("head" finds "headphones"), expanded through a
+    #sorted vocabulary to at most max_expansions tokens. Products can be added, updated and
+    #removed one at a time; nothing is rebuilt. Searches share a read lock, so they never see
+    #a product half indexed.
+
+
+    def __init__(self, products: list = (), k1: float = 1.2, b: float = 0.75,
+                 name_weight: int = 2, max_expansions: int = 32):
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self.max_expansions = max_expansions
+
+        self.postings = {}      # token -> {product_id: term frequency}
+        self.doc_terms = {}     # product_id -> {token: term frequency}
+        self.doc_len = {}       # product_id -> document length
+        self.total_len = 0
+        self.vocabulary = []    # sorted tokens, for prefix matching
+        self.products = {}      # product_id -> Product
+        self.lock = RWLock()
+
+        # Bulk build: sort the vocabulary once at the end instead of per new token
+        for p in products:
+            self._add(p, sorted_vocabulary=False)
+        self.vocabulary = sorted(self.postings)
+
+    def _terms_of(self, product) -> dict:
+        terms = {}
+        for token in tokenize(product.name):
+            terms[token] = terms.get(token, 0) + self.name_weight
+        for token in tokenize(product.description):
+            terms[token] = terms.get(token, 0) + 1
+        return terms
+
+    def add_product(self, product):
+        #Index a product; an already indexed product_id is re-indexed.
+        with self.lock.write():
+            self._add(product, sorted_vocabulary=True)
+
+    def _add(self, product, sorted_vocabulary: bool):
+        pid = product.product_id
+        if pid in self.doc_terms:
+            self._remove(pid)
+
+        terms = self._terms_of(product)
+        for token, tf in terms.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                if sorted_vocabulary:
+                    insort(self.vocabulary, token)
+            posting[pid] = tf
+
+        self.doc_terms[pid] = terms
+        self.doc_len[pid] = sum(terms.values())
+        self.total_len += self.doc_len[pid]
+        self.products[pid] = product
+
+    def update_product(self, product):
+        self.add_product(product)
+
+    def remove_product(self, product_id: str):
+        with self.lock.write():
+            self._remove(product_id)
+
+    def _remove(self, product_id: str):
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            posting = self.postings[token]
+            del posting[product_id]
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+        self.total_len -= self.doc_len.pop(product_id)
+        del self.products[product_id]
+
+    def _expand_prefix(self, prefix: str) -> list:
+        start = bisect_left(self.vocabulary, prefix)
+        tokens = []
+        for token in self.vocabulary[start:start + self.max_expansions]:
+            if not token.startswith(prefix):
+                break
+            tokens.append(token)
+        return tokens
+
+    def search(self, query: str, limit: int = 20) -> list:
+
+        #Return [(score, Product), ...] best first for the given free-text query.
+
+        terms = tokenize(query)
+        with self.lock.read():
+            if not terms or not self.doc_len:
+                return []
+            return self._search(terms, limit)
+
+    def _search(self, terms: list, limit: int) -> list:
+        n_docs = len(self.doc_len)
+        avg_len = self.total_len / n_docs
+        scores = {}
+
+        for i, term in enumerate(terms):
+            if i == len(terms) - 1:
+                # The term being typed: exact hit plus prefix completions
+                tokens = self._expand_prefix(term)
+            else:
+                tokens = [term] if term in self.postings else []
+
+            for token in tokens:
+                posting = self.postings[token]
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pid, tf in posting.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[pid] / avg_len)
+                    scores[pid] = scores.get(pid, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, self.products[pid]) for pid, score in best]
@@ -0,0 +1,81 @@
+# backend/models/profiler.py
+
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter
+
+class SamplingProfiler:
+
+    #Statistical profiler for a single request. A background thread takes a snapshot of the
+    #profiled thread's call stack every interval seconds; a function's share of the samples
+    #is its share of the request's wall time, I/O waits included. The request itself runs at
+    #full speed, since nothing is hooked into it.
+    #With all_threads, every thread is sampled (for the asyncio server, where a request's
+    #work hops between the event loop and the I/O threads; other requests show up too).
+    #dump() writes the samples as folded stacks ('a.py:f;b.py:g 12'), the input of
+    #flamegraph.pl and speedscope.
+
+
+    def __init__(self, thread_id: int = None, interval: float = 0.001, all_threads: bool = False):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.all_threads = all_threads
+        self.stacks = Counter()     # folded stack -> samples
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.all_threads:
+                targets = [f for tid, f in frames.items() if tid != me]
+            else:
+                targets = [frames.get(self.thread_id)]
+            for frame in targets:
+                if frame is not None:
+                    self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def dump(self, directory: str, label: str) -> str:
+        #Write the folded stacks to a new file in directory and return its name
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}"
+        path = os.path.join(directory, name + ".folded")
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(directory, f"{name}-{suffix}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return os.path.basename(path)
@@ -0,0 +1,43 @@
+# backend/models/response_cache.py
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+class ResponseCache:
+
+    #Pre-serialized JSON response bodies, keyed by endpoint (plus arguments).
+    #Each entry remembers the version of every Table it was built from and is rebuilt as soon
+    #as one of them changes. The ETag is a hash of the body, so it stays the same across
+    #rebuilds that produce identical output. Least recently used entries are dropped first.
+
+
+    def __init__(self, dumps, max_entries: int = 256):
+        self.dumps = dumps          # obj -> str, e.g. app.json.dumps to match jsonify output
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (table versions, body bytes, etag)
+        self._lock = Lock()
+
+    def get(self, key, tables: list, build):
+
+        #Return (body, etag) for key, calling build() only if the entry is missing or stale.
+
+        versions = tuple((t.name, t.version) for t in tables if t is not None)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                return entry[1], entry[2]
+
+        body = self.dumps(build()).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        with self._lock:
+            self._entries[key] = (versions, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,54 +1,212 @@
 # backend/models/sales_analytics.py
 
+import os
 import json
-from .database import DatabaseManager
+from threading import RLock
+from .database import DatabaseManager, SingletonMeta
+from .order_items import get_order_items_table
+
+ORDER_COLUMNS = ["order_id", "customer_id", "total_cost", "items", "status", "created_at"]
+
+def get_order_table():
+    dbm = DatabaseManager()
+    order_table = dbm.get_table("order")
+    if order_table is None:
+        # If no order table exists, create it with the expected columns:
+        order_table = dbm.create_table("order", ORDER_COLUMNS)
+    # Order tables written before orders were timestamped lack 'created_at'
+    order_table.add_column("created_at")
+    return order_table
+
+
+class SalesAggregate(metaclass=SingletonMeta):
+
+    #Materialized running totals over the 'order' table:
+    #  - revenue (in cents, so repeated additions do not drift)
+    #  - order count
+    #  - product_sales: { product_id: total_quantity_sold }
+    #The 'order' table is append-only, so the aggregate remembers how many rows it has folded
+    #in (the watermark) and only ever reads rows past it. State is saved to
+    #data/sales_summary.json so a restart resumes from the watermark instead of rescanning.
+
+
+    def __init__(self):
+        dbm = DatabaseManager()
+        self.order_table = get_order_table()
+        # Per-line quantities come from the typed 'order_items' table, not the JSON column
+        self.items_table = get_order_items_table()
+        self.file_path = os.path.join(dbm.csv_path, "sales_summary.json")
+        # Concurrent checkouts both refresh; only one may fold a given row
+        self._lock = RLock()
+        self._reset()
+        self._load_state()
+        self.refresh()
+
+    def _reset(self):
+        self.watermark = 0
+        self.last_order_id = None
+        self.revenue_cents = 0
+        self.order_count = 0
+        self.product_sales = {}
+
+    def _load_state(self):
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.watermark = int(state["watermark"])
+            self.last_order_id = state["last_order_id"]
+            self.revenue_cents = int(state["revenue_cents"])
+            self.order_count = int(state["order_count"])
+            self.product_sales = {pid: int(q) for pid, q in state["product_sales"].items()}
+        except (ValueError, KeyError, TypeError):
+            # Unreadable state is simply rebuilt by refresh()
+            self._reset()
+
+    def _save_state(self):
+        state = {
+            "watermark": self.watermark,
+            "last_order_id": self.last_order_id,
+            "revenue_cents": self.revenue_cents,
+            "order_count": self.order_count,
+            "product_sales": self.product_sales,
+        }
+        # Per-process temp name: every worker process saves its own (equally valid) state
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.file_path)
+
+    def fold_row(self, row: dict, totals: dict):
+
+        #Add one order row to totals ({"revenue_cents", "order_count", "product_sales"}).
+
+        try:
+            cents = round(float(row.get("total_cost", 0)) * 100)
+        except ValueError:
+            cents = 0
+        totals["revenue_cents"] += cents
+        totals["order_count"] += 1
+
+        product_sales = totals["product_sales"]
+        items = self.items_table
+        for pos in items.indexes["order_id"].lookup(row.get("order_id")):
+            line = items.rows[pos]
+            pid = line["product_id"]
+            product_sales[pid] = product_sales.get(pid, 0) + int(line["quantity"])
+
+    def _watermark_is_valid(self) -> bool:
+        rows = self.order_table.rows
+        if self.watermark > len(rows):
+            return False
+        if self.watermark == 0:
+            return True
+        # The order table was rewritten if the last folded row is no longer where we left it
+        return rows[self.watermark - 1].get("order_id") == self.last_order_id
+
+    def refresh(self):
+
+        #Fold in every order row written since the last refresh; O(new rows).
+
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        # Orders before their lines: any order row seen then has its lines on disk too
+        self.order_table.sync()
+        self.items_table.sync()
+        if not self._watermark_is_valid():
+            self._reset()
+
+        rows = self.order_table.rows
+        # Rows appended while folding are left for the next refresh
+        end = len(rows)
+        if self.watermark == end:
+            return
+
+        totals = {
+            "revenue_cents": self.revenue_cents,
+            "order_count": self.order_count,
+            "product_sales": self.product_sales,
+        }
+        for row in rows[self.watermark:end]:
+            self.fold_row(row, totals)
+
+        self.revenue_cents = totals["revenue_cents"]
+        self.order_count = totals["order_count"]
+        self.watermark = end
+        self.last_order_id = rows[end - 1].get("order_id")
+        self._save_state()
+
+    def recompute(self) -> dict:
+        #Totals computed from scratch over the whole 'order' table.
+        totals = {"revenue_cents": 0, "order_count": 0, "product_sales": {}}
+        for row in self.order_table.rows:
+            self.fold_row(row, totals)
+        return totals
+
+    def verify(self, repair: bool = False) -> dict:
+
+        #Recompute from scratch and report any difference from the materialized totals.
+        #With repair=True the materialized totals are replaced by the recomputed ones.
+
+        # New orders are held off meanwhile, or they would show up as drift
+        self.order_table.sync()
+        with self._lock, self.order_table.lock.read():
+            return self._verify(repair)
+
+    def _verify(self, repair: bool) -> dict:
+        self._refresh()
+        expected = self.recompute()
+        drift = {}
+        if expected["revenue_cents"] != self.revenue_cents:
+            drift["total_revenue"] = {
+                "materialized": self.revenue_cents / 100,
+                "recomputed": expected["revenue_cents"] / 100,
+            }
+        if expected["order_count"] != self.order_count:
+            drift["total_orders"] = {"materialized": self.order_count, "recomputed": expected["order_count"]}
+        for pid in set(expected["product_sales"]) | set(self.product_sales):
+            have = self.product_sales.get(pid, 0)
+            want = expected["product_sales"].get(pid, 0)
+            if have != want:
+                drift.setdefault("product_sales", {})[pid] = {"materialized": have, "recomputed": want}
+
+        if drift and repair:
+            self.revenue_cents = expected["revenue_cents"]
+            self.order_count = expected["order_count"]
+            self.product_sales = expected["product_sales"]
+            self._save_state()
+
+        return {"consistent": not drift, "drift": drift, "repaired": bool(drift and repair)}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "total_revenue": round(self.revenue_cents / 100, 2),
+                "total_orders": self.order_count,
+                "product_sales": dict(self.product_sales)
+            }
+
 
 class SalesAnalytics:
-    
-    #Reads the 'order' table (backed by order.csv) and computes:
+
+    #Sales summary over the 'order' table (backed by order.csv):
     #  - total_revenue
     #  - total_orders
     #  - product_sales: { product_id: total_quantity_sold }
-    
+    #Served from the materialized SalesAggregate rather than a rescan of every order.
+
 
     def __init__(self):
-        dbm = DatabaseManager()
-        self.order_table = dbm.get_table("order")
-        if self.order_table is None:
-            # If no order table exists, create it with the expected columns:
-            self.order_table = dbm.create_table(
-                "order",
-                ["order_id", "customer_id", "total_cost", "items", "status"]
-            )
+        self.order_table = get_order_table()
+        self.aggregate = SalesAggregate()
 
     def generate_summary(self) -> dict:
-        total_revenue = 0.0
-        total_orders = 0
-        product_sales = {}  # product_id -> total quantity sold
+        self.aggregate.refresh()
+        return self.aggregate.summary()
 
-        for row in self.order_table.rows:
-            # Each row is a dict with keys: order_id, customer_id, total_cost, items (JSON), status
-            try:
-                total_cost = float(row.get("total_cost", 0))
-            except ValueError:
-                total_cost = 0.0
-            total_revenue += total_cost
-            total_orders += 1
-
-            # 'items' is stored as a JSON string: [{"product_id":"3","quantity":4}, ...]
-            try:
-                items_list = json.loads(row.get("items", "[]"))
-            except json.JSONDecodeError:
-                items_list = []
-
-            for entry in items_list:
-                pid = entry.get("product_id")
-                qty = int(entry.get("quantity", 0))
-                if pid:
-                    product_sales[pid] = product_sales.get(pid, 0) + qty
-
-        return {
-            "total_revenue": round(total_revenue, 2),
-            "total_orders": total_orders,
-            "product_sales": product_sales
-        }
+    def verify_summary(self, repair: bool = False) -> dict:
+        #Recompute the summary from scratch and report drift against the materialized one.
+        return self.aggregate.verify(repair=repair)
@@ -0,0 +1,211 @@
+# backend/models/sales_rollup.py
+
+import re
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from threading import RLock
+
+from .database import DatabaseManager, SingletonMeta
+from .sales_analytics import get_order_table
+from .order_items import get_order_items_table
+
+HOUR = 3600
+GRANULARITIES = {"hour": HOUR, "day": 24 * HOUR, "week": 7 * 24 * HOUR}
+GROUP_BY = ("none", "product", "catalogue")
+# 1970-01-05 was a Monday; weekly buckets start on Mondays (UTC)
+_WEEK_OFFSET = 4 * 24 * HOUR
+# Older order ids were '<epoch millis>-<customer_id>'
+_MILLIS_ORDER_ID = re.compile(r"^(\d{13})-")
+
+
+def parse_time(value) -> int:
+    #Epoch seconds from an ISO-8601 date/datetime or an epoch number; naive times are UTC.
+    value = str(value).strip()
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        return int(float(value))
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def order_time(row: dict):
+    #Epoch seconds an order was placed, or None for untimestamped legacy rows.
+    created_at = row.get("created_at")
+    if created_at:
+        try:
+            return parse_time(created_at)
+        except ValueError:
+            return None
+    match = _MILLIS_ORDER_ID.match(row.get("order_id") or "")
+    if match:
+        return int(match.group(1)) // 1000
+    return None
+
+
+def bucket_start(ts: int, granularity: str) -> int:
+    width = GRANULARITIES[granularity]
+    if granularity == "week":
+        return (ts - _WEEK_OFFSET) // width * width + _WEEK_OFFSET
+    return ts // width * width
+
+
+class HourlySeries:
+
+    #Hourly buckets for one key, held as parallel array columns sorted by hour.
+
+
+    __slots__ = ("hours", "revenue_cents", "units", "orders")
+
+    def __init__(self):
+        self.hours = array("q")
+        self.revenue_cents = array("q")
+        self.units = array("q")
+        self.orders = array("q")
+
+    def add(self, hour: int, revenue_cents: int, units: int, orders: int):
+        i = len(self.hours)
+        # Orders arrive in time order, so the bucket is almost always the last one
+        if i and self.hours[-1] >= hour:
+            i = bisect_left(self.hours, hour)
+            if self.hours[i] == hour:
+                self.revenue_cents[i] += revenue_cents
+                self.units[i] += units
+                self.orders[i] += orders
+                return
+        self.hours.insert(i, hour)
+        self.revenue_cents.insert(i, revenue_cents)
+        self.units.insert(i, units)
+        self.orders.insert(i, orders)
+
+    def query(self, start: int, end: int, granularity: str) -> list:
+        #Fold the hourly buckets in [start, end) into buckets of the given granularity.
+        lo = bisect_left(self.hours, start)
+        hi = bisect_left(self.hours, end)
+        result = []
+        for i in range(lo, hi):
+            b = bucket_start(self.hours[i], granularity)
+            if not result or result[-1][0] != b:
+                result.append([b, 0, 0, 0])
+            bucket = result[-1]
+            bucket[1] += self.revenue_cents[i]
+            bucket[2] += self.units[i]
+            bucket[3] += self.orders[i]
+        return result
+
+
+class SalesRollup(metaclass=SingletonMeta):
+
+    #Pre-aggregated hourly revenue/units/orders over the 'order' table, overall, per product
+    #and per catalogue. Day and week buckets are folded from the hourly ones at query time,
+    #so a query costs O(hourly buckets in range) regardless of how many orders they hold.
+    #Like SalesAggregate, new order rows are folded in incrementally past a watermark, but
+    #nothing is saved: the full history is folded on first use, which app.py does at startup.
+    #Per-product revenue is quantity x unit_price from the 'order_items' table.
+
+
+    def __init__(self):
+        dbm = DatabaseManager()
+        self.order_table = get_order_table()
+        self.items_table = get_order_items_table()
+        self.catalogues_table = dbm.get_table("product_catalogues")
+        self._lock = RLock()
+        self._reset()
+        self.refresh()
+
+    def _reset(self):
+        self.watermark = 0
+        self.last_order_id = None
+        self.total = HourlySeries()
+        self.by_product = {}
+        self.by_catalogue = {}
+
+    def _catalogues_of(self, product_id: str) -> list:
+        if self.catalogues_table is None:
+            return []
+        self.catalogues_table.create_index("product_id")
+        return [row["catalogue_id"]
+                for row in self.catalogues_table.get_rows_by_column_value("product_id", product_id)]
+
+    def _fold_row(self, row: dict):
+        ts = order_time(row)
+        if ts is None:
+            return
+        hour = ts // HOUR * HOUR
+        try:
+            cents = round(float(row.get("total_cost", 0)) * 100)
+        except ValueError:
+            cents = 0
+
+        units_total = 0
+        per_catalogue = {}
+        items = self.items_table
+        for pos in items.indexes["order_id"].lookup(row.get("order_id")):
+            line = items.rows[pos]
+            pid = line["product_id"]
+            qty = int(line["quantity"])
+            units_total += qty
+            line_cents = round(float(line["unit_price"] or 0) * 100) * qty
+            self.by_product.setdefault(pid, HourlySeries()).add(hour, line_cents, qty, 1)
+            for cat_id in self._catalogues_of(pid):
+                acc = per_catalogue.setdefault(cat_id, [0, 0])
+                acc[0] += line_cents
+                acc[1] += qty
+
+        for cat_id, (line_cents, qty) in per_catalogue.items():
+            self.by_catalogue.setdefault(cat_id, HourlySeries()).add(hour, line_cents, qty, 1)
+        self.total.add(hour, cents, units_total, 1)
+
+    def refresh(self):
+        #Fold in every order row written since the last refresh; O(new rows).
+        with self._lock:
+            # Orders before their lines, as in SalesAggregate.refresh
+            self.order_table.sync()
+            self.items_table.sync()
+            rows = self.order_table.rows
+            end = len(rows)
+            if self.watermark > end or (
+                    self.watermark and rows[self.watermark - 1].get("order_id") != self.last_order_id):
+                self._reset()
+            if self.watermark == end:
+                return
+            for row in rows[self.watermark:end]:
+                self._fold_row(row)
+            self.watermark = end
+            self.last_order_id = rows[end - 1].get("order_id")
+
+    def query(self, start=None, end=None, granularity: str = "day", group_by: str = "none") -> dict:
+
+        #Revenue, units and orders per time bucket between start (inclusive) and end (exclusive).
+        #start/end are epoch seconds; granularity is hour/day/week; group_by is none/product/catalogue.
+
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {list(GROUP_BY)}")
+        with self._lock:
+            return self._query(start, end, granularity, group_by)
+
+    def _query(self, start, end, granularity: str, group_by: str) -> dict:
+        self.refresh()
+
+        start = bucket_start(start, granularity) if start is not None else 0
+        end = end if end is not None else 2 ** 62
+
+        def buckets(series):
+            return [{
+                "bucket_start": datetime.fromtimestamp(b, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "revenue": round(cents / 100, 2),
+                "units": units,
+                "orders": orders
+            } for b, cents, units, orders in series.query(start, end, granularity)]
+
+        result = {"granularity": granularity, "group_by": group_by}
+        if group_by == "none":
+            result["buckets"] = buckets(self.total)
+        else:
+            source = self.by_product if group_by == "product" else self.by_catalogue
+            groups = {key: buckets(series) for key, series in source.items()}
+            result["groups"] = {key: b for key, b in groups.items() if b}
+        return result
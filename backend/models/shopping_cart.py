@@ -1,81 +1,95 @@
 # backend/models/shopping_cart.py
 
-import os
-from models.database import DatabaseManager
+from models.cart_store import CartStore
+from models.cart_pricing import CartPricing
+from models.metrics import metrics
+
+CART_SECONDS = metrics.histogram("awe_cart_seconds", "Time spent in ShoppingCart operations", ["op"])
 
 class ShoppingCart:
 
+    #subtotal_cents is the cart's running total in integer cents, kept up to date by
+    #add_to_cart / clear_cart / remove_items / reload_cart and by CartPricing when prices change.
+
+
     def __init__(self, customer_id: str):
         self.customer_id = str(customer_id)
-        dbm = DatabaseManager()
-        # Ensure the 'carts' table exists with the correct columns
-        self.table = dbm.get_table("carts")
-        if self.table is None:
-            # If the CSV doesn’t exist yet, create it with these columns:
-            self.table = dbm.create_table("carts", ["customer_id", "product_id", "quantity"])
+        # Carts are partitioned per customer; this cart only ever reads and writes its own rows
+        self.store = CartStore()
+        self.table = self.store.partition(self.customer_id)
+        self.pricing = CartPricing()
 
         # Build an in-memory map: product_id -> quantity
         self.items = {}
-        for row in self.table.rows:
-            if row["customer_id"] == self.customer_id:
-                pid = row["product_id"]
-                qty = int(row["quantity"])
-                self.items[pid] = self.items.get(pid, 0) + qty
-
-    def _persist_all_rows(self):
-        
-        #Overwrite 'carts.csv' so that:
-        #1) Rows belonging to other customers remain as-is.
-        #2) Rows for self.customer_id reflect self.items (one row per product_id).
-        
-        all_rows = []
-        # Collect rows for OTHER customers
-        for row in self.table.rows:
-            if row["customer_id"] != self.customer_id:
-                all_rows.append(row)
-
-        # Add this customer's current rows
-        for pid, qty in self.items.items():
-            all_rows.append({
-                "customer_id": self.customer_id,
-                "product_id": pid,
-                "quantity": str(qty)
-            })
-
-        # Replace the table’s in-memory rows and save
-        self.table.rows = all_rows
-        self.table.save()
+        self.subtotal_cents = 0
+        self.reload_cart()
 
+    @CART_SECONDS.timed("add")
     def add_to_cart(self, product, quantity=1):
-        
+
         #Increase quantity for product.product_id, or add new if missing.
-        #Then persist all carts back to 'carts.csv'.
-        
+        #Only this customer's cart line is persisted.
+
         pid = str(product.product_id)
-        self.items[pid] = self.items.get(pid, 0) + int(quantity)
-        self._persist_all_rows()
+        qty = self.store.increment(self.customer_id, pid, int(quantity))
+        with self.pricing.lock:
+            # Copy-on-write: a concurrent get_cart_items() keeps iterating the old dict
+            items = dict(self.items)
+            self.subtotal_cents += self.pricing.add(self, pid, qty - items.get(pid, 0))
+            items[pid] = qty
+            self.items = items
 
     def get_cart_items(self):
-        
+
         #Return a list of dicts [{"product_id": "...", "quantity": N}, ...]
         #representing this customer's cart.
-        
+
         return [{"product_id": pid, "quantity": qty} for pid, qty in self.items.items()]
-    
-    def clear_cart(self):
-        
+
+    def priced(self):
+
+        #(items, subtotal_cents) taken together, so the total always matches the lines.
+        #items is {product_id: quantity}.
+
+        with self.pricing.lock:
+            return self.items, self.subtotal_cents
+
+    @CART_SECONDS.timed("clear")
+    def clear_cart(self, tx=None):
+
         #Remove all items from the cart and persist the change.
-        
-        self.items = {}
-        self._persist_all_rows()
+        #With tx (see DatabaseManager.transaction), the cart is emptied when tx commits.
+
+        if tx is not None:
+            tx.truncate(self.table)
+            tx.on_commit(self._emptied)
+            return
+        self.store.clear(self.customer_id)
+        self._emptied()
+
+    @CART_SECONDS.timed("remove")
+    def remove_items(self, product_ids, tx):
+
+        #Remove the lines of product_ids when tx commits (see DatabaseManager.transaction).
+        #Lines of other products, such as ones added while an order was being placed, are kept.
 
+        for pid in product_ids:
+            tx.delete_where(self.table, "product_id", str(pid))
+        tx.on_commit(self.reload_cart)
+
+    def _emptied(self):
+        with self.pricing.lock:
+            self.items = {}
+            self.subtotal_cents = 0
+
+    @CART_SECONDS.timed("reload")
     def reload_cart(self):
-        
+
         #Reload the cart from the database to ensure we have the latest state.
-        
-        self.items = {}
-        for row in self.table.rows:
-            if row["customer_id"] == self.customer_id:
-                pid = row["product_id"]
-                qty = int(row["quantity"])
-                self.items[pid] = self.items.get(pid, 0) + qty
+        #The subtotal is only recomputed if the lines changed (e.g. in another process).
+
+        items = self.store.get_items(self.customer_id)
+        with self.pricing.lock:
+            if items != self.items:
+                self.items = items
+                self.subtotal_cents = self.pricing.subtotal(self, items)
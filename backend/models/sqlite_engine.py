@@ -0,0 +1,517 @@
+# backend/models/sqlite_engine.py
+
+import os
+import sqlite3
+import threading
+from collections.abc import Sequence
+from contextlib import contextmanager, nullcontext
+
+from models.database import StorageEngine, CsvEngine, Table
+
+# Per-table bookkeeping: the version counter that Table.version reports
+META_TABLE = "_awe_tables"
+# key= values a sorted index can use, and the SQL type each one casts to
+SORT_KEYS = {None: None, float: "REAL", int: "INTEGER"}
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SqliteEngine(StorageEngine):
+
+    #Every table in one SQLite database file, in WAL mode so readers never wait for a writer.
+    #Each thread gets its own pooled connection, opened on first use (and again in a forked
+    #worker). Statements are parameterized and their SQL text is built once per table, so
+    #sqlite3's statement cache prepares each one once per connection.
+    #Writes from all of the engine's tables go through one lock and run as BEGIN IMMEDIATE
+    #transactions, which also orders them against other processes using the same file.
+    #A table that only exists as a CSV file under csv_path is imported on first open.
+
+
+    name = "sqlite"
+    supports_transactions = True
+
+    def __init__(self, db_file: str, csv_path: str = None, busy_timeout: float = 10.0,
+                 synchronous: str = "NORMAL"):
+        self.db_file = db_file
+        self.csv_path = csv_path
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+
+        self._local = threading.local()     # conn, pid, depth (open transaction blocks)
+        self._connections = []
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        with self.transaction() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} "
+                         "(name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+
+    def connection(self) -> sqlite3.Connection:
+        #This thread's connection, opened on first use.
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None or local.pid != os.getpid():
+            # isolation_level=None: no implicit transactions; transaction() issues BEGIN itself
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=512)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            local.conn, local.pid, local.depth = conn, os.getpid(), 0
+            with self._pool_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+
+        #One write transaction on this thread's connection, committed when the outermost
+        #block exits and rolled back if it raises. Nested blocks (from any table) join it.
+
+        with self._write_lock:
+            conn = self.connection()
+            local = self._local
+            if local.depth == 0:
+                conn.execute("BEGIN IMMEDIATE")
+            local.depth += 1
+            try:
+                yield conn
+            except BaseException:
+                local.depth -= 1
+                if local.depth == 0:
+                    conn.execute("ROLLBACK")
+                raise
+            local.depth -= 1
+            if local.depth == 0:
+                conn.execute("COMMIT")
+
+    def in_transaction(self) -> bool:
+        return getattr(self._local, "depth", 0) > 0
+
+    def open_table(self, name: str, columns: list) -> "SqliteTable":
+        return SqliteTable(self, name, columns)
+
+    def stored_columns(self, name: str) -> list:
+        info = self.connection().execute(f"PRAGMA table_info({_quote(name)})").fetchall()
+        return [row[1] for row in info if row[1] != "_pos"]
+
+    def table_columns(self, name: str):
+        columns = self.stored_columns(name)
+        if columns:
+            return columns
+        if self.csv_path:
+            return CsvEngine(self.csv_path).table_columns(name)
+        return None
+
+    def table_names(self) -> list:
+        names = [row[0] for row in self.connection().execute(f"SELECT name FROM {META_TABLE}")]
+        if self.csv_path:
+            names += [n for n in CsvEngine(self.csv_path).table_names() if n not in names]
+        return names
+
+    def close(self):
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class SqliteLock:
+
+    #Table.lock for SQLite tables. write() is an engine transaction, so a read-modify-write
+    #inside it is atomic across threads and processes. read() takes no lock: every read is
+    #one statement against a consistent WAL snapshot.
+
+
+    def __init__(self, engine: SqliteEngine):
+        self.engine = engine
+
+    def write(self):
+        return self.engine.transaction()
+
+    def read(self):
+        return nullcontext()
+
+    def held(self) -> bool:
+        return self.engine.in_transaction()
+
+
+class SqliteIndex:
+
+    #Secondary index backed by a real SQL index. Offers the lookup()/range() of HashIndex
+    #and SortedIndex, answering with row positions just as they do.
+
+
+    def __init__(self, table: "SqliteTable", column: str, kind: str, key=None):
+        self.table = table
+        self.column = column
+        self.kind = kind
+        self.key = key
+        expr = _quote(column)
+        if SORT_KEYS[key] is not None:
+            # Numeric ordering (e.g. key=float on 'total_cost') through an expression index
+            expr = f"CAST({expr} AS {SORT_KEYS[key]})"
+        self.expr = expr
+        self._lookup_sql = f"SELECT _pos FROM {table.ident} WHERE {expr} = ? ORDER BY _pos"
+
+    def create(self, conn):
+        suffix = "" if self.expr == _quote(self.column) else f"__{SORT_KEYS[self.key].lower()}"
+        name = _quote(f"{self.table.name}__{self.column}{suffix}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {self.table.ident} ({self.expr})")
+
+    def _key_of(self, value):
+        if self.key is None:
+            return value
+        try:
+            return self.key(value)
+        except (TypeError, ValueError):
+            return None
+
+    def lookup(self, value) -> list:
+        value = self._key_of(value)
+        if value is None:
+            return []
+        return [row[0] for row in self.table.engine.connection().execute(self._lookup_sql, (value,))]
+
+    def range_query(self, select: str, low=None, high=None) -> tuple:
+        #(sql, params) selecting 'select' for rows in [low, high], in value order.
+        conditions, params = [], []
+        if low is not None:
+            conditions.append(f"{self.expr} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{self.expr} <= ?")
+            params.append(high)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"SELECT {select} FROM {self.table.ident}{where} ORDER BY {self.expr}, _pos", params
+
+    def range(self, low=None, high=None) -> list:
+        #Positions whose value lies in [low, high] (either bound may be None), in value order.
+        sql, params = self.range_query("_pos", low, high)
+        return [row[0] for row in self.table.engine.connection().execute(sql, params)]
+
+
+class SqliteRows(Sequence):
+
+    #Read-only, list-like view of a SqliteTable's rows in position order (len, [i], [a:b],
+    #iteration). Each access queries the database and returns fresh dicts.
+
+
+    def __init__(self, table: "SqliteTable"):
+        self._table = table
+
+    def __len__(self):
+        return self._table.count()
+
+    def __getitem__(self, i):
+        table = self._table
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            rows = table.fetch_range(start, stop) if start < stop else []
+            return rows if step == 1 else rows[::step]
+        if i < 0:
+            i += len(self)
+        row = table.fetch(i)
+        if row is None:
+            raise IndexError("row index out of range")
+        return row
+
+    def __iter__(self):
+        return iter(self._table.fetch_range(0, None))
+
+    def __repr__(self):
+        return f"SqliteRows({self._table.name!r}, {len(self)} rows)"
+
+
+class SqliteTable:
+
+    #A table stored in SQLite, with the public methods and attributes of Table.
+    #Columns are TEXT (values read back as strings, as from a CSV). An extra _pos column keeps
+    #each row's position, dense from 0 and shifted down on delete, so positions from an index
+    #lookup can be used with rows[pos], update_row() and friends exactly as with Table.
+    #Every change is committed when its method (or the caller's 'with table.lock.write():'
+    #or 'with table.batch():' block) returns, so save(), load() and sync() have nothing left to do.
+
+
+    def __init__(self, engine: SqliteEngine, name: str, columns: list):
+        self.engine = engine
+        self.name = name
+        self.ident = _quote(name)
+        self.columns = columns[:]   # copy
+        self.indexes = {}           # column -> SqliteIndex
+        self.lock = SqliteLock(engine)
+        self.file_path = engine.db_file
+        self.journal = None
+
+        with self.lock.write() as conn:
+            stored = engine.stored_columns(name)
+            if not stored:
+                self._create(conn)
+            else:
+                # Adopt columns added by add_column() in an earlier run or another process
+                self.columns = stored + [c for c in self.columns if c not in stored]
+                for column in self.columns[len(stored):]:
+                    conn.execute(f"ALTER TABLE {self.ident} ADD COLUMN {_quote(column)} TEXT NOT NULL DEFAULT ''")
+            conn.execute(f"INSERT OR IGNORE INTO {META_TABLE} (name, version) VALUES (?, 0)", (name,))
+        self._prepare()
+
+    def _create(self, conn):
+        # A CSV table of the same name (with its journal) is imported once, on creation
+        legacy = None
+        if self.engine.csv_path:
+            csv_columns = CsvEngine(self.engine.csv_path).table_columns(self.name)
+            if csv_columns is not None:
+                journaled = os.path.exists(os.path.join(self.engine.csv_path, f"{self.name}.journal"))
+                legacy = Table(self.name, csv_columns, path=self.engine.csv_path, journaled=journaled)
+                self.columns = legacy.columns + [c for c in self.columns if c not in legacy.columns]
+
+        definitions = ", ".join(f"{_quote(c)} TEXT NOT NULL DEFAULT ''" for c in self.columns)
+        conn.execute(f"CREATE TABLE {self.ident} (_pos INTEGER NOT NULL, {definitions})")
+        conn.execute(f"CREATE INDEX {_quote(self.name + '___pos')} ON {self.ident} (_pos)")
+        if legacy is not None:
+            self._prepare()
+            conn.executemany(self._sql_insert, ((pos,) + self._values(row) for pos, row in enumerate(legacy.rows)))
+
+    def _prepare(self):
+        # SQL text per statement, built once so the statement cache can reuse it
+        t = self.ident
+        cols = ", ".join(_quote(c) for c in self.columns)
+        # Positions are dense, so the row count is max(_pos) + 1: one probe of the _pos index
+        self._sql_count = f"SELECT COALESCE(MAX(_pos) + 1, 0) FROM {t}"
+        self._sql_exists = f"SELECT 1 FROM {t} WHERE _pos = ?"
+        self._sql_fetch = f"SELECT {cols} FROM {t} WHERE _pos = ?"
+        self._sql_fetch_range = f"SELECT {cols} FROM {t} WHERE _pos >= ? AND _pos < ? ORDER BY _pos"
+        self._sql_fetch_all = f"SELECT {cols} FROM {t} ORDER BY _pos"
+        self._sql_select_where = f"SELECT {cols} FROM {t} WHERE {{column}} = ? ORDER BY _pos"
+        self._sql_insert = f"INSERT INTO {t} (_pos, {cols}) VALUES (?{', ?' * len(self.columns)})"
+        self._sql_update = (f"UPDATE {t} SET " + ", ".join(f"{_quote(c)} = ?" for c in self.columns)
+                            + " WHERE _pos = ?")
+        self._sql_bump = f"UPDATE {META_TABLE} SET version = version + 1 WHERE name = ?"
+
+    def _values(self, row) -> tuple:
+        # Same shape a row has after a round trip through the CSV file
+        get = row.get
+        return tuple("" if get(c) is None else str(get(c)) for c in self.columns)
+
+    def _row(self, values) -> dict:
+        return dict(zip(self.columns, values))
+
+    def _bump(self, conn):
+        conn.execute(self._sql_bump, (self.name,))
+
+    @property
+    def version(self) -> int:
+        # Kept in the database, so a change by any thread or process is seen at once
+        row = self.engine.connection().execute(
+            f"SELECT version FROM {META_TABLE} WHERE name = ?", (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def count(self) -> int:
+        return self.engine.connection().execute(self._sql_count).fetchone()[0]
+
+    def fetch(self, pos: int):
+        values = self.engine.connection().execute(self._sql_fetch, (pos,)).fetchone()
+        return self._row(values) if values is not None else None
+
+    def fetch_range(self, start: int, stop) -> list:
+        conn = self.engine.connection()
+        if stop is None:
+            cursor = conn.execute(self._sql_fetch_all)
+        else:
+            cursor = conn.execute(self._sql_fetch_range, (start, stop))
+        return [self._row(values) for values in cursor]
+
+    @property
+    def rows(self) -> SqliteRows:
+        return SqliteRows(self)
+
+    @rows.setter
+    def rows(self, rows: list):
+        with self.lock.write() as conn:
+            conn.execute(f"DELETE FROM {self.ident}")
+            conn.executemany(self._sql_insert, ((pos,) + self._values(row) for pos, row in enumerate(rows)))
+            self._bump(conn)
+
+    def sync(self) -> bool:
+        return False
+
+    def create_index(self, column: str, kind: str = "hash", key=None):
+
+        #Create a real SQL index on column (see Table.create_index). For kind="sorted",
+        #key may be None (text order), float or int (numeric order via CAST).
+
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        existing = self.indexes.get(column)
+        if existing is not None and existing.kind == kind:
+            return existing
+        if kind not in ("hash", "sorted"):
+            raise ValueError(f"Unknown index kind '{kind}'")
+        if key not in SORT_KEYS or (key is not None and kind != "sorted"):
+            raise ValueError("SQLite indexes support key=None, float or int on sorted indexes only")
+        index = SqliteIndex(self, column, kind, key)
+        with self.lock.write() as conn:
+            index.create(conn)
+        self.indexes[column] = index
+        return index
+
+    def drop_index(self, column: str):
+        self.indexes.pop(column, None)
+
+    def _positions_for(self, column: str, value) -> list:
+        index = self.indexes.get(column)
+        if index is not None:
+            return index.lookup(value)
+        sql = f"SELECT _pos FROM {self.ident} WHERE {_quote(column)} = ? ORDER BY _pos"
+        return [row[0] for row in self.engine.connection().execute(sql, (value,))]
+
+    def _check_index(self, index: int, conn) -> bool:
+        return conn.execute(self._sql_exists, (index,)).fetchone() is not None
+
+    def add_row(self, row: dict):
+        if not set(row.keys()).issubset(set(self.columns)):
+            raise ValueError(f"Row has invalid columns: {row.keys()} not subset of {self.columns}")
+        with self.lock.write() as conn:
+            pos = conn.execute(self._sql_count).fetchone()[0]
+            conn.execute(self._sql_insert, (pos,) + self._values(row))
+            self._bump(conn)
+
+    def batch(self):
+        #See Table.batch(): here one transaction, committed on exit and rolled back on error.
+        return self.lock.write()
+
+    def _check_columns(self, rows: list, label: str = "Row"):
+        keys = set()
+        for row in rows:
+            keys.update(row.keys())
+        if not keys.issubset(self.columns):
+            raise ValueError(f"{label} has invalid columns: {sorted(keys - set(self.columns))} not in {self.columns}")
+
+    def add_rows(self, rows):
+        rows = list(rows)
+        self._check_columns(rows)
+        with self.lock.write() as conn:
+            start = conn.execute(self._sql_count).fetchone()[0]
+            conn.executemany(self._sql_insert, ((pos,) + self._values(row) for pos, row in enumerate(rows, start)))
+            self._bump(conn)
+
+    def update_rows(self, updates):
+        updates = list(updates)
+        self._check_columns([new_row for _, new_row in updates], label="New row")
+        with self.lock.write() as conn:
+            count = conn.execute(self._sql_count).fetchone()[0]
+            for index, _ in updates:
+                if not 0 <= index < count:
+                    raise IndexError(f"Row index {index} out of range")
+            conn.executemany(self._sql_update, (self._values(new_row) + (index,) for index, new_row in updates))
+            self._bump(conn)
+
+    def delete_rows(self, indexes):
+        positions = sorted(set(indexes))
+        if not positions:
+            return
+        with self.lock.write() as conn:
+            if positions[0] < 0 or positions[-1] >= conn.execute(self._sql_count).fetchone()[0]:
+                raise IndexError("Row index out of range")
+            conn.executemany(f"DELETE FROM {self.ident} WHERE _pos = ?", ((pos,) for pos in positions))
+            # Close the gaps in one statement: each remaining row takes its rank as its position
+            conn.execute(f"UPDATE {self.ident} SET _pos = ranked.pos FROM "
+                         f"(SELECT rowid AS id, ROW_NUMBER() OVER (ORDER BY _pos) - 1 AS pos FROM {self.ident}) AS ranked "
+                         f"WHERE {self.ident}.rowid = ranked.id AND {self.ident}._pos != ranked.pos")
+            self._bump(conn)
+
+    def delete_row(self, index: int):
+        with self.lock.write() as conn:
+            if not self._check_index(index, conn):
+                raise IndexError(f"Row index {index} out of range")
+            conn.execute(f"DELETE FROM {self.ident} WHERE _pos = ?", (index,))
+            conn.execute(f"UPDATE {self.ident} SET _pos = _pos - 1 WHERE _pos > ?", (index,))
+            self._bump(conn)
+
+    def update_row(self, index: int, new_row: dict):
+        with self.lock.write() as conn:
+            if not self._check_index(index, conn):
+                raise IndexError(f"Row index {index} out of range")
+            if not set(new_row.keys()).issubset(set(self.columns)):
+                raise ValueError("New row has invalid columns")
+            conn.execute(self._sql_update, self._values(new_row) + (index,))
+            self._bump(conn)
+
+    def update_column_value_by_index(self, index: int, column: str, value):
+        with self.lock.write() as conn:
+            if not self._check_index(index, conn):
+                raise IndexError(f"Row index {index} out of range")
+            if column not in self.columns:
+                raise ValueError(f"Column '{column}' does not exist")
+            conn.execute(f"UPDATE {self.ident} SET {_quote(column)} = ? WHERE _pos = ?",
+                         ("" if value is None else str(value), index))
+            self._bump(conn)
+
+    def update_row_by_column_value(self, column: str, match_value, new_row: dict):
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        with self.lock.write():
+            for idx in self._positions_for(column, match_value):
+                self.update_row(idx, new_row)
+                return
+        raise ValueError(f"No row found where {column} == {match_value}")
+
+    def add_column(self, column: str, default: str = ""):
+
+        #Append a column to the schema, filling existing rows with default.
+        #Does nothing if the column already exists.
+
+        if column in self.columns:
+            return
+        with self.lock.write() as conn:
+            conn.execute(f"ALTER TABLE {self.ident} ADD COLUMN {_quote(column)} TEXT NOT NULL DEFAULT ''")
+            if default:
+                conn.execute(f"UPDATE {self.ident} SET {_quote(column)} = ?", (str(default),))
+            self.columns.append(column)
+            self._prepare()
+            self._bump(conn)
+
+    def get_row_by_column_value(self, column: str, value: str) -> dict:
+        rows = self.get_rows_by_column_value(column, value)
+        return rows[0] if rows else None
+
+    def get_rows_by_column_value(self, column: str, value: str) -> list:
+        #Every row where column == value, in table order.
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        conn = self.engine.connection()
+        index = self.indexes.get(column)
+        if index is not None and index.key is not None:
+            # Compared by key (e.g. float), like Table's sorted index
+            return [self.fetch(pos) for pos in index.lookup(value)]
+        cursor = conn.execute(self._sql_select_where.format(column=_quote(column)), (value,))
+        return [self._row(values) for values in cursor]
+
+    def get_rows_in_range(self, column: str, low=None, high=None) -> list:
+
+        #Rows whose column value lies in [low, high], ordered by that value.
+        #Uses the sorted index's key (e.g. numeric order) when one exists, else text order.
+
+        if column not in self.columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        index = self.indexes.get(column)
+        if index is None or index.kind != "sorted":
+            index = SqliteIndex(self, column, "sorted")
+        sql, params = index.range_query(", ".join(_quote(c) for c in self.columns), low, high)
+        return [self._row(values) for values in self.engine.connection().execute(sql, params)]
+
+    def save(self):
+        # Already committed; kept so callers written against Table need no changes
+        pass
+
+    def compact(self):
+        #Fold the WAL back into the database file.
+        self.engine.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def write_snapshot(self):
+        pass
+
+    def load(self):
+        pass
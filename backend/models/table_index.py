@@ -0,0 +1,99 @@
+# backend/models/table_index.py
+
+from bisect import bisect_left, bisect_right, insort
+
+class HashIndex:
+
+    #Secondary index: column value -> ascending list of row positions.
+    #Answers equality lookups in O(1).
+
+
+    kind = "hash"
+
+    def __init__(self, column: str):
+        self.column = column
+        self.positions = {}
+
+    def build(self, rows: list):
+        self.positions = {}
+        for pos, row in enumerate(rows):
+            self.positions.setdefault(row.get(self.column), []).append(pos)
+
+    def add(self, pos: int, row: dict):
+        bucket = self.positions.setdefault(row.get(self.column), [])
+        if not bucket or bucket[-1] < pos:
+            bucket.append(pos)
+        else:
+            insort(bucket, pos)
+
+    def remove(self, pos: int, row: dict):
+        value = row.get(self.column)
+        bucket = self.positions.get(value)
+        if bucket:
+            i = bisect_left(bucket, pos)
+            if i < len(bucket) and bucket[i] == pos:
+                del bucket[i]
+            if not bucket:
+                del self.positions[value]
+
+    def lookup(self, value) -> list:
+        return self.positions.get(value, [])
+
+
+class SortedIndex:
+
+    #Secondary index kept as a sorted list of (key, position) pairs.
+    #Answers equality lookups in O(log n) and range queries in O(log n + matches).
+    #key converts the stored value before comparing (e.g. key=float for 'total_cost');
+    #rows whose value cannot be converted are left out of the index.
+
+
+    kind = "sorted"
+
+    def __init__(self, column: str, key=None):
+        self.column = column
+        self.key = key or (lambda v: v)
+        self.entries = []
+
+    def _key_of(self, value):
+        try:
+            return self.key(value)
+        except (TypeError, ValueError):
+            return None
+
+    def build(self, rows: list):
+        entries = []
+        for pos, row in enumerate(rows):
+            k = self._key_of(row.get(self.column))
+            if k is not None:
+                entries.append((k, pos))
+        entries.sort()
+        self.entries = entries
+
+    def add(self, pos: int, row: dict):
+        k = self._key_of(row.get(self.column))
+        if k is not None:
+            insort(self.entries, (k, pos))
+
+    def remove(self, pos: int, row: dict):
+        k = self._key_of(row.get(self.column))
+        if k is None:
+            return
+        i = bisect_left(self.entries, (k, pos))
+        if i < len(self.entries) and self.entries[i] == (k, pos):
+            del self.entries[i]
+
+    def lookup(self, value) -> list:
+        k = self._key_of(value)
+        if k is None:
+            return []
+        return sorted(self.range(k, k))
+
+    def range(self, low=None, high=None) -> list:
+        #Positions whose key lies in [low, high] (either bound may be None), in key order.
+        start = 0 if low is None else bisect_left(self.entries, (low,))
+        end = len(self.entries)
+        if high is not None:
+            # Every (high, pos) pair sorts below (high, inf)
+            end = bisect_right(self.entries, (high, float("inf")))
+        return [pos for _, pos in self.entries[start:end]]
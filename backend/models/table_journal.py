@@ -0,0 +1,142 @@
+# backend/models/table_journal.py
+
+import os
+import json
+import zlib
+
+class TableJournal:
+
+    #Append-only log of mutations for a single Table.
+    #Each record is one line: '<crc32 hex> <json payload>'. The first record of a journal
+    #is a 'base' record holding the size/mtime of the CSV snapshot it applies to, so a journal
+    #left behind by an interrupted compaction is recognised as stale and ignored.
+    #offset is how many bytes of the file have been read or written by this process, so
+    #replay_tail() can pick up just the records other processes appended since.
+
+
+    def __init__(self, file_path: str, snapshot_path: str, fsync: bool = False):
+        self.file_path = file_path
+        self.snapshot_path = snapshot_path
+        self.fsync = fsync
+        self.record_count = 0
+        self.offset = 0
+
+    def _snapshot_stamp(self) -> dict:
+        try:
+            st = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return {"size": 0, "mtime_ns": 0}
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    @staticmethod
+    def _encode(record: dict) -> bytes:
+        payload = json.dumps(record, separators=(",", ":"))
+        data = payload.encode("utf-8")
+        return b"%08x " % zlib.crc32(data) + data + b"\n"
+
+    @staticmethod
+    def _decode(line: bytes):
+        #The record on one journal line, or None for a torn or corrupt line.
+        if not line.endswith(b"\n") or len(line) < 10:
+            return None
+        checksum, data = line[:8], line[9:-1]
+        try:
+            if int(checksum, 16) != zlib.crc32(data):
+                return None
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def append(self, record: dict):
+        self.append_many([record])
+
+    def append_many(self, records: list):
+        #Write all records with a single append; cost depends only on the records written.
+        chunks = []
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            chunks.append(self._encode(dict(op="base", **self._snapshot_stamp())))
+        chunks.extend(self._encode(r) for r in records)
+
+        with open(self.file_path, "ab") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self.offset = f.tell()
+        self.record_count += len(records)
+
+    def replay(self) -> list:
+
+        #Return the valid mutation records in write order.
+        #Reading stops at the first record whose checksum fails (a torn write); the file is
+        #truncated there so later appends are not hidden behind the damaged record.
+
+        self.record_count = 0
+        self.offset = 0
+        if not os.path.exists(self.file_path):
+            return []
+
+        records = []
+        valid_bytes = 0
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                record = self._decode(line)
+                if record is None:
+                    break
+                records.append(record)
+                valid_bytes += len(line)
+
+        if valid_bytes < os.path.getsize(self.file_path):
+            with open(self.file_path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+        if not records or not self._base_matches(records[0]):
+            # The snapshot was rewritten after this journal started: already folded in.
+            self.truncate()
+            return []
+
+        self.record_count = len(records) - 1
+        self.offset = valid_bytes
+        return records[1:]
+
+    def _base_matches(self, record: dict) -> bool:
+        return (record.get("op") == "base" and
+                (record.get("size"), record.get("mtime_ns")) == tuple(self._snapshot_stamp().values()))
+
+    def replay_tail(self):
+
+        #Return the records appended after offset (by this or another process), in write order,
+        #and advance offset past them. Returns None if the file no longer continues what was
+        #read before (it was removed, shrank, or belongs to a newer snapshot); the caller must
+        #then reload the table in full. A torn last line is left for replay() to deal with.
+
+        try:
+            f = open(self.file_path, "rb")
+        except FileNotFoundError:
+            return None if self.offset else []
+        with f:
+            if os.fstat(f.fileno()).st_size < self.offset:
+                return None
+            f.seek(self.offset)
+            records = []
+            consumed = 0
+            for line in f:
+                record = self._decode(line)
+                if record is None:
+                    break
+                records.append(record)
+                consumed += len(line)
+
+        if self.offset == 0 and records:
+            if not self._base_matches(records[0]):
+                return None
+            records = records[1:]
+        self.offset += consumed
+        self.record_count += len(records)
+        return records
+
+    def truncate(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.record_count = 0
+        self.offset = 0
@@ -0,0 +1,144 @@
+# backend/models/table_lock.py
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): FileLock is a no-op, so only run a single worker process there
+    fcntl = None
+
+class FileLock:
+
+    #Exclusive advisory lock (flock) on a lock file, shared by every process on the host.
+    #The file is opened per acquisition rather than kept open, so a worker forked from a
+    #parent that held it never shares the parent's lock. Not re-entrant on its own: the
+    #owning RWLock only calls it for the outermost write.
+
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        if fcntl is None:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class RWLock:
+
+    #Reader/writer lock for one Table: any number of readers, or one writer.
+    #Writers are preferred, so a steady stream of readers cannot starve a checkout.
+    #Both sides are re-entrant per thread, and a thread holding the write lock may also
+    #read. Upgrading a held read lock to a write lock is refused, since two threads doing
+    #it at once would deadlock.
+    #on_acquire_write / on_release_write run when a thread takes / gives up the outermost
+    #write lock; Table uses them to hold its cross-process FileLock for the same span.
+
+
+    def __init__(self, on_acquire_write=None, on_release_write=None):
+        self.on_acquire_write = on_acquire_write
+        self.on_release_write = on_release_write
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}          # thread id -> read depth
+        self._writer = None         # thread id holding the write lock
+        self._write_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me or me in self._readers:
+                # Nested read: never wait, or a waiting writer would deadlock us
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._write_depth = 1
+
+        if self.on_acquire_write is not None:
+            try:
+                self.on_acquire_write()
+            except BaseException:
+                self._release_write()
+                raise
+
+    def release_write(self):
+        if self._write_depth == 1 and self.on_release_write is not None:
+            try:
+                self.on_release_write()
+            finally:
+                self._release_write()
+        else:
+            self._release_write()
+
+    def _release_write(self):
+        with self._cond:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    def held(self) -> bool:
+        #True if the calling thread holds this lock for reading or writing.
+        me = threading.get_ident()
+        return self._writer == me or me in self._readers
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,90 @@
+# backend/models/table_rows.py
+
+import sys
+from collections.abc import MutableMapping
+
+class RowSchema:
+
+    #Column layout shared by every row of one table. Column names are interned and stored
+    #once here instead of as keys in every row.
+
+
+    __slots__ = ("columns", "positions")
+
+    def __init__(self, columns: list):
+        self.columns = []
+        self.positions = {}
+        for column in columns:
+            self.add_column(column)
+
+    def add_column(self, column: str):
+        column = sys.intern(column)
+        self.positions[column] = len(self.columns)
+        self.columns.append(column)
+
+
+class CompactRow(MutableMapping):
+
+    #Dict-like view of one row, holding only its schema and a tuple of values.
+    #Reads, writes, get(), keys(), items(), 'in' and == behave as for a dict keyed by column.
+    #copy() is O(1): the copy shares the value tuple, and a write to either row replaces
+    #that row's tuple rather than changing it in place.
+
+
+    __slots__ = ("_schema", "_values")
+
+    def __init__(self, schema: RowSchema, values: tuple):
+        self._schema = schema
+        self._values = values
+
+    @classmethod
+    def from_mapping(cls, schema: RowSchema, row) -> "CompactRow":
+        get = row.get
+        return cls(schema, tuple(get(c, "") for c in schema.columns))
+
+    def __getitem__(self, column):
+        pos = self._schema.positions[column]
+        values = self._values
+        # Rows loaded before add_column() are shorter than the schema
+        return values[pos] if pos < len(values) else ""
+
+    def get(self, column, default=None):
+        pos = self._schema.positions.get(column)
+        if pos is None:
+            return default
+        values = self._values
+        return values[pos] if pos < len(values) else ""
+
+    def __setitem__(self, column, value):
+        pos = self._schema.positions[column]
+        values = self._values
+        if pos >= len(values):
+            values = values + ("",) * (pos + 1 - len(values))
+        self._values = values[:pos] + (value,) + values[pos + 1:]
+
+    def __delitem__(self, column):
+        raise TypeError("Columns cannot be removed from a table row")
+
+    def __iter__(self):
+        return iter(self._schema.columns)
+
+    def __len__(self):
+        return len(self._schema.columns)
+
+    def __contains__(self, column):
+        return column in self._schema.positions
+
+    def values_tuple(self) -> tuple:
+        #Values in column order, padded to the current schema.
+        values = self._values
+        missing = len(self._schema.columns) - len(values)
+        return values + ("",) * missing if missing > 0 else values
+
+    def copy(self) -> "CompactRow":
+        return CompactRow(self._schema, self._values)
+
+    def to_dict(self) -> dict:
+        return dict(zip(self._schema.columns, self.values_tuple()))
+
+    def __repr__(self):
+        return f"CompactRow({self.to_dict()!r})"
@@ -0,0 +1,64 @@
+# backend/models/table_snapshot.py
+
+import os
+import mmap
+import marshal
+
+class TableSnapshot:
+
+    #Binary image of a loaded Table: columns plus one tuple of strings per row, marshalled after
+    #an 8-byte magic. It is stamped with the size and mtime of the CSV (and journal) it was taken
+    #from and only used while both are unchanged, so loading it skips CSV parsing and journal
+    #replay entirely. The file is memory-mapped for reading and replaced atomically on write.
+
+
+    MAGIC = b"AWESNAP1"
+
+    def __init__(self, file_path: str, csv_path: str, journal_path: str = None):
+        self.file_path = file_path
+        self.csv_path = csv_path
+        self.journal_path = journal_path
+
+    def _stamp(self) -> tuple:
+        stamp = []
+        for path in (self.csv_path, self.journal_path):
+            try:
+                st = os.stat(path) if path else None
+            except FileNotFoundError:
+                st = None
+            stamp.extend((st.st_size, st.st_mtime_ns) if st else (0, 0))
+        return tuple(stamp)
+
+    def read(self):
+
+        #Return (columns, rows as tuples, journal record count), or None if the snapshot
+        #is missing, damaged or older than the CSV/journal it was taken from.
+
+        try:
+            with open(self.file_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if mm[:len(self.MAGIC)] != self.MAGIC:
+                        return None
+                    with memoryview(mm) as view, view[len(self.MAGIC):] as body:
+                        stamp, columns, rows, journal_records = marshal.loads(body)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        if tuple(stamp) != self._stamp():
+            return None
+        return list(columns), rows, journal_records
+
+    def write(self, columns: list, rows: list, journal_records: int = 0):
+        #Snapshot rows (dicts) as they currently stand on disk in CSV + journal.
+        tuples = [tuple("" if row.get(c) is None else str(row.get(c)) for c in columns) for row in rows]
+        data = marshal.dumps((self._stamp(), tuple(columns), tuples, journal_records))
+
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(data)
+        os.replace(tmp_path, self.file_path)
+
+    def delete(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
@@ -0,0 +1,245 @@
+# backend/models/transaction.py
+
+import os
+import time
+import itertools
+from contextlib import ExitStack, contextmanager
+from threading import RLock
+
+from models.table_journal import TableJournal
+from models.table_lock import FileLock
+
+def boot_id():
+    #Identifies the current boot of the machine; None where the OS does not expose one.
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class TransactionLog:
+
+    #Write-ahead log that makes a Transaction over several CSV tables atomic.
+    #A transaction's staged operations are appended as one checksummed record and fsynced:
+    #that single write is the commit point, and the only fsync a commit makes. The tables are
+    #updated after it and a 'done' record follows, both left to the OS to write back.
+    #A transaction without a 'done' record (a crash while applying) is rolled forward by
+    #DatabaseManager.recover(); one whose record is torn never committed and is dropped.
+    #'done' records are tagged with the boot they were written in and only count within it:
+    #after the machine restarts, table writes the OS had not written back may be lost, so
+    #every transaction still in the log is re-applied (operations are idempotent).
+    #The log is emptied at a checkpoint once it grows past max_bytes with nothing pending:
+    #flush(table_names) first forces every table it names to disk.
+    #One transaction commits at a time, across processes too (FileLock).
+
+
+    def __init__(self, path: str, fsync: bool = True, max_bytes: int = 1024 * 1024, flush=None):
+        self.path = path
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.flush = flush
+        # Where the OS does not say which boot this is, 'done' records are fsynced instead
+        self.boot = boot_id()
+        self.file_lock = FileLock(path + ".lock")
+        self._lock = RLock()
+        self._depth = 0
+        self._ids = itertools.count(1)
+        # (first record, offset): every record before offset is resolved, so pending() only
+        # reads what was appended since. The first record identifies the log: once it has been
+        # emptied (here or by another process) the whole log is read again.
+        self._resolved = (b"", 0)
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            if self._depth == 0:
+                self.file_lock.acquire()
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.file_lock.release()
+
+    def _append(self, record: dict, sync: bool = False):
+        with open(self.path, "ab") as f:
+            f.write(TableJournal._encode(record))
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def write(self, ops: list) -> str:
+        #Durably log a transaction's operations and return its id. Call with the log locked.
+        tx_id = f"{os.getpid()}-{int(time.time() * 1000)}-{next(self._ids)}"
+        self._append({"tx": tx_id, "ops": ops}, sync=self.fsync)
+        return tx_id
+
+    def done(self, tx_id: str):
+        #Mark a logged transaction as applied. Call with the log locked.
+        self._append({"done": tx_id, "boot": self.boot}, sync=self.fsync and self.boot is None)
+        if os.path.getsize(self.path) > self.max_bytes and not self.pending():
+            self.checkpoint()
+
+    def checkpoint(self):
+        #Force the tables of every logged transaction to disk, then empty the log.
+        #Call with the log locked and nothing pending.
+        if self.fsync and self.flush is not None:
+            self.flush(self._table_names())
+        os.truncate(self.path, 0)
+
+    def _table_names(self) -> list:
+        names = set()
+        with open(self.path, "rb") as f:
+            for line in f:
+                record = TableJournal._decode(line)
+                if record is None:
+                    break
+                names.update(op["table"] for op in record.get("ops", ()))
+        return sorted(names)
+
+    def pending(self) -> list:
+
+        #[(tx_id, ops)] of logged transactions not marked done since this boot, in commit order.
+        #A torn record at the end is cut off, so later appends are not hidden behind it.
+        #Call with the log locked.
+
+        if not os.path.exists(self.path):
+            return []
+        pending = {}
+        with open(self.path, "rb") as f:
+            first = f.readline()
+            start = self._resolved[1] if self._resolved[0] == first else 0
+            f.seek(start)
+            valid_bytes = start
+            for line in f:
+                record = TableJournal._decode(line)
+                if record is None:
+                    break
+                valid_bytes += len(line)
+                if "tx" in record:
+                    pending[record["tx"]] = record["ops"]
+                elif record.get("boot", self.boot) == self.boot:
+                    pending.pop(record.get("done"), None)
+        if valid_bytes < os.path.getsize(self.path):
+            os.truncate(self.path, valid_bytes)
+        if not pending:
+            self._resolved = (first if valid_bytes else b"", valid_bytes)
+        return list(pending.items())
+
+
+class Transaction:
+
+    #A unit of work over several tables, from DatabaseManager.transaction():
+    #    with dbm.transaction() as tx:
+    #        tx.replace_where(items_table, "order_id", order_id, lines)
+    #        tx.upsert(order_table, "order_id", order_row)
+    #        tx.truncate(cart_table)
+    #Changes are only staged inside the block (reads still see the old rows) and are all
+    #committed when it exits, or all dropped if it raises. Every operation is idempotent, so
+    #recovery can re-apply a committed transaction that a crash left half applied.
+    #on_commit(fn) runs fn once the transaction has committed.
+
+
+    def __init__(self, dbm):
+        self.dbm = dbm
+        self.ops = []
+        self.tables = {}            # name -> table, for every table with staged changes
+        self.state = "open"         # -> "committed" | "rolled back"
+        self._hooks = []
+
+    def _row(self, table, row: dict) -> dict:
+        if not set(row.keys()).issubset(table.columns):
+            raise ValueError(f"Row has invalid columns: {row.keys()} not subset of {table.columns}")
+        return {c: "" if row.get(c) is None else str(row.get(c)) for c in table.columns}
+
+    def _column(self, table, column: str) -> str:
+        if column not in table.columns:
+            raise ValueError(f"Column '{column}' does not exist in table '{table.name}'")
+        return column
+
+    def _stage(self, table, op: dict):
+        if self.state != "open":
+            raise ValueError(f"Transaction already {self.state}")
+        self.tables[table.name] = table
+        self.ops.append({"table": table.name, "columns": list(table.columns), **op})
+
+    def upsert(self, table, key: str, row: dict):
+        #Replace the row whose key column equals row[key], or add row if there is none.
+        row = self._row(table, row)
+        self._stage(table, {"op": "upsert", "key": self._column(table, key), "row": row})
+
+    def replace_where(self, table, column: str, value, rows: list):
+        #Replace every row where column == value with rows.
+        rows = [self._row(table, row) for row in rows]
+        self._stage(table, {"op": "replace_where", "column": self._column(table, column),
+                            "value": str(value), "rows": rows})
+
+    def delete_where(self, table, column: str, value):
+        self._stage(table, {"op": "delete_where", "column": self._column(table, column), "value": str(value)})
+
+    def truncate(self, table):
+        self._stage(table, {"op": "truncate"})
+
+    def on_commit(self, fn):
+        self._hooks.append(fn)
+
+    def commit(self):
+        if self.state != "open":
+            raise ValueError(f"Transaction already {self.state}")
+        if self.ops:
+            self.dbm.apply_transaction(self.ops, self.tables)
+        self.state = "committed"
+        for fn in self._hooks:
+            try:
+                fn()
+            except Exception as e:
+                # Committed already; a failing follow-up must not report the commit as failed
+                print(f"Error after commit: {e}")
+
+    def rollback(self):
+        self.ops = []
+        self.state = "rolled back"
+
+
+def apply_ops(tables: dict, ops: list):
+
+    #Apply staged operations to tables ({name: table}), each table's share as one batch.
+    #Tables are write-locked in name order, so two transactions never deadlock, and changed
+    #in the order their first operation was staged.
+
+    by_table = {}
+    for op in ops:
+        by_table.setdefault(op["table"], []).append(op)
+    with ExitStack() as stack:
+        for name in sorted(by_table):
+            stack.enter_context(tables[name].lock.write())
+        for name, table_ops in by_table.items():
+            table = tables[name]
+            with table.batch():
+                for op in table_ops:
+                    _apply_op(table, op)
+
+
+def _apply_op(table, op: dict):
+    kind = op["op"]
+    if kind == "upsert":
+        row = {c: v for c, v in op["row"].items() if c in table.columns}
+        positions = table._positions_for(op["key"], row[op["key"]])
+        if positions:
+            table.update_row(positions[0], row)
+        else:
+            table.add_row(row)
+    elif kind in ("replace_where", "delete_where"):
+        positions = table._positions_for(op["column"], op["value"])
+        if positions:
+            table.delete_rows(positions)
+        if kind == "replace_where":
+            table.add_rows({c: v for c, v in row.items() if c in table.columns} for row in op["rows"])
+    elif kind == "truncate":
+        count = len(table.rows)
+        if count:
+            table.delete_rows(range(count))
+    else:
+        raise ValueError(f"Unknown transaction operation '{kind}'")
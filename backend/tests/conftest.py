@@ -0,0 +1,33 @@
+# backend/tests/conftest.py
+#
+#   cd backend
+#   python -m pytest -q tests
+
+import os
+import sys
+
+# Import models.* (and benchmarks.fake_gateway) the way app.py does, from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from benchmarks.fake_gateway import FakeGateway
+from models.database import DatabaseManager, SingletonMeta
+from models.sqlite_engine import SqliteEngine
+
+
+@pytest.fixture
+def fake_gateway():
+    # In-process payment gateway, with no injected latency
+    gw = FakeGateway(seed=7).start()
+    yield gw
+    gw.stop()
+
+
+@pytest.fixture
+def dbm(tmp_path, monkeypatch):
+    # A DatabaseManager of its own (and fresh singletons around it), over a SQLite file in tmp_path
+    monkeypatch.setattr(SingletonMeta, "_instances", {})
+    engine = SqliteEngine(str(tmp_path / "awe.sqlite3"))
+    yield DatabaseManager(engine=engine)
+    engine.close()
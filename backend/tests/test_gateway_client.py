@@ -0,0 +1,352 @@
+# backend/tests/test_gateway_client.py
+#
+# GatewayClient (models/payment_strategies/gateway_client.py): retries, deadlines, the circuit
+# breaker, hedging and the connection pools. Attempts are scripted and time is simulated
+# (FakeClock), so nothing here depends on how fast the machine is. The last tests charge
+# through an in-process FakeGateway (the fake_gateway fixture, see conftest.py).
+
+import asyncio
+import random
+import threading
+
+import pytest
+
+from models.payment_strategies import gateway
+from models.payment_strategies.gateway_client import (GatewayClient, GatewayError, CircuitBreaker,
+                                                      CircuitOpenError, ConnectionPool)
+
+URL = "http://gateway.test/charge"
+BODY = b'{"method": "credit", "amount_cents": 1999, "details": {}}'
+KEY = {"Idempotency-Key": "charge-1"}
+APPROVED = (200, b'{"approved": true}')
+
+
+class FakeClock:
+
+    #Simulated monotonic time: sleeping advances it instead of waiting.
+
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds: float):
+        self.sleep(seconds)
+
+
+class Script:
+
+    #Stands in for GatewayClient._attempt / _attempt_async. Each attempt takes cost simulated
+    #seconds, cut short by its timeout like a real socket, then returns or raises the next
+    #outcome; the last outcome repeats.
+
+
+    def __init__(self, client: GatewayClient, clock: FakeClock, outcomes: list, cost: float = 0.0):
+        self.client = client
+        self.clock = clock
+        self.outcomes = list(outcomes)
+        self.cost = cost
+        self.keys = []              # Idempotency-Key of every attempt
+        self.timeouts = []          # time each attempt was given
+        client._attempt = self.attempt
+        client._attempt_async = self.attempt_async
+
+    def attempt(self, body: bytes, headers: dict, deadline: float):
+        self.keys.append(headers.get("Idempotency-Key"))
+        timeout = self.client._remaining(deadline)
+        self.timeouts.append(timeout)
+        if self.cost > timeout:
+            self.clock.now += timeout
+            raise GatewayError("timed out")
+        self.clock.now += self.cost
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return self.client._answer(*outcome)
+
+    async def attempt_async(self, body: bytes, headers: dict, deadline: float):
+        return self.attempt(body, headers, deadline)
+
+
+def make_client(clock: FakeClock, **options) -> GatewayClient:
+    options.setdefault("breaker", CircuitBreaker(failure_threshold=1000, clock=clock))
+    return GatewayClient(URL, clock=clock, sleep=clock.sleep, async_sleep=clock.async_sleep,
+                         rng=random.Random(7), **options)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Retries and deadlines
+# ─────────────────────────────────────────────────────────────────────────────
+def test_retries_failures_with_one_idempotency_key():
+    clock = FakeClock()
+    client = make_client(clock, max_retries=3)
+    script = Script(client, clock, [(503, b""), GatewayError("connection reset"), APPROVED])
+
+    assert client.post(BODY, KEY) == APPROVED
+    assert script.keys == ["charge-1"] * 3
+    assert client.stats["retries"] == 2 and client.stats["failures"] == 0
+
+
+def test_backoff_is_full_jitter_capped_at_max_backoff():
+    clock = FakeClock()
+    client = make_client(clock, max_retries=5, backoff=0.1, max_backoff=0.25, timeout=60)
+    Script(client, clock, [(503, b"")])
+
+    with pytest.raises(GatewayError):
+        client.post(BODY, KEY)
+    assert len(clock.sleeps) == 5
+    for retry, delay in enumerate(clock.sleeps):
+        assert 0 <= delay <= min(0.25, 0.1 * 2 ** retry)
+
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    client = make_client(clock, max_retries=2)
+    script = Script(client, clock, [(503, b"")])
+
+    with pytest.raises(GatewayError) as raised:
+        client.post(BODY, KEY)
+    assert raised.value.status == 503
+    assert len(script.keys) == 3
+    assert client.stats["failures"] == 1
+
+
+def test_client_errors_are_answers_and_429_is_retried():
+    clock = FakeClock()
+    client = make_client(clock, max_retries=2)
+    script = Script(client, clock, [(402, b'{"approved": false}')])
+    assert client.post(BODY, KEY) == (402, b'{"approved": false}')
+    assert len(script.keys) == 1
+
+    script = Script(client, clock, [(429, b""), APPROVED])
+    assert client.post(BODY, KEY) == APPROVED
+    assert len(script.keys) == 2
+
+
+def test_deadline_bounds_a_hung_gateway():
+    clock = FakeClock()
+    client = make_client(clock, timeout=1.0, attempt_timeout=0.3, max_retries=100)
+    # Every attempt hangs until its timeout
+    script = Script(client, clock, [APPROVED], cost=60)
+
+    with pytest.raises(GatewayError):
+        client.post(BODY, KEY)
+    assert clock.now <= 1.0
+    assert max(script.timeouts) <= 0.3
+    assert len(script.keys) < 100
+
+
+def test_async_retries_within_the_deadline():
+    clock = FakeClock()
+    client = make_client(clock, max_retries=3)
+    script = Script(client, clock, [(502, b""), (503, b""), APPROVED])
+    assert asyncio.run(client.post_async(BODY, KEY)) == APPROVED
+    assert script.keys == ["charge-1"] * 3 and len(clock.sleeps) == 2
+
+    clock = FakeClock()
+    client = make_client(clock, timeout=1.0, attempt_timeout=0.3, max_retries=100)
+    Script(client, clock, [APPROVED], cost=60)
+    with pytest.raises(GatewayError):
+        asyncio.run(client.post_async(BODY, KEY))
+    assert clock.now <= 1.0
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Circuit breaker
+# ─────────────────────────────────────────────────────────────────────────────
+def test_breaker_opens_and_refuses_without_calling():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    client = make_client(clock, max_retries=0, breaker=breaker)
+    script = Script(client, clock, [(503, b"")])
+
+    for _ in range(3):
+        with pytest.raises(GatewayError):
+            client.post(BODY, KEY)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.post(BODY, KEY)
+    assert len(script.keys) == 3
+    assert client.stats["short_circuited"] == 1
+
+
+def test_breaker_trial_closes_or_reopens_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = make_client(clock, max_retries=0, breaker=breaker)
+    Script(client, clock, [(503, b"")])
+    with pytest.raises(GatewayError):
+        client.post(BODY, KEY)
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    # A failed trial opens it for another reset_timeout
+    with pytest.raises(GatewayError):
+        client.post(BODY, KEY)
+    assert breaker.state == "open"
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        client.post(BODY, KEY)
+
+    clock.now += 1
+    Script(client, clock, [APPROVED])
+    assert client.post(BODY, KEY) == APPROVED
+    assert breaker.state == "closed"
+
+
+def test_cancelled_trial_lets_the_next_call_try():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = make_client(clock, max_retries=0, breaker=breaker)
+
+    async def scenario():
+        Script(client, clock, [(503, b"")])
+        with pytest.raises(GatewayError):
+            await client.post_async(BODY, KEY)
+        clock.now += 30
+        Script(client, clock, [asyncio.CancelledError()])
+        with pytest.raises(asyncio.CancelledError):
+            await client.post_async(BODY, KEY)
+
+    asyncio.run(scenario())
+    # Cancelling says nothing about the gateway: not a failure, and the trial is free again
+    assert breaker.failures == 1
+    assert breaker.allow()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Hedging
+# ─────────────────────────────────────────────────────────────────────────────
+def test_hedge_races_a_slow_attempt():
+    clock = FakeClock()
+    client = make_client(clock, hedge_after=0.01)
+    release = threading.Event()
+    keys = []
+
+    def attempt(body, headers, deadline):
+        keys.append(headers["Idempotency-Key"])
+        if len(keys) == 1:
+            release.wait(5)         # the slow one
+            return 200, b"slow"
+        return 200, b"fast"
+
+    client._attempt = attempt
+    try:
+        assert client.post(BODY, KEY) == (200, b"fast")
+    finally:
+        release.set()
+    assert keys == ["charge-1", "charge-1"]
+    assert client.stats["hedges"] == 1
+
+
+def test_no_hedge_when_the_first_attempt_answers():
+    clock = FakeClock()
+    client = make_client(clock, hedge_after=5)
+    script = Script(client, clock, [APPROVED])
+    assert client.post(BODY, KEY) == APPROVED
+    assert len(script.keys) == 1 and client.stats["hedges"] == 0
+
+
+def test_async_hedge_cancels_the_losing_attempt():
+    clock = FakeClock()
+    client = make_client(clock, hedge_after=0.01)
+    keys, cancelled = [], []
+
+    async def attempt(body, headers, deadline):
+        keys.append(headers["Idempotency-Key"])
+        if len(keys) == 1:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return 200, b"fast"
+
+    async def scenario():
+        client._attempt_async = attempt
+        result = await client.post_async(BODY, KEY)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == (200, b"fast")
+    assert keys == ["charge-1", "charge-1"]
+    assert cancelled == [True]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Connection pool
+# ─────────────────────────────────────────────────────────────────────────────
+def test_pool_reuses_and_expires_idle_connections():
+    clock = FakeClock()
+    pool = ConnectionPool("gateway.test", 80, max_size=4, max_idle=2, idle_timeout=30, clock=clock)
+    conn, reused = pool.acquire(1)
+    assert not reused
+    pool.release(conn, reusable=True)
+    again, reused = pool.acquire(1)
+    assert reused and again is conn
+    pool.release(again, reusable=True)
+
+    clock.now += 30
+    conn, reused = pool.acquire(1)
+    assert not reused and pool.opened == 2
+    # Not reusable (the gateway said Connection: close): closed, not kept
+    pool.release(conn, reusable=False)
+    assert not pool.idle
+
+
+def test_pool_caps_open_and_idle_connections():
+    pool = ConnectionPool("gateway.test", 80, max_size=3, max_idle=2, clock=FakeClock())
+    held = [pool.acquire(1)[0] for _ in range(3)]
+    with pytest.raises(GatewayError):
+        pool.acquire(0)
+    for conn in held:
+        pool.release(conn, reusable=True)
+    assert len(pool.idle) == 2
+    pool.acquire(0)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Against a gateway
+# ─────────────────────────────────────────────────────────────────────────────
+def test_charges_share_one_keep_alive_connection(fake_gateway):
+    client = GatewayClient(fake_gateway.url)
+    for n in range(20):
+        client.post(BODY, {"Idempotency-Key": f"charge-{n}"})
+    assert asyncio.run(client.post_async(BODY, {"Idempotency-Key": "charge-async"}))[0] == 200
+    # One for the blocking pool, one for the event loop's
+    assert fake_gateway.connections == 2
+    client.close()
+
+
+def test_lost_replies_are_retried_without_charging_twice(fake_gateway):
+    fake_gateway.fail_rate, fake_gateway.drop_rate = 0.2, 0.2
+    client = GatewayClient(fake_gateway.url, max_retries=10, backoff=0.001,
+                           breaker=CircuitBreaker(failure_threshold=1000))
+    for n in range(50):
+        client.post(BODY, {"Idempotency-Key": f"charge-{n}"})
+    assert fake_gateway.charges == 50
+    assert client.stats["retries"] > 0
+    client.close()
+
+
+def test_gateway_charge_is_idempotent_per_payment_key(fake_gateway, monkeypatch):
+    monkeypatch.setenv("AWE_PAYMENT_GATEWAY", fake_gateway.url)
+    gateway.reset_clients()
+    try:
+        key = gateway.payment_key("O1", "client-key", "fingerprint", "C001", 19.99)
+        assert key == gateway.payment_key("O2", "client-key", "fingerprint", "C001", 19.99)
+        assert gateway.charge("credit", 19.99, {}, key)
+        assert asyncio.run(gateway.charge_async("credit", 19.99, {}, key))
+        assert fake_gateway.charges == 1
+
+        fake_gateway.decline_rate = 1.0
+        assert gateway.charge("credit", 5.00, {}, gateway.payment_key("O3")) is False
+    finally:
+        gateway.reset_clients()
@@ -0,0 +1,70 @@
+# backend/tests/test_idempotency.py
+#
+# Idempotency-Key handling of checkouts: IdempotencyStore (models/idempotency.py) and the
+# gateway key a payment is charged under (gateway.payment_key).
+
+import json
+
+import pytest
+
+from models.idempotency import IdempotencyStore, IdempotencyConflict
+from models.payment_strategies import gateway
+
+
+def checkout_body(customer_id: str, method: str = "credit") -> bytes:
+    return json.dumps({"customerId": customer_id, "paymentMethod": method,
+                       "payment_details": {}}).encode("utf-8")
+
+
+def charge(store: IdempotencyStore, key: str, body: bytes, amount: float):
+    # What a checkout does once it holds the claim on key
+    customer_id = json.loads(body)["customerId"]
+    gateway_key = gateway.payment_key(f"O-{customer_id}-{amount}", key, store.fingerprint(body),
+                                      customer_id, amount)
+    return gateway.charge("credit", amount, {}, gateway_key)
+
+
+@pytest.fixture
+def store(dbm, fake_gateway, monkeypatch):
+    monkeypatch.setenv("AWE_PAYMENT_GATEWAY", fake_gateway.url)
+    gateway.reset_clients()
+    yield IdempotencyStore()
+    gateway.reset_clients()
+
+
+def test_key_reused_for_another_body_while_held_is_refused(store):
+    assert store.begin("k1", checkout_body("C001")) == ("new", None)
+    with pytest.raises(IdempotencyConflict):
+        store.begin("k1", checkout_body("C002"))
+
+
+def test_key_reused_for_another_body_after_abort_is_charged_again(store, fake_gateway):
+    first = checkout_body("C001")
+    assert store.begin("k1", first) == ("new", None)
+    assert charge(store, "k1", first, 19.99)
+    # The order could not be saved: a 5xx, and the key is released
+    store.abort("k1")
+
+    # Another customer, and another cart, with the same client key
+    second = checkout_body("C002")
+    assert store.begin("k1", second) == ("new", None)
+    assert charge(store, "k1", second, 5.00)
+    assert fake_gateway.charges == 2
+
+
+def test_retry_after_abort_reuses_the_gateway_key(store, fake_gateway):
+    body = checkout_body("C001")
+    assert store.begin("k1", body) == ("new", None)
+    assert charge(store, "k1", body, 19.99)
+    store.abort("k1")
+
+    assert store.begin("k1", body) == ("new", None)
+    assert charge(store, "k1", body, 19.99)
+    assert fake_gateway.charges == 1
+
+
+def test_finished_request_is_replayed(store):
+    body = checkout_body("C001")
+    store.begin("k1", body)
+    store.finish("k1", 200, '{"message": "paid"}')
+    assert store.begin("k1", body) == ("done", (200, '{"message": "paid"}'))